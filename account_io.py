@@ -0,0 +1,192 @@
+"""
+Lecture et écriture en flux des comptes (CSV ou JSON Lines) pour l'import/export en masse.
+Les fichiers sont traités ligne par ligne: ni l'entrée ni la flotte déchiffrée ne sont chargées
+entièrement en mémoire.
+"""
+import csv
+import json
+import math
+import re
+from typing import Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+FORMATS = ("csv", "jsonl")
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+TRUE_VALUES = {"1", "true", "yes", "y", "oui", "o", "vrai"}
+FALSE_VALUES = {"0", "false", "no", "n", "non", "faux"}
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"booléen attendu, reçu {value!r}")
+
+
+def _to_float(value) -> float:
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"nombre fini attendu, reçu {value!r}")
+    return number
+
+
+def _to_int(value) -> int:
+    if isinstance(value, bool):
+        raise ValueError(f"entier attendu, reçu {value!r}")
+    number = _to_float(value)
+    if not number.is_integer():
+        raise ValueError(f"entier attendu, reçu {value!r}")
+    return int(number)
+
+
+def _to_coordinates(value):
+    if value is None or isinstance(value, list):
+        coords = value
+    else:
+        text = str(value).strip()
+        coords = json.loads(text) if text.startswith("[") else re.split(r"[;,\s]+", text)
+    if coords is None:
+        return None
+    if len(coords) != 2:
+        raise ValueError(f"coordonnées 'lat,lon' attendues, reçu {value!r}")
+    lat, lon = _to_float(coords[0]), _to_float(coords[1])
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"coordonnées hors limites: {value!r}")
+    return [lat, lon]
+
+
+# Options de compte acceptées à l'import. Les données gérées par l'application (stats,
+# created_at, last_run, password_encrypted...) ne sont jamais reprises d'un fichier importé.
+FIELD_TYPES = {
+    "enabled": _to_bool,
+    "headless": _to_bool,
+    "test_mode": _to_bool,
+    "use_portal_api": _to_bool,
+    "block_resources": _to_bool,
+    "lean_browser_profile": _to_bool,
+    "record_portal_session": _to_bool,
+    "update_threshold_km": _to_float,
+    "initial_retry_delay": _to_float,
+    "max_retry_delay": _to_float,
+    "max_retries": _to_int,
+    "geocoding_zoom": _to_int,
+    "test_coordinates": _to_coordinates,
+}
+IDENTITY_FIELDS = ("email", "password")
+# Données gérées par l'application, présentes dans les exports: ignorées à l'import
+MANAGED_FIELDS = ("password_encrypted", "stats", "created_at", "last_run")
+
+# Colonnes exportées en CSV (le mot de passe seulement sur demande)
+CSV_COLUMNS = [
+    "email", "enabled", "update_threshold_km", "headless", "max_retries",
+    "initial_retry_delay", "max_retry_delay", "test_mode", "test_coordinates",
+    "use_portal_api", "block_resources", "lean_browser_profile", "record_portal_session", "geocoding_zoom",
+]
+
+
+def detect_format(path: str, fmt: Optional[str] = None) -> str:
+    """Format explicite, sinon déduit de l'extension (.csv, .jsonl/.ndjson)."""
+    if fmt:
+        return fmt
+    lowered = path.lower()
+    if lowered.endswith(".csv"):
+        return "csv"
+    if lowered.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    raise ValueError(f"Format de {path} inconnu: précisez --format ({', '.join(FORMATS)})")
+
+
+def validate_record(raw: Dict, require_password: bool = True) -> Dict:
+    """
+    Valide et convertit un enregistrement importé. Les cellules vides sont ignorées
+    (valeurs par défaut du compte). Seuls email, password et les options de FIELD_TYPES sont
+    acceptés; les données gérées par l'application (MANAGED_FIELDS) sont ignorées.
+    Lève ValueError si l'enregistrement est invalide.
+    """
+    record = {}
+    for key, value in raw.items():
+        if key is None or value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        key = key.strip()
+        if key in MANAGED_FIELDS:
+            continue
+        if key not in FIELD_TYPES and key not in IDENTITY_FIELDS:
+            raise ValueError(f"champ inconnu ou non importable: {key}")
+        if isinstance(value, str):
+            value = value.strip()
+        if key in IDENTITY_FIELDS:
+            if not isinstance(value, str):
+                raise ValueError(f"champ {key}: texte attendu")
+            record[key] = value
+            continue
+        try:
+            record[key] = FIELD_TYPES[key](value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"champ {key}: {e}")
+
+    email = record.get("email")
+    if not isinstance(email, str) or not EMAIL_PATTERN.match(email):
+        raise ValueError(f"email invalide: {email!r}")
+    if require_password and not isinstance(record.get("password"), str):
+        raise ValueError("mot de passe manquant")
+    if record.get("update_threshold_km", 1) <= 0:
+        raise ValueError("update_threshold_km doit être positif")
+    if record.get("max_retries", 0) < 0:
+        raise ValueError("max_retries doit être positif ou nul")
+    if record.get("initial_retry_delay", 0) < 0 or record.get("max_retry_delay", 0) < 0:
+        raise ValueError("les délais de retry doivent être positifs ou nuls")
+    return record
+
+
+def read_account_records(stream: TextIO, fmt: str) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    Lit les comptes un par un. Produit (numéro de ligne, enregistrement validé, erreur):
+    l'enregistrement est None et l'erreur renseignée pour une ligne invalide.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            try:
+                yield reader.line_num, validate_record(row), None
+            except ValueError as e:
+                yield reader.line_num, None, str(e)
+    elif fmt == "jsonl":
+        for line_num, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                if not isinstance(data, dict):
+                    raise ValueError("objet JSON attendu")
+                yield line_num, validate_record(data), None
+            except ValueError as e:
+                yield line_num, None, str(e)
+    else:
+        raise ValueError(f"Format inconnu: {fmt}")
+
+
+def write_account_records(records: Iterable[Dict], stream: TextIO, fmt: str,
+                          with_passwords: bool = False) -> int:
+    """Écrit les comptes au fil de l'eau. Retourne le nombre de comptes écrits."""
+    count = 0
+    if fmt == "csv":
+        columns = CSV_COLUMNS[:1] + (["password"] if with_passwords else []) + CSV_COLUMNS[1:]
+        writer = csv.DictWriter(stream, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            row = dict(record)
+            if isinstance(row.get("test_coordinates"), list):
+                row["test_coordinates"] = ",".join(str(value) for value in row["test_coordinates"])
+            writer.writerow(row)
+            count += 1
+    elif fmt == "jsonl":
+        for record in records:
+            stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    else:
+        raise ValueError(f"Format inconnu: {fmt}")
+    return count
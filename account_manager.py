@@ -5,26 +5,81 @@ import os
 import json
 import base64
 import logging
-from typing import Dict, List, Optional
-from cryptography.fernet import Fernet
+import threading
+import functools
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional
 from getpass import getpass
 
+from file_lock import file_lock, write_json_atomic
+
 logger = logging.getLogger("GeoAgile.AccountManager")
 
+# Un jeton Fernet commence par l'octet de version 0x80 ("gAAAAA" en base64 URL).
+# Les anciens enregistrements l'encodaient une seconde fois en base64 ("Z0FBQUFB...").
+FERNET_TOKEN_PREFIX = "gAAAAA"
+DECRYPT_WORKERS = 8
+PARALLEL_DECRYPT_MIN = 16      # en dessous, le déchiffrement séquentiel est plus rapide
+IMPORT_BATCH_SIZE = 256        # mots de passe chiffrés par lot lors d'un import en masse
+PLAINTEXT_CACHE_SIZE = 16      # mots de passe déchiffrés gardés en mémoire (les plus récents)
+
+def _synchronized(method):
+    """
+    Exécute la méthode sous le verrou du gestionnaire (lecture-modification-écriture atomique),
+    partagé avec les autres processus de l'hôte (accounts.json et fleet_stats.json).
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._exclusive():
+            return method(self, *args, **kwargs)
+    return wrapper
+
 class AccountManager:
     """Gestionnaire de comptes avec chiffrement sécurisé."""
     
     ACCOUNTS_FILE = "accounts.json"
     KEY_FILE = ".key"
+    FLEET_STATS_FILE = "fleet_stats.json"
+    FLEET_STATS_RETENTION_DAYS = 90
+    FLEET_STATS_WINDOWS = {'1j': 1, '7j': 7, '30j': 30}
     
     def __init__(self):
         self.accounts_file = self.ACCOUNTS_FILE
         self.key_file = self.KEY_FILE
+        self.fleet_stats_file = self.FLEET_STATS_FILE
         self.cipher_suite = None
-        self._load_or_create_key()
+        # Sérialise les cycles lecture-modification-écriture (workers en parallèle)
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        # Jeton chiffré -> mot de passe, borné à PLAINTEXT_CACHE_SIZE entrées (LRU):
+        # ne pas garder toute la flotte déchiffrée en mémoire
+        self._plaintext: "OrderedDict[str, str]" = OrderedDict()
+        self._plaintext_lock = threading.Lock()
+        self._key_lock = threading.Lock()
+    
+    @contextmanager
+    def _exclusive(self):
+        """Verrou des threads puis verrou inter-processus, pris une seule fois par appel imbriqué."""
+        with self._lock:
+            self._lock_depth += 1
+            try:
+                if self._lock_depth == 1:
+                    with file_lock(self.accounts_file):
+                        yield
+                else:
+                    yield
+            finally:
+                self._lock_depth -= 1
     
     def _load_or_create_key(self):
-        """Charge la clé de chiffrement ou en crée une nouvelle."""
+        """
+        Charge la clé de chiffrement ou en crée une nouvelle.
+        Appelé à la première opération de chiffrement: les lectures de métadonnées
+        n'importent pas cryptography et ne lisent pas la clé.
+        """
+        from cryptography.fernet import Fernet
         if os.path.exists(self.key_file):
             try:
                 with open(self.key_file, 'rb') as f:
@@ -38,6 +93,7 @@ class AccountManager:
     
     def _create_new_key(self):
         """Crée une nouvelle clé de chiffrement."""
+        from cryptography.fernet import Fernet
         try:
             # Générer une clé depuis un mot de passe maître ou aléatoirement
             # Pour la sécurité, on génère une clé aléatoire
@@ -51,50 +107,115 @@ class AccountManager:
             logger.error(f"Erreur lors de la création de la clé: {e}")
             raise
     
-    def _encrypt_password(self, password: str) -> str:
-        """Chiffre un mot de passe."""
+    def _ensure_cipher(self):
+        with self._key_lock:
+            if not self.cipher_suite:
+                self._load_or_create_key()
         if not self.cipher_suite:
             raise ValueError("Cipher suite non initialisée")
-        encrypted = self.cipher_suite.encrypt(password.encode())
-        return base64.b64encode(encrypted).decode()
     
-    def _decrypt_password(self, encrypted_password: str) -> str:
-        """Déchiffre un mot de passe."""
-        if not self.cipher_suite:
-            raise ValueError("Cipher suite non initialisée")
+    @staticmethod
+    def _is_wrapped(token: str) -> bool:
+        """Jeton de l'ancien format (jeton Fernet encodé une seconde fois en base64)."""
+        return not token.startswith(FERNET_TOKEN_PREFIX)
+    
+    @classmethod
+    def _unwrap(cls, token: str) -> str:
+        """Retire l'encodage base64 superflu des anciens jetons (sans déchiffrer)."""
+        return base64.b64decode(token.encode()).decode() if cls._is_wrapped(token) else token
+    
+    def _cache_get(self, token: str) -> Optional[str]:
+        with self._plaintext_lock:
+            password = self._plaintext.get(token)
+            if password is not None:
+                self._plaintext.move_to_end(token)
+            return password
+    
+    def _cache_put(self, token: str, password: str):
+        with self._plaintext_lock:
+            self._plaintext[token] = password
+            self._plaintext.move_to_end(token)
+            while len(self._plaintext) > PLAINTEXT_CACHE_SIZE:
+                self._plaintext.popitem(last=False)
+    
+    def _encrypt_password(self, password: str, cache: bool = True) -> str:
+        """
+        Chiffre un mot de passe. Le jeton Fernet (déjà en base64 URL) est stocké tel quel.
+        cache=False: le mot de passe n'est pas conservé en mémoire (import en masse).
+        """
+        self._ensure_cipher()
+        token = self.cipher_suite.encrypt(password.encode()).decode()
+        if cache:
+            self._cache_put(token, password)
+        return token
+    
+    def _decrypt_password(self, encrypted_password: str, cache: bool = True) -> str:
+        """
+        Déchiffre un mot de passe (nouveau format ou ancien format doublement encodé).
+        cache=False: le mot de passe n'est pas conservé en mémoire (export en flux).
+        """
+        cached = self._cache_get(encrypted_password)
+        if cached is not None:
+            return cached
+        self._ensure_cipher()
         try:
-            encrypted_bytes = base64.b64decode(encrypted_password.encode())
-            decrypted = self.cipher_suite.decrypt(encrypted_bytes)
-            return decrypted.decode()
+            decrypted = self.cipher_suite.decrypt(self._unwrap(encrypted_password).encode()).decode()
         except Exception as e:
             logger.error(f"Erreur lors du déchiffrement: {e}")
             raise
+        if cache:
+            self._cache_put(encrypted_password, decrypted)
+        return decrypted
     
-    def load_accounts(self) -> Dict:
-        """Charge tous les comptes depuis le fichier."""
+    def encrypt_many(self, passwords: List[str], current_tokens: Optional[List[Optional[str]]] = None) -> List[str]:
+        """
+        Chiffre un lot de mots de passe, en parallèle au-delà de PARALLEL_DECRYPT_MIN.
+        Le jeton courant d'un mot de passe inchangé est conservé (voir _token_for).
+        Les mots de passe ne sont pas conservés en mémoire.
+        """
+        self._ensure_cipher()
+        current_tokens = current_tokens or [None] * len(passwords)
+        
+        def _token(item):
+            password, current_token = item
+            return self._token_for(password, current_token, cache=False)
+        
+        items = list(zip(passwords, current_tokens))
+        if len(items) < PARALLEL_DECRYPT_MIN:
+            return [_token(item) for item in items]
+        with ThreadPoolExecutor(max_workers=DECRYPT_WORKERS, thread_name_prefix="encrypt") as executor:
+            return list(executor.map(_token, items))
+    
+    def decrypt_many(self, tokens: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Déchiffre un lot de jetons (opérations en masse), en parallèle au-delà de PARALLEL_DECRYPT_MIN.
+        Retourne jeton -> mot de passe (None si le jeton est invalide).
+        Au-delà de PLAINTEXT_CACHE_SIZE jetons, les mots de passe ne sont pas mis en cache:
+        ils ne restent en mémoire que le temps de la copie retournée.
+        """
+        tokens = list(dict.fromkeys(tokens))
+        cache = len(tokens) <= PLAINTEXT_CACHE_SIZE
+        if tokens:
+            self._ensure_cipher()
+        
+        def _decrypt_or_none(token: str) -> Optional[str]:
+            try:
+                return self._decrypt_password(token, cache=cache)
+            except Exception:
+                return None
+        
+        if len(tokens) >= PARALLEL_DECRYPT_MIN:
+            with ThreadPoolExecutor(max_workers=DECRYPT_WORKERS, thread_name_prefix="decrypt") as executor:
+                return dict(zip(tokens, executor.map(_decrypt_or_none, tokens)))
+        return {token: _decrypt_or_none(token) for token in tokens}
+    
+    def _read_raw(self) -> Dict:
+        """Enregistrements tels qu'ils sont stockés (mots de passe chiffrés, aucun déchiffrement)."""
         if not os.path.exists(self.accounts_file):
             return {}
-        
         try:
             with open(self.accounts_file, 'r', encoding='utf-8') as f:
-                accounts_data = json.load(f)
-            
-            # Déchiffrer les mots de passe
-            decrypted_accounts = {}
-            for email, account_info in accounts_data.items():
-                decrypted_accounts[email] = account_info.copy()
-                if 'password_encrypted' in account_info:
-                    try:
-                        decrypted_accounts[email]['password'] = self._decrypt_password(
-                            account_info['password_encrypted']
-                        )
-                        # Ne pas garder la version chiffrée en mémoire
-                        del decrypted_accounts[email]['password_encrypted']
-                    except Exception as e:
-                        logger.error(f"Erreur lors du déchiffrement du mot de passe pour {email}: {e}")
-                        continue
-            
-            return decrypted_accounts
+                return json.load(f)
         except json.JSONDecodeError as e:
             logger.error(f"Erreur de décodage JSON: {e}")
             return {}
@@ -102,44 +223,88 @@ class AccountManager:
             logger.error(f"Erreur lors du chargement des comptes: {e}")
             return {}
     
+    def _write_raw(self, raw_accounts: Dict) -> bool:
+        """
+        Écrit les enregistrements tels quels (les jetons inchangés ne sont pas rechiffrés).
+        Remplacement atomique, permissions restrictives dès la création du fichier temporaire.
+        """
+        try:
+            write_json_atomic(self.accounts_file, raw_accounts, mode=0o600, indent=4, ensure_ascii=False)
+            logger.info(f"Comptes sauvegardés: {len(raw_accounts)} compte(s)")
+            return True
+        except Exception as e:
+            logger.error(f"Erreur lors de la sauvegarde des comptes: {e}")
+            return False
+    
+    def _decrypt_records(self, raw_accounts: Dict) -> Dict:
+        """Remplace password_encrypted par le mot de passe en clair (déchiffrement par lot)."""
+        passwords = self.decrypt_many(
+            info['password_encrypted'] for info in raw_accounts.values() if 'password_encrypted' in info
+        )
+        decrypted_accounts = {}
+        for email, account_info in raw_accounts.items():
+            decrypted_accounts[email] = account_info.copy()
+            if 'password_encrypted' in account_info:
+                password = passwords.get(account_info['password_encrypted'])
+                if password is None:
+                    logger.error(f"Erreur lors du déchiffrement du mot de passe pour {email}")
+                    continue
+                decrypted_accounts[email]['password'] = password
+                # Ne pas garder la version chiffrée en mémoire
+                del decrypted_accounts[email]['password_encrypted']
+        return decrypted_accounts
+    
+    def _token_for(self, password: str, current_token: Optional[str], cache: bool = True) -> str:
+        """Réutilise le jeton existant si le mot de passe n'a pas changé, sinon chiffre."""
+        if current_token:
+            try:
+                if self._decrypt_password(current_token, cache=cache) == password:
+                    return current_token
+            except Exception:
+                pass
+        return self._encrypt_password(password, cache=cache)
+    
+    def load_accounts(self) -> Dict:
+        """Charge tous les comptes depuis le fichier (mots de passe déchiffrés par lot)."""
+        return self._decrypt_records(self._read_raw())
+    
+    def load_accounts_metadata(self) -> Dict:
+        """
+        Charge les comptes sans déchiffrer les mots de passe.
+        Le mot de passe chiffré est retiré des enregistrements retournés.
+        """
+        accounts_data = self._read_raw()
+        for account_info in accounts_data.values():
+            account_info.pop('password_encrypted', None)
+        return accounts_data
+    
     def save_accounts(self, accounts: Dict):
-        """Sauvegarde tous les comptes dans le fichier avec chiffrement."""
+        """
+        Sauvegarde tous les comptes dans le fichier avec chiffrement.
+        Seuls les mots de passe nouveaux ou modifiés sont chiffrés: les autres gardent leur jeton.
+        """
         try:
-            # Préparer les données avec mots de passe chiffrés
+            current = self._read_raw()
             encrypted_accounts = {}
             for email, account_info in accounts.items():
                 encrypted_accounts[email] = account_info.copy()
                 # Chiffrer le mot de passe si présent
                 if 'password' in encrypted_accounts[email]:
-                    encrypted_accounts[email]['password_encrypted'] = self._encrypt_password(
-                        encrypted_accounts[email]['password']
+                    encrypted_accounts[email]['password_encrypted'] = self._token_for(
+                        encrypted_accounts[email].pop('password'),
+                        current.get(email, {}).get('password_encrypted')
                     )
-                    # Ne pas sauvegarder le mot de passe en clair
-                    del encrypted_accounts[email]['password']
-            
-            with open(self.accounts_file, 'w', encoding='utf-8') as f:
-                json.dump(encrypted_accounts, f, indent=4, ensure_ascii=False)
-            
-            # Permissions restrictives
-            os.chmod(self.accounts_file, 0o600)
-            logger.info(f"Comptes sauvegardés: {len(accounts)} compte(s)")
-            return True
         except Exception as e:
             logger.error(f"Erreur lors de la sauvegarde des comptes: {e}")
             return False
+        return self._write_raw(encrypted_accounts)
     
-    def add_account(self, email: str, password: str, config: Optional[Dict] = None) -> bool:
+    @staticmethod
+    def _new_record(existing: Optional[Dict], config: Optional[Dict] = None) -> Dict:
         """
-        Ajoute ou met à jour un compte.
-        Les valeurs par défaut sont appliquées automatiquement si non spécifiées.
-        
-        Args:
-            email: Email du compte Starlink
-            password: Mot de passe (sera chiffré)
-            config: Configuration optionnelle du compte (valeurs par défaut si None)
+        Configuration d'un compte ajouté ou remplacé (sans email ni mot de passe):
+        valeurs par défaut, stats et dates préservées d'un compte existant, puis config fournie.
         """
-        accounts = self.load_accounts()
-        
         # Configuration par défaut optimale
         default_config = {
             'enabled': True,
@@ -153,8 +318,7 @@ class AccountManager:
         }
         
         # Si le compte existe déjà, préserver certaines données
-        if email in accounts:
-            existing = accounts[email]
+        if existing is not None:
             # Préserver les stats et l'historique
             default_config['stats'] = existing.get('stats', {
                 'total_runs': 0,
@@ -181,51 +345,174 @@ class AccountManager:
         if config:
             default_config.update(config)
         
+        default_config.pop('password', None)
+        default_config.pop('password_encrypted', None)
+        return default_config
+    
+    @_synchronized
+    def add_account(self, email: str, password: str, config: Optional[Dict] = None) -> bool:
+        """
+        Ajoute ou met à jour un compte.
+        Les valeurs par défaut sont appliquées automatiquement si non spécifiées.
+        
+        Args:
+            email: Email du compte Starlink
+            password: Mot de passe (sera chiffré)
+            config: Configuration optionnelle du compte (valeurs par défaut si None)
+        """
+        # Enregistrements bruts: les autres comptes ne sont ni déchiffrés ni rechiffrés
+        accounts = self._read_raw()
+        
+        default_config = self._new_record(accounts.get(email), config)
+        
+        try:
+            token = self._token_for(password, accounts.get(email, {}).get('password_encrypted'))
+        except Exception as e:
+            logger.error(f"Erreur lors du chiffrement du mot de passe pour {email}: {e}")
+            return False
         account_config = {
             'email': email,
-            'password': password,
+            'password_encrypted': token,
             **default_config
         }
         
         accounts[email] = account_config
-        return self.save_accounts(accounts)
+        return self._write_raw(accounts)
+    
+    @_synchronized
+    def import_accounts(self, records: Iterable[Dict], overwrite: bool = True,
+                        batch_size: int = IMPORT_BATCH_SIZE) -> Dict:
+        """
+        Importe des comptes en masse depuis un itérable (lu au fil de l'eau).
+        Chaque enregistrement contient email, password et des options facultatives.
+        Les mots de passe sont chiffrés par lots et le fichier n'est écrit qu'une fois, à la fin.
+        
+        Args:
+            records: Enregistrements validés (account_io.read_account_records)
+            overwrite: Remplacer les comptes existants (sinon ils sont ignorés)
+            batch_size: Nombre de mots de passe chiffrés par lot
+        
+        Returns:
+            Dict: added, updated, skipped (listes d'emails) et saved (bool)
+        """
+        accounts = self._read_raw()
+        existing_emails = set(accounts)
+        summary = {'added': [], 'updated': [], 'skipped': [], 'saved': False}
+        batch = []
+        
+        def _flush():
+            tokens = self.encrypt_many(
+                [password for _, password, _ in batch],
+                [accounts.get(email, {}).get('password_encrypted') for email, _, _ in batch]
+            )
+            for (email, _, account_config), token in zip(batch, tokens):
+                accounts[email] = {'email': email, 'password_encrypted': token, **account_config}
+            batch.clear()
+        
+        seen = set()
+        for record in records:
+            record = dict(record)
+            email = record.pop('email')
+            password = record.pop('password')
+            if email in existing_emails and not overwrite:
+                summary['skipped'].append(email)
+                continue
+            if email not in seen:
+                seen.add(email)
+                summary['updated' if email in existing_emails else 'added'].append(email)
+            batch.append((email, password, self._new_record(accounts.get(email), record)))
+            if len(batch) >= batch_size:
+                _flush()
+        _flush()
+        
+        if seen:
+            summary['saved'] = self._write_raw(accounts)
+        return summary
+    
+    def export_accounts(self, with_passwords: bool = False, enabled_only: bool = False) -> Iterator[Dict]:
+        """
+        Produit les comptes un par un pour un export en flux.
+        Avec with_passwords, chaque mot de passe est déchiffré au moment où il est produit,
+        sans être conservé: la flotte déchiffrée n'est jamais entièrement en mémoire.
+        """
+        for email, account_info in self._read_raw().items():
+            if enabled_only and not account_info.get('enabled', True):
+                continue
+            record = {key: value for key, value in account_info.items() if key != 'password_encrypted'}
+            record.setdefault('email', email)
+            if with_passwords and 'password_encrypted' in account_info:
+                try:
+                    record['password'] = self._decrypt_password(account_info['password_encrypted'], cache=False)
+                except Exception:
+                    logger.error(f"Mot de passe de {email} indéchiffrable - exporté sans mot de passe")
+            yield record
     
-    def remove_account(self, email: str) -> bool:
-        """Supprime un compte."""
-        accounts = self.load_accounts()
+    @_synchronized
+    def remove_account(self, email: str, keep_fleet_totals: bool = False) -> bool:
+        """
+        Supprime un compte.
+        keep_fleet_totals: ne pas retirer ses compteurs des totaux de la flotte (renommage:
+        les statistiques ont été reprises par le nouveau compte).
+        """
+        accounts = self._read_raw()
         if email in accounts:
+            removed_stats = accounts[email].get('stats', {})
             del accounts[email]
-            return self.save_accounts(accounts)
+            if self._write_raw(accounts):
+                if not keep_fleet_totals:
+                    self._discard_fleet_totals(removed_stats)
+                return True
+            return False
         return False
     
     def get_account(self, email: str) -> Optional[Dict]:
-        """Récupère un compte spécifique."""
-        accounts = self.load_accounts()
-        return accounts.get(email)
+        """Récupère un compte spécifique (seul son mot de passe est déchiffré)."""
+        account = self._read_raw().get(email)
+        if account is None:
+            return None
+        return self._decrypt_records({email: account})[email]
     
     def get_all_accounts(self, enabled_only: bool = False) -> Dict:
-        """Récupère tous les comptes."""
-        accounts = self.load_accounts()
+        """Récupère tous les comptes (les comptes désactivés ne sont pas déchiffrés avec enabled_only)."""
+        accounts = self._read_raw()
+        if enabled_only:
+            accounts = {email: acc for email, acc in accounts.items() if acc.get('enabled', True)}
+        return self._decrypt_records(accounts)
+    
+    def get_account_metadata(self, email: str) -> Optional[Dict]:
+        """Récupère un compte sans son mot de passe (aucun déchiffrement)."""
+        return self.load_accounts_metadata().get(email)
+    
+    def get_all_accounts_metadata(self, enabled_only: bool = False) -> Dict:
+        """Récupère tous les comptes sans leurs mots de passe (aucun déchiffrement)."""
+        accounts = self.load_accounts_metadata()
         if enabled_only:
             return {email: acc for email, acc in accounts.items() if acc.get('enabled', True)}
         return accounts
     
     def list_accounts(self) -> List[str]:
         """Liste les emails de tous les comptes."""
-        return list(self.load_accounts().keys())
+        return list(self.load_accounts_metadata().keys())
     
+    @_synchronized
     def update_account_config(self, email: str, config_updates: Dict) -> bool:
         """Met à jour la configuration d'un compte."""
-        accounts = self.load_accounts()
+        accounts = self._read_raw()
         if email not in accounts:
             return False
         
+        config_updates = dict(config_updates)
+        if 'password' in config_updates:
+            accounts[email]['password_encrypted'] = self._token_for(
+                config_updates.pop('password'), accounts[email].get('password_encrypted')
+            )
         accounts[email].update(config_updates)
-        return self.save_accounts(accounts)
+        return self._write_raw(accounts)
     
+    @_synchronized
     def update_account_stats(self, email: str, success: bool):
-        """Met à jour les statistiques d'un compte."""
-        accounts = self.load_accounts()
+        """Met à jour les statistiques d'un compte (sans déchiffrer ni rechiffrer les mots de passe)."""
+        accounts = self._read_raw()
         if email not in accounts:
             return False
         
@@ -252,7 +539,160 @@ class AccountManager:
             stats['last_failure'] = timestamp
         
         accounts[email]['last_run'] = timestamp
-        return self.save_accounts(accounts)
+        if not self._write_raw(accounts):
+            return False
+        self._record_fleet_run(success, timestamp)
+        return True
+    
+    def _empty_fleet_stats(self) -> Dict:
+        return {
+            'totals': {
+                'total_runs': 0,
+                'successful_updates': 0,
+                'failed_updates': 0
+            },
+            'daily': {},
+            'last_success': None,
+            'last_failure': None
+        }
+    
+    def _load_fleet_stats(self) -> Dict:
+        """Charge les agrégats de la flotte (reconstruits depuis les comptes si absents)."""
+        if not os.path.exists(self.fleet_stats_file):
+            return self.rebuild_fleet_stats()
+        try:
+            with open(self.fleet_stats_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Agrégats de flotte illisibles, reconstruction: {e}")
+            return self.rebuild_fleet_stats()
+    
+    def _save_fleet_stats(self, fleet_stats: Dict):
+        # Fichier temporaire puis remplacement atomique: un lecteur (cli.py stats) ou une
+        # interruption ne voit jamais un fichier à moitié écrit
+        try:
+            write_json_atomic(self.fleet_stats_file, fleet_stats, indent=4)
+        except Exception as e:
+            logger.error(f"Erreur lors de la sauvegarde des agrégats de flotte: {e}")
+    
+    @_synchronized
+    def rebuild_fleet_stats(self) -> Dict:
+        """
+        Recalcule les totaux de la flotte depuis les statistiques par compte (sans déchiffrement).
+        L'historique journalier ne peut pas être reconstruit et repart de zéro.
+        """
+        fleet_stats = self._empty_fleet_stats()
+        totals = fleet_stats['totals']
+        for account in self.load_accounts_metadata().values():
+            stats = account.get('stats', {})
+            for key in totals:
+                totals[key] += stats.get(key, 0)
+            for key in ('last_success', 'last_failure'):
+                if stats.get(key) and (not fleet_stats[key] or stats[key] > fleet_stats[key]):
+                    fleet_stats[key] = stats[key]
+        self._save_fleet_stats(fleet_stats)
+        return fleet_stats
+    
+    def _record_fleet_run(self, success: bool, timestamp: str):
+        """Met à jour incrémentalement les totaux et le compteur du jour de la flotte."""
+        # Première exécution: la reconstruction depuis les comptes inclut déjà ce run
+        count_totals = os.path.exists(self.fleet_stats_file)
+        fleet_stats = self._load_fleet_stats()
+        totals = fleet_stats['totals']
+        
+        day = timestamp[:10]
+        bucket = fleet_stats['daily'].setdefault(day, {'runs': 0, 'successes': 0, 'failures': 0})
+        bucket['runs'] += 1
+        if count_totals:
+            totals['total_runs'] += 1
+        
+        if success:
+            bucket['successes'] += 1
+            if count_totals:
+                totals['successful_updates'] += 1
+            fleet_stats['last_success'] = timestamp
+        else:
+            bucket['failures'] += 1
+            if count_totals:
+                totals['failed_updates'] += 1
+            fleet_stats['last_failure'] = timestamp
+        
+        # Ne conserver que les jours récents
+        if len(fleet_stats['daily']) > self.FLEET_STATS_RETENTION_DAYS:
+            for old_day in sorted(fleet_stats['daily'])[:-self.FLEET_STATS_RETENTION_DAYS]:
+                del fleet_stats['daily'][old_day]
+        
+        self._save_fleet_stats(fleet_stats)
+    
+    def _discard_fleet_totals(self, account_stats: Dict):
+        """Retire des totaux de la flotte les compteurs d'un compte supprimé."""
+        if not os.path.exists(self.fleet_stats_file):
+            return
+        fleet_stats = self._load_fleet_stats()
+        totals = fleet_stats['totals']
+        for key in totals:
+            totals[key] = max(0, totals[key] - account_stats.get(key, 0))
+        self._save_fleet_stats(fleet_stats)
+    
+    def get_fleet_stats(self) -> Dict:
+        """
+        Retourne le résumé des statistiques de la flotte sans parcourir les comptes.
+        Inclut les totaux, le taux de succès global et les taux d'échec sur fenêtres glissantes.
+        """
+        from datetime import date, timedelta
+        fleet_stats = self._load_fleet_stats()
+        totals = fleet_stats['totals']
+        
+        summary = dict(totals)
+        summary['success_rate'] = (
+            totals['successful_updates'] / totals['total_runs'] * 100 if totals['total_runs'] else None
+        )
+        summary['last_success'] = fleet_stats.get('last_success')
+        summary['last_failure'] = fleet_stats.get('last_failure')
+        
+        today = date.today()
+        windows = {}
+        for label, days in self.FLEET_STATS_WINDOWS.items():
+            runs = failures = 0
+            for offset in range(days):
+                bucket = fleet_stats['daily'].get((today - timedelta(days=offset)).isoformat())
+                if bucket:
+                    runs += bucket['runs']
+                    failures += bucket['failures']
+            windows[label] = {
+                'runs': runs,
+                'failures': failures,
+                'failure_rate': failures / runs * 100 if runs else None
+            }
+        summary['windows'] = windows
+        return summary
+    
+    @_synchronized
+    def migrate_encryption(self) -> Optional[int]:
+        """
+        Convertit les mots de passe de l'ancien format (jeton Fernet encodé une seconde fois
+        en base64) vers le jeton Fernet seul. Aucun déchiffrement n'est nécessaire.
+        Retourne le nombre d'enregistrements convertis, None si la sauvegarde a échoué.
+        """
+        accounts = self._read_raw()
+        migrated = 0
+        for email, account_info in accounts.items():
+            token = account_info.get('password_encrypted')
+            if not token or not self._is_wrapped(token):
+                continue
+            try:
+                unwrapped = self._unwrap(token)
+            except Exception as e:
+                logger.error(f"Mot de passe chiffré illisible pour {email}: {e}")
+                continue
+            if not unwrapped.startswith(FERNET_TOKEN_PREFIX):
+                logger.error(f"Mot de passe chiffré de format inconnu pour {email} - non converti")
+                continue
+            account_info['password_encrypted'] = unwrapped
+            migrated += 1
+        if migrated and not self._write_raw(accounts):
+            return None
+        return migrated
     
     def enable_account(self, email: str) -> bool:
         """Active un compte."""
@@ -0,0 +1,111 @@
+"""
+Cache des adresses acceptées par le portail Starlink.
+Pour chaque adresse résolue (clé normalisée), conserve la forme canonique à saisir dans le portail
+(vérifiée par geocoding direct) et la suggestion d'autocomplétion que le portail a acceptée.
+Une adresse déjà acceptée est ainsi saisie en une seule étape, sans essais successifs.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+from address_utils import address_key
+
+logger = logging.getLogger("GeoAgile.AddressCache")
+
+ACCEPTED_ADDRESSES_FILE = "accepted_addresses.json"
+
+
+def cache_key(address: Optional[str]) -> Optional[str]:
+    """Clé de cache d'une adresse: code postal et mots normalisés (ordre et ponctuation ignorés)."""
+    key = address_key(address)
+    if key is None:
+        return None
+    return f"{key.postcode or ''}|{' '.join(key.tokens)}"
+
+
+class AcceptedAddressCache:
+    """
+    Cache persistant clé d'adresse -> {query, verified, accepted, accepted_count, updated}.
+    query: forme canonique à saisir; accepted: texte de la suggestion acceptée par le portail.
+    """
+
+    def __init__(self, cache_file: str = ACCEPTED_ADDRESSES_FILE):
+        self.cache_file = cache_file
+        self.entries: Dict[str, Dict] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _read(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Cache d'adresses acceptées illisible: {e}")
+            return {}
+
+    def _load(self):
+        self.entries = self._read()
+
+    def save(self):
+        """
+        Fusionne avec le fichier (écrit aussi par les workers navigateur) puis le remplace atomiquement.
+        Ne fait rien si le cache n'a pas été modifié.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            merged = self._read()
+            for key, entry in self.entries.items():
+                current = merged.get(key)
+                if current is None or entry.get("updated", 0) >= current.get("updated", 0):
+                    merged[key] = entry
+            self.entries = merged
+            tmp_file = f"{self.cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(merged, f, indent=4, ensure_ascii=False)
+                os.replace(tmp_file, self.cache_file)
+                self._dirty = False
+            except Exception as e:
+                logger.error(f"Erreur lors de la sauvegarde du cache d'adresses acceptées: {e}")
+
+    def get(self, address: str) -> Optional[Dict]:
+        key = cache_key(address)
+        return self.entries.get(key) if key else None
+
+    def remember_query(self, address: str, query: str, verified: bool):
+        """Enregistre la forme canonique calculée pour une adresse (sans écraser la suggestion acceptée)."""
+        key = cache_key(address)
+        if not key:
+            return
+        with self._lock:
+            entry = self.entries.setdefault(key, {})
+            entry.update({"query": query, "verified": verified, "updated": time.time()})
+            self._dirty = True
+
+    def remember_accepted(self, address: str, suggestion: str):
+        """Enregistre la suggestion du portail acceptée pour cette adresse."""
+        key = cache_key(address)
+        if not key or not suggestion:
+            return
+        with self._lock:
+            entry = self.entries.setdefault(key, {})
+            entry["accepted_count"] = entry.get("accepted_count", 0) + 1 if entry.get("accepted") == suggestion else 1
+            entry.update({"accepted": suggestion, "updated": time.time()})
+            self._dirty = True
+
+    def forget_accepted(self, address: str):
+        """Oublie une suggestion qui n'est plus proposée par le portail."""
+        key = cache_key(address)
+        with self._lock:
+            entry = self.entries.get(key) if key else None
+            if entry and entry.pop("accepted", None) is not None:
+                entry.pop("accepted_count", None)
+                entry["updated"] = time.time()
+                self._dirty = True
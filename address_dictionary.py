@@ -0,0 +1,123 @@
+"""
+Dictionnaire des adresses résolues.
+Chaque adresse normalisée (address_utils.address_key) reçoit un identifiant entier stable, enregistré
+dans une table SQLite partagée. L'état et l'historique des comptes conservent l'identifiant au lieu
+de la chaîne Nominatim complète: fichiers plus petits, chargement plus rapide et comparaison
+"adresse inchangée" par simple égalité d'entiers.
+"""
+import logging
+import sqlite3
+import threading
+from typing import Dict, Optional, Union
+
+from address_utils import address_key, addresses_match
+
+logger = logging.getLogger("GeoAgile.AddressDictionary")
+
+ADDRESSES_DB = "addresses.db"
+
+
+def normalized_key(address: Optional[str]) -> Optional[str]:
+    """Clé texte d'une adresse: deux adresses de même clé sont identiques pour addresses_match."""
+    key = address_key(address)
+    if key is None:
+        return None
+    return f"{key.postcode or ''}|{key.locality or ''}|{' '.join(key.tokens)}"
+
+
+class AddressDictionary:
+    """Table adresse normalisée <-> identifiant entier, avec cache en mémoire."""
+
+    def __init__(self, db_path: str = ADDRESSES_DB):
+        self.db_path = db_path
+        self._ids: Dict[str, int] = {}
+        self._addresses: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS addresses ("
+                "id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, address TEXT NOT NULL)"
+            )
+            for address_id, key, address in conn.execute("SELECT id, key, address FROM addresses"):
+                self._ids[key] = address_id
+                self._addresses[address_id] = address
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def __len__(self) -> int:
+        return len(self._addresses)
+
+    def intern(self, address: Optional[str]) -> Optional[int]:
+        """
+        Identifiant de l'adresse, attribué à sa première apparition.
+        La première forme rencontrée est conservée comme texte de référence. None si l'adresse est vide.
+        """
+        key = normalized_key(address)
+        if key is None:
+            return None
+        address_id = self._ids.get(key)
+        if address_id is not None:
+            return address_id
+        conn = self._connect()
+        try:
+            # INSERT OR IGNORE: un autre processus a pu enregistrer la même adresse entre-temps
+            conn.execute("INSERT OR IGNORE INTO addresses (key, address) VALUES (?, ?)", (key, address))
+            address_id, stored = conn.execute(
+                "SELECT id, address FROM addresses WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            conn.close()
+        with self._lock:
+            self._ids[key] = address_id
+            self._addresses[address_id] = stored
+        return address_id
+
+    def address(self, address_id: Optional[int]) -> Optional[str]:
+        """Texte d'une adresse à partir de son identifiant."""
+        if address_id is None:
+            return None
+        address = self._addresses.get(address_id)
+        if address is None:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT key, address FROM addresses WHERE id = ?", (address_id,)).fetchone()
+            finally:
+                conn.close()
+            if row is None:
+                logger.warning(f"Identifiant d'adresse inconnu: {address_id}")
+                return None
+            with self._lock:
+                self._ids[row[0]] = address_id
+                self._addresses[address_id] = address = row[1]
+        return address
+
+    def resolve(self, value: Union[int, str, None]) -> Optional[str]:
+        """Texte d'une valeur enregistrée: identifiant ou chaîne (états et historiques antérieurs)."""
+        if isinstance(value, int):
+            return self.address(value)
+        return value
+
+    def same_address(self, address_id: Optional[int], other: Union[int, str, None]) -> bool:
+        """Compare un identifiant à un identifiant (égalité d'entiers) ou à une ancienne chaîne."""
+        if address_id is None or other is None:
+            return False
+        if isinstance(other, int):
+            return address_id == other
+        return addresses_match(self.address(address_id), other)
+
+
+_default_dictionary: Optional[AddressDictionary] = None
+_default_dictionary_lock = threading.Lock()
+
+
+def default_dictionary() -> AddressDictionary:
+    """Dictionnaire partagé par tout le processus."""
+    global _default_dictionary
+    with _default_dictionary_lock:
+        if _default_dictionary is None:
+            _default_dictionary = AddressDictionary()
+        return _default_dictionary
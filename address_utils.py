@@ -0,0 +1,74 @@
+"""
+Normalisation et comparaison d'adresses postales.
+Permet de savoir si une adresse résolue est déjà celle enregistrée sur le portail
+sans lancer de navigateur.
+"""
+import re
+import unicodedata
+from typing import NamedTuple, Optional, Tuple
+
+# Codes postaux: numériques (75007, 1000, 10115) ou alphanumériques (SW1A 1AA, H2X 1Y4)
+POSTCODE_PATTERN = re.compile(
+    r"^(\d{4,6}(-\d{3,4})?|[a-z]{1,2}\d[a-z\d]?\s?\d[a-z]{2}|[a-z]\d[a-z]\s?\d[a-z]\d)$"
+)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class AddressKey(NamedTuple):
+    """Clé de comparaison d'une adresse normalisée."""
+    postcode: Optional[str]
+    locality: Optional[str]
+    tokens: Tuple[str, ...]
+
+
+def _fold(text: str) -> str:
+    """Passe en minuscules (casefold) et supprime les accents."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def address_key(address: Optional[str]) -> Optional[AddressKey]:
+    """
+    Calcule la clé normalisée d'une adresse.
+    Les composants sont séparés par des virgules (format Nominatim); le code postal
+    est le dernier composant qui ressemble à un code postal et la localité est le
+    composant non numérique qui le précède (ou l'avant-dernier composant à défaut).
+    Retourne None si l'adresse est vide.
+    """
+    if not address or not address.strip():
+        return None
+
+    components = [c.strip() for c in _fold(address).split(",") if c.strip()]
+
+    postcode = None
+    postcode_index = None
+    for index in range(len(components) - 1, -1, -1):
+        if POSTCODE_PATTERN.match(components[index]):
+            postcode = components[index].replace(" ", "")
+            postcode_index = index
+            break
+
+    locality = None
+    if postcode_index is not None:
+        candidates = components[:postcode_index]
+    else:
+        candidates = components[:-1] if len(components) > 1 else components
+    for component in reversed(candidates):
+        if not component.isdigit():
+            locality = " ".join(TOKEN_PATTERN.findall(component)) or None
+            break
+
+    tokens = tuple(sorted(set(TOKEN_PATTERN.findall(", ".join(components)))))
+    return AddressKey(postcode, locality, tokens)
+
+
+def addresses_match(address1: Optional[str], address2: Optional[str]) -> bool:
+    """
+    Indique si deux adresses désignent la même adresse postale
+    (insensible à la casse, aux accents, à la ponctuation et à l'ordre des mots).
+    """
+    key1 = address_key(address1)
+    key2 = address_key(address2)
+    if key1 is None or key2 is None:
+        return False
+    return key1 == key2
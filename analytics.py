@@ -0,0 +1,279 @@
+"""
+Analyses de l'historique d'exécution de la flotte.
+L'historique de tous les comptes est chargé dans des colonnes NumPy puis agrégé de façon vectorisée:
+fréquence des mises à jour, temps entre déplacements, distribution des distances,
+taux de succès par fenêtre et latences par étape.
+"""
+import os
+import json
+import glob
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("GeoAgile.Analytics")
+
+HISTORY_DIR = "history"
+STATE_DIR = "states"
+CACHE_FILE = "analytics_cache.npz"
+STAGES = ("gps", "geocoding", "portal")
+PERCENTILES = (50, 90, 95, 99)
+SUCCESS_WINDOWS_DAYS = (1, 7, 30)
+
+# Colonnes de l'historique et leur type
+COLUMNS = {
+    "account": np.int32,
+    "timestamp": np.float64,
+    "latitude": np.float64,
+    "longitude": np.float64,
+    "distance_km": np.float64,
+    "triggered": bool,
+    "success": bool,
+    "unchanged": bool,
+    **{f"stage_{stage}": np.float64 for stage in STAGES},
+}
+
+
+def _safe_email(email: str) -> str:
+    return email.replace('@', '_at_').replace('.', '_')
+
+
+def _parse_timestamp(value) -> float:
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _percentiles(values: np.ndarray) -> Optional[Dict[str, float]]:
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return None
+    return {f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+class ExecutionHistory:
+    """Historique d'exécution de la flotte stocké en colonnes (une entrée par exécution)."""
+
+    def __init__(self, accounts: List[str], columns: Dict[str, np.ndarray]):
+        self.accounts = accounts
+        self.account = columns["account"]
+        self.timestamp = columns["timestamp"]
+        self.latitude = columns["latitude"]
+        self.longitude = columns["longitude"]
+        self.distance_km = columns["distance_km"]
+        self.triggered = columns["triggered"]
+        self.success = columns["success"]
+        self.unchanged = columns["unchanged"]
+        self.stage_durations = {stage: columns[f"stage_{stage}"] for stage in STAGES}
+
+    def __len__(self):
+        return int(self.account.size)
+
+    @staticmethod
+    def _entries_to_columns(entries_by_index: Dict[int, Iterable[Dict]]) -> Dict[str, np.ndarray]:
+        """Convertit des entrées execution_log en colonnes NumPy."""
+        rows = {name: [] for name in COLUMNS}
+        for account_index, entries in entries_by_index.items():
+            for entry in entries:
+                coords = entry.get("gps_coordinates") or {}
+                durations = entry.get("stage_durations_s") or {}
+                distance = entry.get("distance_km")
+                rows["account"].append(account_index)
+                rows["timestamp"].append(_parse_timestamp(entry.get("timestamp")))
+                rows["latitude"].append(coords.get("latitude", np.nan))
+                rows["longitude"].append(coords.get("longitude", np.nan))
+                rows["distance_km"].append(np.nan if distance is None else distance)
+                rows["triggered"].append(bool(entry.get("update_triggered")))
+                rows["success"].append(bool(entry.get("update_successful")))
+                rows["unchanged"].append(bool(entry.get("address_unchanged")))
+                for stage in STAGES:
+                    rows[f"stage_{stage}"].append(durations.get(stage, np.nan))
+        return {name: np.array(values, dtype=COLUMNS[name]) for name, values in rows.items()}
+
+    @staticmethod
+    def _concat(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        parts = [part for part in parts if part]
+        if not parts:
+            return {name: np.array([], dtype=dtype) for name, dtype in COLUMNS.items()}
+        return {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+
+    @classmethod
+    def from_entries(cls, entries_by_account: Dict[str, Iterable[Dict]]) -> "ExecutionHistory":
+        """Construit l'historique à partir des entrées execution_log de chaque compte."""
+        accounts = list(entries_by_account)
+        columns = cls._entries_to_columns(dict(enumerate(entries_by_account.values())))
+        return cls(accounts, columns)
+
+    @staticmethod
+    def _load_cache(cache_file: str):
+        """Charge le cache colonnaire: (stems, offsets, colonnes) ou un cache vide."""
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with np.load(cache_file, allow_pickle=False) as data:
+                    stems = [str(stem) for stem in data["stems"]]
+                    offsets = dict(zip(stems, (int(o) for o in data["offsets"])))
+                    columns = {name: data[name] for name in COLUMNS}
+                return stems, offsets, columns
+            except Exception as e:
+                logger.warning(f"Cache d'analyse illisible, reconstruction: {e}")
+        return [], {}, None
+
+    @staticmethod
+    def _save_cache(cache_file: str, stems: List[str], offsets: Dict[str, int], columns: Dict[str, np.ndarray]):
+        try:
+            with open(cache_file, 'wb') as f:
+                np.savez(
+                    f,
+                    stems=np.array(stems, dtype=str),
+                    offsets=np.array([offsets.get(stem, 0) for stem in stems], dtype=np.int64),
+                    **columns
+                )
+        except Exception as e:
+            logger.warning(f"Impossible de sauvegarder le cache d'analyse: {e}")
+
+    @classmethod
+    def load(cls, emails: Optional[Iterable[str]] = None, history_dir: str = HISTORY_DIR,
+             state_dir: str = STATE_DIR, cache_file: Optional[str] = CACHE_FILE) -> "ExecutionHistory":
+        """
+        Charge l'historique de la flotte.
+        Les journaux complets (history/*.jsonl) sont ingérés de façon incrémentale dans un cache
+        colonnaire: seules les lignes ajoutées depuis le dernier chargement sont analysées.
+        Les comptes sans journal utilisent les 100 dernières entrées de leur état.
+        """
+        labels = {_safe_email(email): email for email in (emails or [])}
+        stems, offsets, cached = cls._load_cache(cache_file)
+        parts = [cached]
+        stem_index = {stem: index for index, stem in enumerate(stems)}
+        cache_changed = False
+
+        history_stems = set()
+        for path in sorted(glob.glob(os.path.join(history_dir, "*.jsonl"))):
+            stem = os.path.splitext(os.path.basename(path))[0]
+            history_stems.add(stem)
+            size = os.path.getsize(path)
+            offset = offsets.get(stem, 0)
+            if stem in stem_index and size == offset:
+                continue
+            if size < offset:
+                # Journal réécrit: ses lignes en cache ne sont plus valides
+                keep = parts[0]["account"] != stem_index[stem]
+                parts[0] = {name: values[keep] for name, values in parts[0].items()}
+                offset = 0
+            if stem not in stem_index:
+                stem_index[stem] = len(stems)
+                stems.append(stem)
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read()
+                # Ignorer une éventuelle dernière ligne en cours d'écriture
+                complete = data[:data.rfind(b"\n") + 1]
+                entries = [json.loads(line) for line in complete.splitlines() if line.strip()]
+            except Exception as e:
+                logger.warning(f"Historique illisible pour {stem}: {e}")
+                continue
+            parts.append(cls._entries_to_columns({stem_index[stem]: entries}))
+            offsets[stem] = offset + len(complete)
+            cache_changed = True
+
+        columns = cls._concat(parts)
+        if cache_file and cache_changed:
+            cls._save_cache(cache_file, stems, offsets, columns)
+
+        # Comptes sans journal complet: dernier historique conservé dans l'état
+        state_entries = {}
+        state_stems = {os.path.splitext(os.path.basename(path))[0]
+                       for path in glob.glob(os.path.join(state_dir, "*.json"))}
+        for stem in sorted(state_stems - history_stems):
+            try:
+                with open(os.path.join(state_dir, f"{stem}.json"), 'r', encoding='utf-8') as f:
+                    entries = json.load(f).get("execution_history", [])
+            except Exception as e:
+                logger.warning(f"État illisible pour {stem}: {e}")
+                continue
+            if stem not in stem_index:
+                stem_index[stem] = len(stems)
+                stems.append(stem)
+            state_entries[stem_index[stem]] = entries
+        if state_entries:
+            columns = cls._concat([columns, cls._entries_to_columns(state_entries)])
+
+        # Comptes présents dans le cache mais dont le journal a disparu
+        active = np.array([stem in history_stems or stem in state_stems for stem in stems], dtype=bool)
+        if active.size and not active.all():
+            keep = active[columns["account"]]
+            columns = {name: values[keep] for name, values in columns.items()}
+
+        return cls([labels.get(stem, stem) for stem in stems], columns)
+
+    def _updates_mask(self) -> np.ndarray:
+        """Exécutions ayant réellement modifié l'adresse sur le portail."""
+        return self.triggered & self.success & ~self.unchanged
+
+    def update_frequency(self, top: int = 10) -> List[Dict]:
+        """Comptes qui mettent le plus souvent leur adresse à jour (mises à jour par jour)."""
+        n_accounts = len(self.accounts)
+        if n_accounts == 0:
+            return []
+        updates = np.bincount(self.account[self._updates_mask()], minlength=n_accounts)
+
+        valid = np.isfinite(self.timestamp)
+        first = np.full(n_accounts, np.inf)
+        last = np.full(n_accounts, -np.inf)
+        np.minimum.at(first, self.account[valid], self.timestamp[valid])
+        np.maximum.at(last, self.account[valid], self.timestamp[valid])
+        span_days = np.where(last > first, (last - first) / 86400.0, 1.0)
+        span_days = np.maximum(span_days, 1.0)
+        per_day = updates / span_days
+
+        order = np.argsort(-per_day, kind="stable")[:top]
+        return [
+            {"account": self.accounts[i], "updates": int(updates[i]), "updates_per_day": float(per_day[i])}
+            for i in order if updates[i] > 0
+        ]
+
+    def time_between_moves_hours(self) -> Optional[Dict[str, float]]:
+        """Percentiles du temps (heures) entre deux mises à jour d'adresse d'un même compte."""
+        mask = self._updates_mask() & np.isfinite(self.timestamp)
+        accounts = self.account[mask]
+        timestamps = self.timestamp[mask]
+        order = np.lexsort((timestamps, accounts))
+        accounts = accounts[order]
+        timestamps = timestamps[order]
+        same_account = accounts[1:] == accounts[:-1]
+        gaps = np.diff(timestamps)[same_account] / 3600.0
+        return _percentiles(gaps)
+
+    def distance_distribution_km(self) -> Optional[Dict[str, float]]:
+        """Percentiles des distances mesurées depuis la dernière mise à jour."""
+        return _percentiles(self.distance_km)
+
+    def success_rate_windows(self, now: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """Taux de succès (%) sur des fenêtres glissantes."""
+        now = now if now is not None else datetime.now().timestamp()
+        rates = {}
+        for days in SUCCESS_WINDOWS_DAYS:
+            in_window = self.timestamp >= now - days * 86400
+            runs = int(np.count_nonzero(in_window))
+            rates[f"{days}j"] = float(self.success[in_window].mean() * 100) if runs else None
+        return rates
+
+    def stage_latencies_s(self) -> Dict[str, Optional[Dict[str, float]]]:
+        """Percentiles des durées (secondes) de chaque étape."""
+        return {stage: _percentiles(values) for stage, values in self.stage_durations.items()}
+
+    def summary(self, top: int = 10) -> Dict:
+        """Rapport complet de la flotte."""
+        return {
+            "accounts": len(self.accounts),
+            "executions": len(self),
+            "updates": int(np.count_nonzero(self._updates_mask())),
+            "update_frequency": self.update_frequency(top),
+            "time_between_moves_h": self.time_between_moves_hours(),
+            "distance_km": self.distance_distribution_km(),
+            "success_rate": self.success_rate_windows(),
+            "stage_latency_s": self.stage_latencies_s(),
+        }
@@ -0,0 +1,171 @@
+"""
+Artefacts de débogage des sessions navigateur (capture DOM, capture d'écran JPEG).
+La capture est faite par le thread de la session (exigence de Playwright) mais l'écriture sur disque
+est déléguée à un thread d'arrière-plan. Chaque exécution et chaque compte ont leur propre répertoire:
+artifacts/<run_id>/<compte>/. Un budget de taille et une durée de rétention bornent l'espace utilisé.
+"""
+import os
+import time
+import queue
+import atexit
+import shutil
+import logging
+import threading
+from datetime import datetime
+from typing import Optional, Tuple
+
+logger = logging.getLogger("GeoAgile.Artifacts")
+
+ARTIFACTS_DIR = "artifacts"
+RUN_ID_ENV = "GEOAGILE_RUN_ID"              # partagé avec les workers navigateur (browser_pool)
+MODE_ENV = "GEOAGILE_ARTIFACTS"             # ex: "dom,jpeg", "dom", "off"
+DEFAULT_MODES = ("dom", "jpeg")
+JPEG_QUALITY = 60
+CAPTURE_TIMEOUT_MS = 5000
+MAX_TOTAL_MB = 200.0
+RETENTION_DAYS = 7
+QUEUE_SIZE = 100
+
+_default_run_id = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+
+def current_run_id() -> str:
+    """Identifiant de l'exécution en cours (celui du journal de main_multi s'il est défini)."""
+    return os.environ.get(RUN_ID_ENV) or _default_run_id
+
+
+def capture_modes() -> Tuple[str, ...]:
+    value = os.environ.get(MODE_ENV)
+    if value is None:
+        return DEFAULT_MODES
+    return tuple(mode.strip() for mode in value.split(",") if mode.strip() and mode.strip() != "off")
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ArtifactWriter:
+    """Écriture asynchrone des artefacts avec budget de taille et rétention."""
+
+    def __init__(self, base_dir: str = ARTIFACTS_DIR, max_total_mb: float = MAX_TOTAL_MB,
+                 retention_days: float = RETENTION_DAYS, queue_size: int = QUEUE_SIZE):
+        self.base_dir = base_dir
+        self.max_total_bytes = int(max_total_mb * 1024 * 1024)
+        self.retention_s = retention_days * 86400
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self.dropped = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, path: str, data: bytes):
+        """Met une écriture en file. Ignorée (jamais bloquante) si la file est pleine."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((path, data))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"File d'artefacts pleine - artefact ignoré: {path}")
+
+    def flush(self, timeout: float = 10.0):
+        """Attend l'écriture des artefacts en file (fin d'exécution ou de worker)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def _run(self):
+        self.enforce_budget(protect=current_run_id())
+        while True:
+            path, data = self._queue.get()
+            try:
+                self._write(path, data)
+            except Exception as e:
+                logger.warning(f"Impossible d'écrire l'artefact {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path: str, data: bytes):
+        if self._total_bytes + len(data) > self.max_total_bytes:
+            self.enforce_budget(protect=current_run_id())
+            if self._total_bytes + len(data) > self.max_total_bytes:
+                self.dropped += 1
+                logger.warning(f"Budget d'artefacts atteint ({self.max_total_bytes / 1048576:.0f} Mo) - "
+                               f"artefact ignoré: {path}")
+                return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self._total_bytes += len(data)
+
+    def enforce_budget(self, protect: Optional[str] = None):
+        """
+        Supprime les exécutions plus anciennes que la rétention, puis les plus anciennes
+        jusqu'à revenir sous le budget de taille (sauf l'exécution protégée).
+        """
+        if not os.path.isdir(self.base_dir):
+            self._total_bytes = 0
+            return
+        runs = []
+        for name in os.listdir(self.base_dir):
+            path = os.path.join(self.base_dir, name)
+            if os.path.isdir(path):
+                runs.append((os.path.getmtime(path), name, path, _directory_size(path)))
+        runs.sort()
+
+        now = time.time()
+        total = sum(size for _, _, _, size in runs)
+        for mtime, name, path, size in runs:
+            expired = now - mtime > self.retention_s
+            if name == protect or not (expired or total > self.max_total_bytes):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logger.info(f"Artefacts de l'exécution {name} supprimés ({size / 1048576:.1f} Mo)")
+        self._total_bytes = total
+
+
+# Écrivain partagé par toutes les sessions du processus
+writer = ArtifactWriter()
+atexit.register(writer.flush)
+
+
+def account_dir(email: str) -> str:
+    safe_email = email.replace('@', '_at_').replace('.', '_')
+    return os.path.join(writer.base_dir, current_run_id(), safe_email)
+
+
+def capture_page(page, email: str, label: str, modes: Optional[Tuple[str, ...]] = None):
+    """
+    Capture l'état d'une page en échec (DOM et/ou capture JPEG de la zone visible) et
+    en délègue l'écriture. Ne lève jamais d'exception: le chemin d'erreur ne doit pas échouer.
+    """
+    modes = capture_modes() if modes is None else modes
+    if page is None or not modes:
+        return
+    prefix = os.path.join(account_dir(email), f"{datetime.now().strftime('%H%M%S-%f')}_{label}")
+    if "dom" in modes:
+        try:
+            writer.submit(f"{prefix}.html", page.content().encode('utf-8'))
+        except Exception as e:
+            logger.debug(f"Capture DOM impossible ({label}): {e}")
+    if "jpeg" in modes:
+        try:
+            image = page.screenshot(type="jpeg", quality=JPEG_QUALITY, full_page=False,
+                                    timeout=CAPTURE_TIMEOUT_MS)
+            writer.submit(f"{prefix}.jpg", image)
+        except Exception as e:
+            logger.debug(f"Capture d'écran impossible ({label}): {e}")
@@ -0,0 +1,244 @@
+"""
+Pool de workers navigateur isolés dans des processus séparés.
+Chaque worker possède son propre Chromium et traite les mises à jour d'adresse une par une;
+un worker bloqué est tué au bout d'un délai maximal, un worker mort est relancé et chaque worker
+est recyclé après un nombre de sessions ou au-delà d'un plafond mémoire.
+Un plantage ou un blocage de Chromium n'affecte ainsi qu'une seule mise à jour.
+"""
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from typing import Dict, Optional
+
+logger = logging.getLogger("GeoAgile.BrowserPool")
+
+JOB_TIMEOUT_S = 300.0          # durée maximale d'une mise à jour avant de tuer le worker
+MAX_JOBS_PER_WORKER = 25       # recyclage du worker (et de son navigateur) après N sessions
+MAX_WORKER_RSS_MB = 1024.0     # recyclage au-delà de ce RSS (worker + Chromium)
+SHUTDOWN_TIMEOUT_S = 10.0
+
+# Les workers ne doivent pas hériter des threads et verrous du processus principal
+_mp = multiprocessing.get_context("spawn")
+
+
+def _worker_main(worker_id: int, conn, headless: bool, lean_profile: bool,
+                 max_jobs: int, max_rss_mb: float):
+    """
+    Boucle d'un worker: reçoit (email, mot de passe, adresse, forme canonique, options) et renvoie le résultat.
+    headless et lean_profile sont ceux du navigateur lancé au démarrage; un job qui demande
+    d'autres valeurs (configuration du compte) relance le navigateur avec les siennes.
+    Le worker se termine de lui-même (recyclage) après max_jobs sessions ou au-delà de max_rss_mb.
+    """
+    from playwright.sync_api import sync_playwright
+    from updater import StarlinkPortalClient, LEAN_LAUNCH_ARGS
+    from memory_guard import process_tree_rss_bytes
+    import artifacts
+
+    playwright = sync_playwright().start()
+    browser = None
+    launched = None
+    try:
+        def _launch(launch_headless: bool, launch_lean: bool):
+            nonlocal browser, launched
+            if launched == (launch_headless, launch_lean):
+                return browser
+            if browser:
+                browser.close()
+                browser = None
+            browser = playwright.chromium.launch(
+                headless=launch_headless, args=LEAN_LAUNCH_ARGS if launch_lean else []
+            )
+            launched = (launch_headless, launch_lean)
+            return browser
+
+        _launch(headless, lean_profile)
+        conn.send({"type": "ready"})
+        jobs = 0
+        while True:
+            job = conn.recv()
+            if job is None:
+                break
+            try:
+                options = dict(job["options"])
+                job_browser = _launch(options.pop("headless", headless),
+                                      options.pop("lean_profile", lean_profile))
+                with StarlinkPortalClient(job["email"], job["password"], browser=job_browser,
+                                          **options) as client:
+                    success = bool(client.update_service_address(job["address"], job.get("canonical")))
+            except Exception as e:
+                logger.error(f"[browser-{worker_id}] Erreur lors de la mise à jour de {job['email']}: {e}")
+                success = False
+            jobs += 1
+
+            rss = process_tree_rss_bytes() or 0
+            recycle = jobs >= max_jobs or rss > max_rss_mb * 1024 * 1024
+            conn.send({"type": "result", "success": success, "rss": rss, "recycle": recycle})
+            if recycle:
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    except Exception as e:
+        logger.error(f"[browser-{worker_id}] Arrêt du worker: {e}")
+    finally:
+        try:
+            if browser:
+                browser.close()
+        finally:
+            playwright.stop()
+            # Les processus multiprocessing n'exécutent pas les handlers atexit
+            artifacts.writer.flush()
+
+
+class BrowserWorker:
+    """Côté processus principal: un processus worker et sa connexion."""
+
+    def __init__(self, worker_id: int, headless: bool, lean_profile: bool,
+                 max_jobs: int, max_rss_mb: float):
+        self.worker_id = worker_id
+        self.jobs = 0
+        self.conn, child_conn = _mp.Pipe()
+        self.process = _mp.Process(
+            target=_worker_main,
+            args=(worker_id, child_conn, headless, lean_profile, max_jobs, max_rss_mb),
+            name=f"browser-{worker_id}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        """Arrêt immédiat (worker bloqué ou à remplacer)."""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(SHUTDOWN_TIMEOUT_S)
+        self.conn.close()
+
+    def stop(self):
+        """Arrêt propre: le worker ferme son navigateur avant de quitter."""
+        try:
+            if self.process.is_alive():
+                self.conn.send(None)
+            self.process.join(SHUTDOWN_TIMEOUT_S)
+        except (OSError, BrokenPipeError):
+            pass
+        self.kill()
+
+
+class BrowserPool:
+    """
+    Pool de workers navigateur. update_service_address() est bloquant et peut être appelé
+    depuis plusieurs threads: chaque appel emprunte un worker libre le temps d'une session.
+    """
+
+    def __init__(self, size: int, headless: bool = True, lean_profile: bool = True,
+                 job_timeout_s: float = JOB_TIMEOUT_S, max_jobs_per_worker: int = MAX_JOBS_PER_WORKER,
+                 max_worker_rss_mb: float = MAX_WORKER_RSS_MB):
+        self.size = size
+        self.headless = headless
+        self.lean_profile = lean_profile
+        self.job_timeout_s = job_timeout_s
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_worker_rss_mb = max_worker_rss_mb
+        self.stats = {"jobs": 0, "timeouts": 0, "crashes": 0, "recycled": 0}
+        self._idle: "queue.Queue[BrowserWorker]" = queue.Queue()
+        self._workers: Dict[int, BrowserWorker] = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _spawn(self) -> BrowserWorker:
+        with self._lock:
+            worker_id = self._next_id
+            self._next_id += 1
+            worker = BrowserWorker(worker_id, self.headless, self.lean_profile,
+                                   self.max_jobs_per_worker, self.max_worker_rss_mb)
+            self._workers[worker_id] = worker
+        return worker
+
+    def _replace(self, worker: BrowserWorker, kill: bool = True) -> BrowserWorker:
+        """Remplace un worker mort, bloqué ou recyclé par un nouveau processus."""
+        with self._lock:
+            self._workers.pop(worker.worker_id, None)
+        if kill:
+            worker.kill()
+        else:
+            worker.stop()
+        return self._spawn()
+
+    def _receive(self, worker: BrowserWorker, deadline: float, expected: str) -> Optional[Dict]:
+        """Attend un message du worker jusqu'à l'échéance. None si délai dépassé ou worker mort."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not worker.conn.poll(remaining):
+            return None
+        message = worker.conn.recv()
+        return message if message.get("type") == expected else None
+
+    def update_service_address(self, email: str, password: str, new_address: str,
+                               canonical: Optional[Dict] = None, options: Optional[Dict] = None) -> bool:
+        """
+        Met à jour l'adresse d'un compte dans un worker isolé.
+        options: arguments de StarlinkPortalClient; headless et lean_profile, s'ils diffèrent de
+        ceux du pool, font relancer le navigateur du worker pour cette session.
+        Retourne False si la session échoue, dépasse le délai maximal ou fait planter le worker.
+        """
+        if self._closed:
+            raise RuntimeError("Pool de navigateurs fermé")
+        worker = self._idle.get()
+        next_worker = worker
+        deadline = time.monotonic() + self.job_timeout_s
+        try:
+            # Un worker neuf doit d'abord lancer son navigateur
+            if worker.jobs == 0 and self._receive(worker, deadline, "ready") is None:
+                raise EOFError("worker non démarré")
+            worker.conn.send({"email": email, "password": password, "address": new_address,
+                              "canonical": canonical, "options": options or {}})
+            result = self._receive(worker, deadline, "result")
+            if result is None:
+                if worker.process.is_alive():
+                    self._count("timeouts")
+                    logger.error(f"Session navigateur de {email} bloquée depuis {self.job_timeout_s:.0f}s - "
+                                 f"worker browser-{worker.worker_id} tué")
+                else:
+                    raise EOFError("worker terminé")
+                next_worker = self._replace(worker)
+                return False
+
+            worker.jobs += 1
+            self._count("jobs")
+            if result["recycle"]:
+                self._count("recycled")
+                logger.info(f"Recyclage du worker browser-{worker.worker_id} "
+                            f"({worker.jobs} session(s), {result['rss'] / 1048576:.0f} Mo)")
+                next_worker = self._replace(worker, kill=False)
+            return result["success"]
+        except (EOFError, OSError, BrokenPipeError) as e:
+            self._count("crashes")
+            logger.error(f"Worker browser-{worker.worker_id} planté pendant la session de {email}: "
+                         f"{e or 'connexion interrompue'}")
+            next_worker = self._replace(worker)
+            return False
+        finally:
+            self._idle.put(next_worker)
+
+    def close(self):
+        """Arrête tous les workers."""
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
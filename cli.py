@@ -8,6 +8,7 @@ import os
 from datetime import datetime
 from typing import Optional
 from account_manager import AccountManager
+from account_io import FORMATS, detect_format, read_account_records, write_account_records
 
 # Configurer l'encodage UTF-8 pour Windows
 if sys.platform == 'win32':
@@ -93,7 +94,7 @@ class CLI:
     
     def list_accounts(self, detailed: bool = False):
         """Liste tous les comptes."""
-        accounts = self.manager.get_all_accounts()
+        accounts = self.manager.get_all_accounts_metadata()
         
         if not accounts:
             print("\n📭 Aucun compte enregistré")
@@ -142,7 +143,7 @@ class CLI:
     def show_stats(self, email: Optional[str] = None):
         """Affiche les statistiques d'un compte ou de tous les comptes."""
         if email:
-            account = self.manager.get_account(email)
+            account = self.manager.get_account_metadata(email)
             if not account:
                 print(f"❌ Compte {email} non trouvé")
                 return
@@ -162,29 +163,127 @@ class CLI:
             if stats.get('last_failure'):
                 print(f"Dernier échec: {stats['last_failure']}")
         else:
-            accounts = self.manager.get_all_accounts()
-            if not accounts:
+            fleet_stats = self.manager.get_fleet_stats()
+            total_runs = fleet_stats['total_runs']
+            # accounts.json n'est lu que si aucune exécution n'a jamais été enregistrée
+            if total_runs == 0 and not self.manager.list_accounts():
                 print("\n📭 Aucun compte enregistré")
                 return
             
             print("\n=== Statistiques globales ===")
-            total_runs = 0
-            total_success = 0
-            total_failures = 0
-            
-            for email, account in accounts.items():
-                stats = account.get('stats', {})
-                total_runs += stats.get('total_runs', 0)
-                total_success += stats.get('successful_updates', 0)
-                total_failures += stats.get('failed_updates', 0)
             
             print(f"Total d'exécutions: {total_runs}")
-            print(f"Succès: {total_success}")
-            print(f"Échecs: {total_failures}")
+            print(f"Succès: {fleet_stats['successful_updates']}")
+            print(f"Échecs: {fleet_stats['failed_updates']}")
             
             if total_runs > 0:
-                success_rate = (total_success / total_runs) * 100
-                print(f"Taux de succès global: {success_rate:.1f}%")
+                print(f"Taux de succès global: {fleet_stats['success_rate']:.1f}%")
+            
+            for label, window in fleet_stats['windows'].items():
+                if window['runs']:
+                    print(f"Taux d'échec ({label}): {window['failure_rate']:.1f}% "
+                          f"({window['failures']}/{window['runs']})")
+    
+    def show_analytics(self, top: int = 10):
+        """Affiche les analyses de l'historique d'exécution de la flotte."""
+        from analytics import ExecutionHistory
+        
+        history = ExecutionHistory.load(self.manager.list_accounts())
+        if len(history) == 0:
+            print("\n📭 Aucun historique d'exécution")
+            return
+        
+        report = history.summary(top)
+        print("\n=== Analyses de la flotte ===")
+        print(f"Comptes: {report['accounts']}")
+        print(f"Exécutions: {report['executions']}")
+        print(f"Mises à jour d'adresse: {report['updates']}")
+        
+        def _format_percentiles(values, unit):
+            if not values:
+                return "aucune donnée"
+            return ", ".join(f"{name}={value:.1f}{unit}" for name, value in values.items())
+        
+        print("\n--- Déplacements ---")
+        print(f"Temps entre mises à jour: {_format_percentiles(report['time_between_moves_h'], 'h')}")
+        print(f"Distances mesurées: {_format_percentiles(report['distance_km'], ' km')}")
+        
+        print("\n--- Taux de succès ---")
+        for window, rate in report['success_rate'].items():
+            print(f"{window}: {'aucune donnée' if rate is None else f'{rate:.1f}%'}")
+        
+        print("\n--- Latence par étape ---")
+        for stage, values in report['stage_latency_s'].items():
+            print(f"{stage}: {_format_percentiles(values, 's')}")
+        
+        if report['update_frequency']:
+            print(f"\n--- Comptes les plus mobiles (top {top}) ---")
+            for item in report['update_frequency']:
+                print(f"📧 {item['account']}: {item['updates']} mise(s) à jour "
+                      f"({item['updates_per_day']:.2f}/jour)")
+    
+    def migrate_encryption(self):
+        """Convertit les mots de passe chiffrés vers le format sans double encodage base64."""
+        migrated = self.manager.migrate_encryption()
+        if migrated is None:
+            print("❌ Erreur lors de la sauvegarde des comptes")
+            return False
+        if migrated:
+            print(f"✅ {migrated} mot(s) de passe converti(s) au nouveau format")
+        else:
+            print("✅ Aucun mot de passe à convertir")
+        return True
+    
+    def import_accounts(self, path: str, fmt: Optional[str] = None, overwrite: bool = True):
+        """Importe des comptes depuis un fichier CSV ou JSON Lines (lu ligne par ligne)."""
+        fmt = detect_format(path, fmt)
+        errors = 0
+        
+        def _valid_records(stream):
+            nonlocal errors
+            for line_num, record, error in read_account_records(stream, fmt):
+                if error:
+                    errors += 1
+                    print(f"⚠️  Ligne {line_num} ignorée: {error}")
+                else:
+                    yield record
+        
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            summary = self.manager.import_accounts(_valid_records(f), overwrite=overwrite)
+        
+        print(f"\n✅ {len(summary['added'])} compte(s) ajouté(s), {len(summary['updated'])} mis à jour")
+        if summary['skipped']:
+            print(f"⏭️  {len(summary['skipped'])} compte(s) existant(s) conservé(s) (--no-overwrite)")
+        if errors:
+            print(f"⚠️  {errors} ligne(s) invalide(s)")
+        if (summary['added'] or summary['updated']) and not summary['saved']:
+            print("❌ Erreur lors de la sauvegarde des comptes")
+            return False
+        return True
+    
+    def export_accounts(self, path: str, fmt: Optional[str] = None,
+                        with_passwords: bool = False, enabled_only: bool = False):
+        """Exporte les comptes en CSV ou JSON Lines ('-' pour la sortie standard)."""
+        records = self.manager.export_accounts(with_passwords=with_passwords, enabled_only=enabled_only)
+        if path == '-':
+            write_account_records(records, sys.stdout, fmt or 'jsonl', with_passwords)
+            return True
+        
+        fmt = detect_format(path, fmt)
+        if with_passwords:
+            # Mots de passe en clair: fichier créé d'emblée lisible par le seul propriétaire
+            if os.path.exists(path):
+                os.remove(path)
+            output = os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600),
+                               'w', encoding='utf-8', newline='')
+        else:
+            output = open(path, 'w', encoding='utf-8', newline='')
+        with output as f:
+            count = write_account_records(records, f, fmt, with_passwords)
+        print(f"✅ {count} compte(s) exporté(s) vers {path}")
+        if with_passwords:
+            print("⚠️  Le fichier contient les mots de passe en clair: supprimez-le après usage")
+        return True
     
     def enable_account(self, email: Optional[str] = None):
         """Active un compte."""
@@ -243,6 +342,8 @@ class CLI:
                 del config['password']
             if 'password_encrypted' in config:
                 del config['password_encrypted']
+            # L'email de l'ancien compte ne doit pas remplacer le nouveau
+            config.pop('email', None)
             
             # Utiliser le nouveau mot de passe ou l'ancien
             password_to_use = new_password if new_password else account.get('password')
@@ -252,8 +353,9 @@ class CLI:
             
             # Créer le nouveau compte
             if self.manager.add_account(new_email, password_to_use, config):
-                # Supprimer l'ancien compte
-                self.manager.remove_account(email)
+                # Supprimer l'ancien compte; ses statistiques, reprises par le nouveau,
+                # restent comptées dans les totaux de la flotte
+                self.manager.remove_account(email, keep_fleet_totals=True)
                 print(f"✅ Compte modifié: {email} -> {new_email}")
                 return True
             else:
@@ -294,6 +396,10 @@ Exemples:
   python cli.py enable user@email.com  # Activer un compte
   python cli.py disable user@email.com # Désactiver un compte
   python cli.py update user@email.com # Modifier l'email ou le mot de passe
+  python cli.py analytics              # Analyses de l'historique d'exécution
+  python cli.py migrate                # Convertir les mots de passe chiffrés au nouveau format
+  python cli.py import comptes.csv     # Importer des comptes en masse (CSV ou JSON Lines)
+  python cli.py export comptes.jsonl   # Exporter les comptes (sans mots de passe)
         """
     )
     
@@ -326,6 +432,26 @@ Exemples:
     update_parser = subparsers.add_parser('update', help='Modifier l\'email ou le mot de passe d\'un compte')
     update_parser.add_argument('email', nargs='?', help='Email du compte à modifier')
     
+    # Commande analytics
+    analytics_parser = subparsers.add_parser('analytics', help='Analyser l\'historique d\'exécution')
+    analytics_parser.add_argument('--top', type=int, default=10, help='Nombre de comptes les plus mobiles à afficher')
+    
+    # Commande migrate
+    subparsers.add_parser('migrate', help='Convertir les mots de passe chiffrés au nouveau format')
+    
+    # Commande import
+    import_parser = subparsers.add_parser('import', help='Importer des comptes en masse (CSV ou JSON Lines)')
+    import_parser.add_argument('file', help='Fichier à importer (.csv, .jsonl)')
+    import_parser.add_argument('--format', choices=FORMATS, help='Format du fichier (déduit de l\'extension sinon)')
+    import_parser.add_argument('--no-overwrite', action='store_true', help='Conserver les comptes déjà existants')
+    
+    # Commande export
+    export_parser = subparsers.add_parser('export', help='Exporter les comptes (CSV ou JSON Lines)')
+    export_parser.add_argument('file', help='Fichier de sortie (.csv, .jsonl) ou - pour la sortie standard')
+    export_parser.add_argument('--format', choices=FORMATS, help='Format du fichier (déduit de l\'extension sinon)')
+    export_parser.add_argument('--with-passwords', action='store_true', help='Inclure les mots de passe en clair')
+    export_parser.add_argument('--enabled-only', action='store_true', help='Exporter uniquement les comptes actifs')
+    
     args = parser.parse_args()
     
     if not args.command:
@@ -347,8 +473,16 @@ Exemples:
             cli.enable_account(args.email)
         elif args.command == 'disable':
             cli.disable_account(args.email)
-        elif args.command == 'config':
-            cli.update_config(args.email)
+        elif args.command == 'analytics':
+            cli.show_analytics(args.top)
+        elif args.command == 'migrate':
+            cli.migrate_encryption()
+        elif args.command == 'import':
+            cli.import_accounts(args.file, args.format, overwrite=not args.no_overwrite)
+        elif args.command == 'export':
+            cli.export_accounts(args.file, args.format, args.with_passwords, args.enabled_only)
+        elif args.command == 'update':
+            cli.update_account(args.email)
     except KeyboardInterrupt:
         print("\n\n❌ Opération annulée par l'utilisateur")
     except Exception as e:
@@ -5,7 +5,10 @@ Utilise Rich pour un design moderne avec couleurs, tableaux et menus interactifs
 import sys
 import io
 import os
-from typing import Optional, List
+import time
+import queue
+from collections import deque
+from typing import Callable, Optional, List
 from datetime import datetime
 
 # Configurer l'encodage UTF-8 pour Windows
@@ -13,47 +16,35 @@ if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
-try:
-    from rich.console import Console
-    from rich.table import Table
-    from rich.panel import Panel
-    from rich.prompt import Prompt, Confirm
-    from rich.progress import Progress, SpinnerColumn, TextColumn
-    from rich.text import Text
-    from rich.layout import Layout
-    from rich import box
-    from rich.align import Align
-    RICH_AVAILABLE = True
-except ImportError:
-    RICH_AVAILABLE = False
-    print("⚠️  Rich n'est pas installé. Installation en cours...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "rich", "inquirer"])
-    from rich.console import Console
-    from rich.table import Table
-    from rich.panel import Panel
-    from rich.prompt import Prompt, Confirm
-    from rich.progress import Progress, SpinnerColumn, TextColumn
-    from rich.text import Text
-    from rich.layout import Layout
-    from rich import box
-    from rich.align import Align
-    RICH_AVAILABLE = True
+from account_manager import AccountManager
 
-try:
-    import inquirer
-    INQUIRER_AVAILABLE = True
-except ImportError:
-    INQUIRER_AVAILABLE = False
+# Rich est importé à la demande par _load_rich(): l'import du module reste instantané
+console = None
+Console = Table = Panel = Prompt = Confirm = Progress = SpinnerColumn = TextColumn = box = None
 
-from account_manager import AccountManager
 
-console = Console()
+def _load_rich():
+    """Importe Rich et initialise la console (une seule fois)."""
+    global console, Console, Table, Panel, Prompt, Confirm, Progress, SpinnerColumn, TextColumn, box
+    if console is not None:
+        return
+    try:
+        from rich.console import Console
+        from rich.table import Table
+        from rich.panel import Panel
+        from rich.prompt import Prompt, Confirm
+        from rich.progress import Progress, SpinnerColumn, TextColumn
+        from rich import box
+    except ImportError:
+        print("❌ Rich n'est pas installé. Installez-le avec: pip install rich")
+        sys.exit(1)
+    console = Console()
 
 class ModernCLI:
     """Interface CLI moderne avec Rich."""
     
     def __init__(self):
+        _load_rich()
         self.manager = AccountManager()
         self._show_banner()
     
@@ -193,7 +184,7 @@ class ModernCLI:
     
     def list_accounts(self, detailed: bool = False):
         """Liste les comptes avec un tableau moderne."""
-        accounts = self.manager.get_all_accounts()
+        accounts = self.manager.get_all_accounts_metadata()
         
         if not accounts:
             console.print("\n[bold yellow]📭 Aucun compte enregistré[/bold yellow]\n")
@@ -251,7 +242,7 @@ class ModernCLI:
     def show_stats(self, email: Optional[str] = None):
         """Affiche les statistiques avec des graphiques visuels."""
         if email:
-            account = self.manager.get_account(email)
+            account = self.manager.get_account_metadata(email)
             if not account:
                 console.print(f"[red]❌ Compte {email} non trouvé[/red]")
                 return
@@ -281,20 +272,20 @@ class ModernCLI:
             console.print(stats_panel)
         else:
             # Statistiques globales
-            accounts = self.manager.get_all_accounts()
-            if not accounts:
+            if not self.manager.list_accounts():
                 console.print("\n[bold yellow]📭 Aucun compte enregistré[/bold yellow]\n")
                 return
             
-            total_runs = 0
-            total_success = 0
-            total_failures = 0
+            fleet_stats = self.manager.get_fleet_stats()
+            total_runs = fleet_stats['total_runs']
+            total_success = fleet_stats['successful_updates']
+            total_failures = fleet_stats['failed_updates']
             
-            for acc in accounts.values():
-                stats = acc.get('stats', {})
-                total_runs += stats.get('total_runs', 0)
-                total_success += stats.get('successful_updates', 0)
-                total_failures += stats.get('failed_updates', 0)
+            windows_lines = "\n".join(
+                f"  • {label}: [bold]{window['failure_rate']:.1f}%[/bold] "
+                f"[dim]({window['failures']}/{window['runs']})[/dim]"
+                for label, window in fleet_stats['windows'].items() if window['runs']
+            ) or "  [dim]Aucune donnée[/dim]"
             
             stats_panel = Panel.fit(
                 f"""
@@ -306,6 +297,9 @@ class ModernCLI:
   
 [bold yellow]📈 Taux de succès global:[/bold yellow]
   {self._create_progress_bar(total_success, total_runs) if total_runs > 0 else '[dim]Aucune donnée[/dim]'}
+
+[bold yellow]📉 Taux d'échec récent:[/bold yellow]
+{windows_lines}
                 """,
                 title="[bold magenta]Statistiques Globales[/bold magenta]",
                 border_style="cyan"
@@ -335,7 +329,7 @@ class ModernCLI:
             return False
         
         # Afficher les infos du compte
-        account = self.manager.get_account(email)
+        account = self.manager.get_account_metadata(email)
         if account:
             stats = account.get('stats', {})
             warning_panel = Panel(
@@ -462,7 +456,7 @@ Vous êtes sur le point de supprimer le compte:
         if not email:
             email = Prompt.ask("[bold]Email du compte[/bold]")
         
-        account = self.manager.get_account(email)
+        account = self.manager.get_account_metadata(email)
         if not account:
             console.print(f"[red]❌ Compte {email} non trouvé[/red]")
             return False
@@ -498,7 +492,7 @@ Vous êtes sur le point de supprimer le compte:
         if not email:
             email = Prompt.ask("[bold]Email du compte[/bold]")
         
-        account = self.manager.get_account(email)
+        account = self.manager.get_account_metadata(email)
         if not account:
             console.print(f"[red]❌ Compte {email} non trouvé[/red]")
             return False
@@ -581,6 +575,120 @@ Vous êtes sur le point de supprimer le compte:
                 console.print(f"\n[bold red]❌ Erreur: {e}[/bold red]\n")
                 Prompt.ask("[dim]Appuyez sur Entrée pour continuer...[/dim]", default="")
 
+class RunDashboard:
+    """Tableau de bord en direct d'une exécution main_multi, alimenté par le bus d'événements."""
+    
+    def __init__(self, event_bus, refresh_per_second: float = 4.0, latency_window: int = 200):
+        _load_rich()
+        import events
+        self._events = events
+        self.event_bus = event_bus
+        self.subscription = event_bus.subscribe()
+        self.refresh_interval = 1.0 / refresh_per_second
+        self.latency_window = latency_window
+        self.total = 0
+        self.workers = 0
+        self.started = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.active = {}
+        self.stage_latencies = {}
+        self.run_started_at = time.time()
+    
+    def _apply(self, event: dict):
+        """Met à jour l'état du tableau de bord à partir d'un événement."""
+        events = self._events
+        event_type = event["type"]
+        worker = event["worker"]
+        if event_type == events.RUN_START:
+            self.total = event.get("total", 0)
+            self.workers = event.get("workers", 0)
+            self.run_started_at = event["time"]
+        elif event_type == events.ACCOUNT_START:
+            self.started += 1
+            self.active[worker] = {"account": event["account"], "stage": "-", "since": event["time"]}
+        elif event_type == events.STAGE_START:
+            if worker in self.active:
+                self.active[worker]["stage"] = event["stage"]
+                self.active[worker]["stage_since"] = event["time"]
+        elif event_type == events.STAGE_END:
+            latencies = self.stage_latencies.setdefault(event["stage"], deque(maxlen=self.latency_window))
+            latencies.append(event["duration"])
+        elif event_type == events.ACCOUNT_END:
+            self.active.pop(worker, None)
+            if event.get("success"):
+                self.succeeded += 1
+            else:
+                self.failed += 1
+    
+    def _drain(self, timeout: float):
+        """Consomme les événements en attente (attend au plus `timeout` le premier)."""
+        try:
+            self._apply(self.subscription.get(timeout=timeout))
+            while True:
+                self._apply(self.subscription.get_nowait())
+        except queue.Empty:
+            pass
+    
+    def _render(self):
+        """Construit l'affichage courant."""
+        from rich.console import Group
+        now = time.time()
+        completed = self.succeeded + self.failed
+        elapsed_min = max(now - self.run_started_at, 1e-6) / 60
+        
+        summary = Table.grid(padding=(0, 2))
+        summary.add_column(style="cyan")
+        summary.add_column(style="bold")
+        summary.add_row("Progression", f"{completed}/{self.total}")
+        summary.add_row("En file d'attente", str(max(self.total - self.started, 0)))
+        summary.add_row("Workers actifs", f"{len(self.active)}/{self.workers}")
+        summary.add_row("Succès / Échecs", f"[green]{self.succeeded}[/green] / [red]{self.failed}[/red]")
+        summary.add_row("Débit", f"{completed / elapsed_min:.1f} compte(s)/min")
+        
+        workers_table = Table(title="Workers", box=box.ROUNDED, header_style="bold magenta", expand=True)
+        workers_table.add_column("Worker", style="dim")
+        workers_table.add_column("Compte", style="cyan")
+        workers_table.add_column("Étape", style="yellow")
+        workers_table.add_column("Durée", justify="right")
+        for worker, info in sorted(self.active.items()):
+            stage_since = info.get("stage_since", info["since"])
+            workers_table.add_row(worker, info["account"], info["stage"], f"{now - stage_since:.1f}s")
+        
+        latency_table = Table(title="Latence par étape", box=box.ROUNDED, header_style="bold magenta", expand=True)
+        latency_table.add_column("Étape", style="cyan")
+        latency_table.add_column("N", justify="right")
+        latency_table.add_column("Moyenne", justify="right")
+        latency_table.add_column("p95", justify="right")
+        for stage, latencies in self.stage_latencies.items():
+            ordered = sorted(latencies)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            latency_table.add_row(stage, str(len(ordered)), f"{sum(ordered) / len(ordered):.2f}s", f"{p95:.2f}s")
+        
+        return Group(
+            Panel(summary, title="[bold magenta]Exécution en cours[/bold magenta]", border_style="cyan"),
+            workers_table,
+            latency_table
+        )
+    
+    def run(self, until: Callable[[], bool]):
+        """Affiche le tableau de bord jusqu'à ce que `until()` retourne True."""
+        from rich.live import Live
+        last_render = 0.0
+        try:
+            with Live(self._render(), console=console, auto_refresh=False) as live:
+                while True:
+                    done = until()
+                    self._drain(self.refresh_interval)
+                    # Redessiner au plus `refresh_per_second` fois par seconde
+                    if done or time.monotonic() - last_render >= self.refresh_interval:
+                        live.update(self._render(), refresh=True)
+                        last_render = time.monotonic()
+                    if done:
+                        break
+        finally:
+            self.event_bus.unsubscribe(self.subscription)
+
 def main():
     """Point d'entrée principal."""
     cli = ModernCLI()
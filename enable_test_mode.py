@@ -25,7 +25,7 @@ def main():
     email = sys.argv[1]
     manager = AccountManager()
     
-    account = manager.get_account(email)
+    account = manager.get_account_metadata(email)
     if not account:
         print(f"❌ Compte {email} non trouvé")
         return
@@ -0,0 +1,67 @@
+"""
+Bus d'événements en mémoire pour suivre une exécution en cours.
+Les workers publient des événements structurés sans jamais bloquer; chaque abonné
+(ex: tableau de bord) les consomme depuis sa propre file bornée.
+"""
+import time
+import queue
+import logging
+import threading
+from typing import Dict, List
+
+logger = logging.getLogger("GeoAgile.Events")
+
+# Types d'événements publiés par main_multi
+RUN_START = "run_start"
+RUN_END = "run_end"
+ACCOUNT_START = "account_start"
+ACCOUNT_END = "account_end"
+STAGE_START = "stage_start"
+STAGE_END = "stage_end"
+
+
+class EventBus:
+    """Bus publish/subscribe thread-safe, non bloquant pour les producteurs."""
+
+    def __init__(self, subscriber_queue_size: int = 10000):
+        self.subscriber_queue_size = subscriber_queue_size
+        self._subscribers: List[queue.Queue] = []
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def subscribe(self) -> queue.Queue:
+        """Crée une file d'abonné qui recevra tous les événements publiés ensuite."""
+        subscriber = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def publish(self, event_type: str, account: str = None, **data):
+        """
+        Publie un événement. Sans abonné, l'appel ne coûte presque rien;
+        si la file d'un abonné est pleine, l'événement est ignoré pour cet abonné.
+        """
+        subscribers = self._subscribers
+        if not subscribers:
+            return
+        event: Dict = {
+            "type": event_type,
+            "account": account,
+            "worker": threading.current_thread().name,
+            "time": time.time(),
+            **data
+        }
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                self.dropped += 1
+
+
+# Bus par défaut du processus
+bus = EventBus()
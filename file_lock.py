@@ -0,0 +1,61 @@
+"""
+Fichiers JSON partagés par plusieurs processus d'un même hôte (nœuds lancés avec --shards,
+workers navigateur): accounts.json, fleet_stats.json, polling_index.json.
+Les cycles lecture-modification-écriture sont sérialisés par un verrou fcntl sur <fichier>.lock,
+et chaque écriture passe par un fichier temporaire remplacé atomiquement: un lecteur voit
+toujours l'ancienne ou la nouvelle version, jamais un fichier tronqué.
+"""
+import os
+import json
+import threading
+from contextlib import contextmanager
+from typing import Any, Optional
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    # Windows: pas de verrou inter-processus, un seul nœud par répertoire
+    FCNTL_AVAILABLE = False
+
+LOCK_SUFFIX = ".lock"
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Verrou exclusif inter-processus associé à path (fichier <path>.lock, jamais supprimé).
+    Non réentrant: l'appelant ne doit pas le reprendre pour le même fichier avant de l'avoir libéré.
+    """
+    if not FCNTL_AVAILABLE:
+        yield
+        return
+    fd = os.open(path + LOCK_SUFFIX, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # La fermeture libère le verrou
+        os.close(fd)
+
+
+def write_json_atomic(path: str, data: Any, mode: Optional[int] = None, **dump_kwargs):
+    """
+    Écrit data dans path via un fichier temporaire puis os.replace.
+    mode: permissions du fichier (ex: 0o600), appliquées avant qu'il ne devienne visible.
+    Lève l'exception d'écriture (le fichier existant reste intact).
+    """
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode if mode is not None else 0o666)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **dump_kwargs)
+        if mode is not None:
+            os.chmod(tmp_file, mode)
+        os.replace(tmp_file, path)
+    except BaseException:
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+        raise
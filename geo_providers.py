@@ -0,0 +1,556 @@
+"""
+Geocoding providers and latency-aware routing.
+Each provider (public Nominatim, self-hosted Nominatim, Photon, offline cache) answers reverse and
+forward lookups in a common Nominatim-like format. GeoRouter ranks providers by a rolling EWMA of
+latency and errors, and hedges: if the preferred provider has not answered after its p95 latency,
+the next one is queried in parallel and the first answer wins.
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional, Tuple
+
+from geopy.geocoders import Nominatim, Photon
+
+from address_cache import cache_key
+from http_pool import geopy_adapter_options
+
+logger = logging.getLogger("GeoAgile.GeoProviders")
+
+# Ordered provider list, e.g. "offline,nominatim=http://geo.lan:8080,nominatim,photon"
+PROVIDERS_ENV = "GEOAGILE_GEOCODERS"
+# Third-party fallbacks (e.g. the public komoot Photon instance) receive the dishes' GPS fixes:
+# they are opt-in through GEOAGILE_GEOCODERS, never enabled by default
+DEFAULT_PROVIDERS = "offline,nominatim"
+DEFAULT_USER_AGENT = "geo_agile_starlink_bot"
+
+PROVIDER_TIMEOUT_S = 5.0       # read timeout of a single provider request (connect: http_pool)
+REQUEST_DEADLINE_S = 12.0      # overall deadline of a routed lookup, hedges included
+DEFAULT_HEDGE_DELAY_S = 1.0    # hedge delay until enough latency samples are known
+MIN_HEDGE_DELAY_S = 0.1
+MAX_HEDGES = 1                 # extra providers queried in parallel with the preferred one
+LATENCY_WINDOW = 50            # samples kept for the p95
+MIN_P95_SAMPLES = 10
+EWMA_ALPHA = 0.2
+ERROR_PENALTY = 10.0           # a provider failing every request ranks as 11x slower
+
+# Public endpoints allow about one request per second per application (Nominatim usage policy).
+# The limit is shared by every worker thread of the process.
+PUBLIC_RATE_ENV = "GEOAGILE_PUBLIC_GEOCODER_RATE"
+PUBLIC_RATE_PER_S = float(os.environ.get(PUBLIC_RATE_ENV, "1.0"))
+PUBLIC_HOSTS = ("nominatim.openstreetmap.org", "photon.komoot.io")
+
+OFFLINE_CACHE_FILE = "geocode_cache.json"
+OFFLINE_MAX_ENTRIES = 50000
+OFFLINE_PRECISION = 4          # coordinate decimals of the offline key (~11 m)
+OFFLINE_SAVE_INTERVAL_S = 5.0
+
+OSM_TYPES = {"N": "node", "W": "way", "R": "relation"}
+# Photon has no place_rank: approximate it from the result type
+PHOTON_PLACE_RANKS = {
+    "house": 30, "street": 26, "locality": 20, "district": 18,
+    "city": 16, "county": 12, "state": 8, "country": 4,
+}
+
+
+class ProviderStats:
+    """Rolling latency/error statistics of a provider (EWMA and p95 window)."""
+
+    def __init__(self):
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.requests = 0
+        self.errors = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, latency_s: float, error: bool):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self._latencies.append(latency_s)
+            if self.latency_ewma is None:
+                self.latency_ewma = latency_s
+            else:
+                self.latency_ewma += EWMA_ALPHA * (latency_s - self.latency_ewma)
+            self.error_ewma += EWMA_ALPHA * (float(error) - self.error_ewma)
+
+    def score(self) -> float:
+        """Routing cost: smaller is better. Unmeasured providers keep their configured order."""
+        latency = DEFAULT_HEDGE_DELAY_S if self.latency_ewma is None else self.latency_ewma
+        return latency * (1.0 + ERROR_PENALTY * self.error_ewma)
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < MIN_P95_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def summary(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ms": round(self.latency_ewma * 1000) if self.latency_ewma is not None else None,
+            "error_rate": round(self.error_ewma, 3),
+        }
+
+
+class RateLimited(Exception):
+    """No request slot was available before the provider timeout."""
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all threads: at most `rate_per_s` requests per second on average,
+    bursts of `burst`. A caller reserves the next slot and sleeps until it comes.
+    """
+
+    def __init__(self, rate_per_s: float, burst: int = 1):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Waits for a request slot. Returns False (nothing reserved) if it is further than timeout."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_s)
+            self._updated = now
+            wait_s = max(0.0, (1.0 - self._tokens) / self.rate_per_s)
+            if timeout is not None and wait_s > timeout:
+                return False
+            self._tokens -= 1.0
+        if wait_s > 0:
+            time.sleep(wait_s)
+        return True
+
+
+_public_limiters: Dict[str, RateLimiter] = {}
+_public_limiters_lock = threading.Lock()
+
+
+def public_rate_limiter(host: str) -> Optional[RateLimiter]:
+    """Process-wide limiter of a public endpoint, None for self-hosted instances."""
+    if host not in PUBLIC_HOSTS or PUBLIC_RATE_PER_S <= 0:
+        return None
+    with _public_limiters_lock:
+        if host not in _public_limiters:
+            _public_limiters[host] = RateLimiter(PUBLIC_RATE_PER_S)
+        return _public_limiters[host]
+
+
+class GeoProvider(ABC):
+    """
+    Base provider. reverse() returns a Nominatim-like dict (display_name, lat, lon, address,
+    place_rank, osm_type, osm_id, category, type) or None; geocode() returns (lat, lon) or None.
+    Network errors are raised and counted by the router.
+    """
+    name = "provider"
+    local = False
+
+    def __init__(self):
+        self.stats = ProviderStats()
+        self.rate_limiter: Optional[RateLimiter] = None
+
+    @abstractmethod
+    def reverse(self, lat: float, lon: float, zoom: int) -> Optional[Dict]:
+        """Reverse lookup of a coordinate."""
+
+    @abstractmethod
+    def geocode(self, query: str) -> Optional[Tuple[float, float]]:
+        """Forward lookup of an address."""
+
+
+class NominatimProvider(GeoProvider):
+    """Public Nominatim, or a self-hosted instance when base_url is given."""
+
+    def __init__(self, base_url: Optional[str] = None, user_agent: str = DEFAULT_USER_AGENT,
+                 timeout: float = PROVIDER_TIMEOUT_S):
+        super().__init__()
+        # Shared HTTP session: keep-alive connections are reused across lookups
+        options = {"user_agent": user_agent, "timeout": timeout, **geopy_adapter_options()}
+        if base_url:
+            scheme, _, domain = base_url.rstrip("/").rpartition("://")
+            options.update(domain=domain, scheme=scheme or "https")
+        self.geolocator = Nominatim(**options)
+        self.name = f"nominatim({base_url})" if base_url else "nominatim"
+        self.rate_limiter = public_rate_limiter(self.geolocator.domain)
+
+    def reverse(self, lat, lon, zoom):
+        location = self.geolocator.reverse(
+            (lat, lon), exactly_one=True, language='en', addressdetails=True, zoom=zoom
+        )
+        if not location:
+            return None
+        raw = dict(location.raw or {})
+        raw.setdefault("display_name", location.address)
+        raw["lat"], raw["lon"] = location.latitude, location.longitude
+        return raw
+
+    def geocode(self, query):
+        location = self.geolocator.geocode(query, exactly_one=True, language='en')
+        return (location.latitude, location.longitude) if location else None
+
+
+class PhotonProvider(GeoProvider):
+    """Photon-style endpoint (GeoJSON features), public komoot instance by default."""
+
+    def __init__(self, base_url: Optional[str] = None, user_agent: str = DEFAULT_USER_AGENT,
+                 timeout: float = PROVIDER_TIMEOUT_S):
+        super().__init__()
+        # Shared HTTP session: keep-alive connections are reused across lookups
+        options = {"user_agent": user_agent, "timeout": timeout, **geopy_adapter_options()}
+        if base_url:
+            scheme, _, domain = base_url.rstrip("/").rpartition("://")
+            options.update(domain=domain, scheme=scheme or "https")
+        self.geolocator = Photon(**options)
+        self.name = f"photon({base_url})" if base_url else "photon"
+        self.rate_limiter = public_rate_limiter(self.geolocator.domain)
+
+    @staticmethod
+    def _to_nominatim(location) -> Dict:
+        properties = (location.raw or {}).get("properties", {})
+        address = {
+            "house_number": properties.get("housenumber"),
+            "road": properties.get("street") or (properties.get("name") if properties.get("type") == "street" else None),
+            "postcode": properties.get("postcode"),
+            "city": properties.get("city"),
+            "county": properties.get("county"),
+            "state": properties.get("state"),
+            "country": properties.get("country"),
+            "country_code": (properties.get("countrycode") or "").lower() or None,
+        }
+        address = {key: value for key, value in address.items() if value}
+        street = " ".join(address[key] for key in ("house_number", "road") if key in address)
+        locality = " ".join(address[key] for key in ("postcode", "city") if key in address)
+        display_name = ", ".join(part for part in (street or properties.get("name"), locality,
+                                                   address.get("country")) if part)
+        return {
+            "display_name": display_name or location.address,
+            "lat": location.latitude,
+            "lon": location.longitude,
+            "address": address,
+            "place_rank": PHOTON_PLACE_RANKS.get(properties.get("type")),
+            "osm_type": OSM_TYPES.get(properties.get("osm_type"), properties.get("osm_type")),
+            "osm_id": properties.get("osm_id"),
+            "category": properties.get("osm_key"),
+            "type": properties.get("osm_value"),
+        }
+
+    def reverse(self, lat, lon, zoom):
+        # Photon has no zoom: it always returns the nearest feature
+        location = self.geolocator.reverse((lat, lon), exactly_one=True, language='en')
+        return self._to_nominatim(location) if location else None
+
+    def geocode(self, query):
+        location = self.geolocator.geocode(query, exactly_one=True, language='en')
+        return (location.latitude, location.longitude) if location else None
+
+
+class OfflineProvider(GeoProvider):
+    """
+    Local index of previous answers (geocode_cache.json): reverse lookups keyed by rounded
+    coordinates and zoom, forward lookups by normalized address. Answers without any network access.
+    """
+    name = "offline"
+    local = True
+
+    def __init__(self, cache_file: str = OFFLINE_CACHE_FILE, max_entries: int = OFFLINE_MAX_ENTRIES):
+        super().__init__()
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.reverse_index: Dict[str, Dict] = {}
+        self.forward_index: Dict[str, List[float]] = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()   # one writer at a time: no older snapshot overwrites a newer one
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.reverse_index = data.get("reverse", {})
+            self.forward_index = data.get("forward", {})
+        except Exception as e:
+            logger.warning(f"Unreadable offline geocoding index: {e}")
+
+    def save(self, force: bool = True):
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty or (not force and time.monotonic() - self._last_save < OFFLINE_SAVE_INTERVAL_S):
+                    return
+                # Snapshot under the lock: other workers keep storing answers while it is written
+                data = {"reverse": dict(self.reverse_index), "forward": dict(self.forward_index)}
+                self._dirty = False
+                self._last_save = time.monotonic()
+            tmp_file = f"{self.cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_file, self.cache_file)
+            except Exception as e:
+                logger.error(f"Error saving the offline geocoding index: {e}")
+                with self._lock:
+                    self._dirty = True
+
+    @staticmethod
+    def _reverse_key(lat, lon, zoom) -> str:
+        return f"{round(lat, OFFLINE_PRECISION)},{round(lon, OFFLINE_PRECISION)},{zoom}"
+
+    @staticmethod
+    def _trim(index: Dict, max_entries: int):
+        # Insertion order: the oldest answers are dropped first
+        while len(index) > max_entries:
+            index.pop(next(iter(index)))
+
+    def reverse(self, lat, lon, zoom):
+        return self.reverse_index.get(self._reverse_key(lat, lon, zoom))
+
+    def geocode(self, query):
+        point = self.forward_index.get(cache_key(query) or "")
+        return tuple(point) if point else None
+
+    def store_reverse(self, lat, lon, zoom, raw: Dict):
+        with self._lock:
+            self.reverse_index[self._reverse_key(lat, lon, zoom)] = raw
+            key = cache_key(raw.get("display_name"))
+            if key:
+                self.forward_index[key] = [raw["lat"], raw["lon"]]
+            self._trim(self.reverse_index, self.max_entries)
+            self._trim(self.forward_index, self.max_entries)
+            self._dirty = True
+        self.save(force=False)
+
+    def store_geocode(self, query: str, point: Tuple[float, float]):
+        key = cache_key(query)
+        if not key:
+            return
+        with self._lock:
+            self.forward_index[key] = list(point)
+            self._trim(self.forward_index, self.max_entries)
+            self._dirty = True
+        self.save(force=False)
+
+
+def providers_from_spec(spec: Optional[str] = None, user_agent: str = DEFAULT_USER_AGENT) -> List[GeoProvider]:
+    """
+    Builds providers from a spec such as "offline,nominatim=http://geo.lan:8080,photon"
+    (default: GEOAGILE_GEOCODERS, then DEFAULT_PROVIDERS).
+    """
+    spec = spec or os.environ.get(PROVIDERS_ENV) or DEFAULT_PROVIDERS
+    providers = []
+    for item in spec.split(","):
+        kind, _, url = item.strip().partition("=")
+        kind = kind.strip().lower()
+        if kind == "offline":
+            providers.append(OfflineProvider(url or OFFLINE_CACHE_FILE))
+        elif kind == "nominatim":
+            providers.append(NominatimProvider(url or None, user_agent=user_agent))
+        elif kind == "photon":
+            providers.append(PhotonProvider(url or None, user_agent=user_agent))
+        elif kind:
+            logger.warning(f"Unknown geocoding provider ignored: {kind}")
+    return providers
+
+
+class GeoRouter:
+    """
+    Routes lookups across providers. Local providers are queried first; network providers are
+    ranked by EWMA score and hedged after the preferred provider's p95 latency.
+    Network answers feed the offline providers.
+    """
+
+    def __init__(self, providers: List[GeoProvider], deadline_s: float = REQUEST_DEADLINE_S,
+                 max_hedges: int = MAX_HEDGES):
+        self.providers = providers
+        self.local = [provider for provider in providers if provider.local]
+        self.remote = [provider for provider in providers if not provider.local]
+        self.deadline_s = deadline_s
+        self.max_hedges = max_hedges
+        self.hedges = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(2, len(self.remote) * 4), thread_name_prefix="geocoder"
+        )
+        atexit.register(self.close)
+
+    def ranked(self) -> List[GeoProvider]:
+        # sorted() is stable: providers with equal scores keep their configured order
+        return sorted(self.remote, key=lambda provider: provider.stats.score())
+
+    @staticmethod
+    def hedge_delay(provider: GeoProvider) -> float:
+        p95 = provider.stats.p95()
+        delay = DEFAULT_HEDGE_DELAY_S if p95 is None else p95
+        return min(max(delay, MIN_HEDGE_DELAY_S), PROVIDER_TIMEOUT_S)
+
+    @staticmethod
+    def _timed(provider: GeoProvider, method: str, args: Tuple):
+        started = time.perf_counter()
+        try:
+            # Waiting for a slot of a rate-limited public endpoint counts as latency:
+            # under load the router hedges to, and then prefers, the other providers
+            if provider.rate_limiter and not provider.rate_limiter.acquire(timeout=PROVIDER_TIMEOUT_S):
+                raise RateLimited(f"no request slot within {PROVIDER_TIMEOUT_S:.0f}s")
+            result = getattr(provider, method)(*args)
+            provider.stats.record(time.perf_counter() - started, error=False)
+            return result
+        except Exception as e:
+            provider.stats.record(time.perf_counter() - started, error=True)
+            logger.warning(f"Geocoding provider {provider.name} failed: {e}")
+            return None
+
+    def _hedged(self, method: str, args: Tuple):
+        """Returns (result, provider) from the first network provider that answers, or (None, None)."""
+        remaining = self.ranked()
+        pending = {}
+        started = time.monotonic()
+        deadline = started + self.deadline_s
+        hedge_at = deadline
+
+        def launch():
+            nonlocal hedge_at
+            provider = remaining.pop(0)
+            pending[self._executor.submit(self._timed, provider, method, args)] = provider
+            hedge_at = time.monotonic() + self.hedge_delay(provider)
+
+        if remaining:
+            launch()
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            can_hedge = remaining and len(pending) <= self.max_hedges
+            timeout = min(deadline, hedge_at) - now if can_hedge else deadline - now
+            done, _ = wait(list(pending), timeout=max(0.0, timeout), return_when=FIRST_COMPLETED)
+            for future in done:
+                provider = pending.pop(future)
+                result = future.result()
+                if result is not None:
+                    logger.debug(f"Answer from {provider.name} after {time.monotonic() - started:.2f}s")
+                    return result, provider
+            if remaining and not pending:
+                # Failover: every provider in flight failed or found nothing
+                launch()
+            elif can_hedge and time.monotonic() >= hedge_at:
+                self.hedges += 1
+                logger.info(f"No geocoding answer after {time.monotonic() - started:.2f}s, "
+                            f"hedging with {remaining[0].name}")
+                launch()
+        return None, None
+
+    def reverse(self, lat: float, lon: float, zoom: int) -> Tuple[Optional[Dict], Optional[str]]:
+        """Reverse lookup. Returns (Nominatim-like dict, provider name) or (None, None)."""
+        for provider in self.local:
+            raw = self._timed(provider, "reverse", (lat, lon, zoom))
+            if raw:
+                return raw, provider.name
+        raw, provider = self._hedged("reverse", (lat, lon, zoom))
+        if raw:
+            for offline in self.local:
+                offline.store_reverse(lat, lon, zoom, raw)
+        return raw, provider.name if provider else None
+
+    def geocode(self, query: str) -> Tuple[Optional[Tuple[float, float]], Optional[str]]:
+        """Forward lookup. Returns ((lat, lon), provider name) or (None, None)."""
+        for provider in self.local:
+            point = self._timed(provider, "geocode", (query,))
+            if point:
+                return point, provider.name
+        point, provider = self._hedged("geocode", (query,))
+        if point:
+            for offline in self.local:
+                offline.store_geocode(query, point)
+        return point, provider.name if provider else None
+
+    def stats(self) -> Dict[str, Dict]:
+        summary = {provider.name: provider.stats.summary() for provider in self.providers}
+        summary["hedges"] = self.hedges
+        return summary
+
+    def close(self):
+        for provider in self.local:
+            provider.save()
+        self._executor.shutdown(wait=False)
+
+
+_default_router: Optional[GeoRouter] = None
+_default_router_lock = threading.Lock()
+
+
+def default_router(user_agent: str = DEFAULT_USER_AGENT) -> GeoRouter:
+    """Router shared by the whole process, so latency statistics accumulate across accounts."""
+    global _default_router
+    with _default_router_lock:
+        if _default_router is None:
+            _default_router = GeoRouter(providers_from_spec(user_agent=user_agent))
+        return _default_router
+
+
+def default_router_stats() -> Optional[Dict[str, Dict]]:
+    """Statistics of the shared router, None if no lookup was made in this process."""
+    return _default_router.stats() if _default_router else None
+
+
+# Self-check against local stub servers: a slow Nominatim and a fast Photon
+if __name__ == "__main__":
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    logging.basicConfig(level=logging.INFO)
+
+    def stub_server(delay_s: float, payload: Dict) -> str:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(delay_s)
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    nominatim_url = stub_server(2.0, {
+        "display_name": "12 Rue de la Paix, 75002 Paris, France", "lat": "48.8686", "lon": "2.3316",
+        "place_rank": 30, "address": {"house_number": "12", "road": "Rue de la Paix", "postcode": "75002",
+                                      "city": "Paris", "country": "France"},
+    })
+    photon_url = stub_server(0.05, {"features": [{
+        "geometry": {"coordinates": [2.3316, 48.8686]},
+        "properties": {"housenumber": "12", "street": "Rue de la Paix", "postcode": "75002", "city": "Paris",
+                       "country": "France", "countrycode": "FR", "type": "house", "osm_type": "N", "osm_id": 1},
+    }]})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        router = GeoRouter(providers_from_spec(
+            f"offline={os.path.join(tmp, 'index.json')},nominatim={nominatim_url},photon={photon_url}"
+        ))
+        for i in range(3):
+            started = time.perf_counter()
+            raw, name = router.reverse(48.8686 + i * 0.01, 2.3316, 18)
+            print(f"reverse #{i}: {name} in {time.perf_counter() - started:.2f}s -> {raw['display_name']}")
+        started = time.perf_counter()
+        raw, name = router.reverse(48.8686, 2.3316, 18)
+        print(f"repeat: {name} in {time.perf_counter() - started:.3f}s")
+        print(f"ranking: {[provider.name for provider in router.ranked()]}")
+        print(json.dumps(router.stats(), indent=2))
+        router.close()
@@ -1,36 +1,163 @@
 import logging
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 from geopy.distance import geodesic
 
+from geo_providers import GeoRouter, default_router, DEFAULT_USER_AGENT
+
 logger = logging.getLogger("GeoAgile.Geocoder")
 
+# Reverse geocoding detail levels (Nominatim zoom parameter)
+ZOOM_LEVELS = {
+    "country": 3,
+    "state": 5,
+    "county": 8,
+    "city": 10,
+    "suburb": 14,
+    "street": 16,
+    "building": 18,
+}
+DEFAULT_ZOOM = ZOOM_LEVELS["building"]
+
+# Address components kept in the record, with their OSM keys in order of preference
+ADDRESS_COMPONENTS = {
+    "house_number": ("house_number",),
+    "road": ("road", "pedestrian", "footway", "path", "square"),
+    "postcode": ("postcode",),
+    "city": ("city", "town", "village", "hamlet", "municipality"),
+    "county": ("county",),
+    "state": ("state", "region"),
+    "country": ("country",),
+    "country_code": ("country_code",),
+}
+REQUIRED_COMPONENTS = ("road", "postcode", "city", "country")
+MAX_PLACE_RANK = 30            # 30 = building / exact address
+MAX_QUALITY_DISTANCE_M = 1000.0
+# Maximum distance between a canonical address and the resolved point for it to count as verified
+CANONICAL_MAX_DISTANCE_KM = 1.0
+
+
+def score_address_record(record):
+    """
+    Scores a result between 0 and 1 from its precision (OSM place_rank), its distance
+    to the queried point and the presence of the components the portal form needs.
+    """
+    rank = min(record.get("place_rank") or 0, MAX_PLACE_RANK) / MAX_PLACE_RANK
+    distance = record.get("distance_m")
+    proximity = 0.0 if distance is None else max(0.0, 1.0 - distance / MAX_QUALITY_DISTANCE_M)
+    components = record.get("components", {})
+    completeness = sum(1 for name in REQUIRED_COMPONENTS if components.get(name)) / len(REQUIRED_COMPONENTS)
+    return round(0.5 * rank + 0.3 * proximity + 0.2 * completeness, 3)
+
+
+def portal_query(record):
+    """
+    Builds the portal-friendly form of an address record ("12 Road, 75002 City, Country"),
+    closer to the portal's autocomplete suggestions than Nominatim's display name.
+    """
+    components = record.get("components", {})
+    street = " ".join(part for part in (components.get("house_number"), components.get("road")) if part)
+    locality = " ".join(part for part in (components.get("postcode"), components.get("city")) if part)
+    return ", ".join(part for part in (street, locality, components.get("country")) if part) or None
+
+
 class LocationService:
-    def __init__(self, user_agent="geo_agile_starlink_bot"):
-        self.geolocator = Nominatim(user_agent=user_agent)
+    def __init__(self, user_agent=DEFAULT_USER_AGENT, router: GeoRouter = None):
+        """
+        router: provider router (geo_providers). Defaults to the process-wide router configured
+        by GEOAGILE_GEOCODERS, so provider latency statistics are shared by all accounts.
+        """
+        self.router = router or default_router(user_agent)
 
-    def get_address_from_coords(self, lat, lon):
+    def get_address_record(self, lat, lon, zoom=DEFAULT_ZOOM):
         """
-        Reverse geocodes latitude and longitude to an address.
+        Reverse geocodes coordinates to a structured address record in a single request.
+        zoom: detail level (Nominatim 0-18 integer or a ZOOM_LEVELS name, e.g. "street").
+        Returns a dict (address, components, place_rank, osm_type, osm_id, category, type,
+        latitude, longitude, distance_m, zoom, provider, quality) or None.
         """
+        zoom = ZOOM_LEVELS.get(zoom, zoom)
         try:
-            logger.info(f"Geocoding coordinates: {lat}, {lon}")
-            location = self.geolocator.reverse((lat, lon), exactly_one=True, language='en')
-            
-            if location:
-                logger.info(f"Found address: {location.address}")
-                return location.address
-            else:
+            logger.info(f"Geocoding coordinates: {lat}, {lon} (zoom {zoom})")
+            raw, provider = self.router.reverse(lat, lon, zoom)
+
+            if not raw:
                 logger.warning("No address found for these coordinates.")
                 return None
 
-        except (GeocoderTimedOut, GeocoderServiceError) as e:
-            logger.error(f"Geocoding service error: {e}")
-            return None
+            latitude, longitude = float(raw["lat"]), float(raw["lon"])
+            osm_address = raw.get("address", {})
+            components = {}
+            for name, keys in ADDRESS_COMPONENTS.items():
+                value = next((osm_address[key] for key in keys if osm_address.get(key)), None)
+                if value:
+                    components[name] = value
+
+            record = {
+                "address": raw["display_name"],
+                "components": components,
+                "place_rank": int(raw["place_rank"]) if raw.get("place_rank") is not None else None,
+                "osm_type": raw.get("osm_type"),
+                "osm_id": raw.get("osm_id"),
+                "category": raw.get("category") or raw.get("class"),
+                "type": raw.get("type"),
+                "latitude": latitude,
+                "longitude": longitude,
+                "distance_m": round(self.calculate_distance_km((lat, lon), (latitude, longitude)) * 1000, 1),
+                "zoom": zoom,
+                "provider": provider,
+            }
+            record["quality"] = score_address_record(record)
+            logger.info(f"Found address: {record['address']} via {provider} "
+                        f"(rank {record['place_rank']}, {record['distance_m']} m, quality {record['quality']})")
+            return record
+
         except Exception as e:
             logger.error(f"Unexpected geocoding error: {e}")
             return None
 
+    def get_address_from_coords(self, lat, lon, zoom=DEFAULT_ZOOM):
+        """
+        Reverse geocodes latitude and longitude to an address.
+        """
+        record = self.get_address_record(lat, lon, zoom=zoom)
+        return record["address"] if record else None
+
+    def canonical_address(self, address, record=None, cache=None):
+        """
+        Returns the portal-compatible form of a resolved address:
+        {"query": text to type, "accepted": previously accepted portal suggestion or None, "verified": bool}.
+        The query is built from the record components and verified by forward geocoding;
+        results are kept in an AcceptedAddressCache so each address is only prepared once.
+        """
+        entry = cache.get(address) if cache else None
+        if entry and entry.get("query"):
+            return {"query": entry["query"], "accepted": entry.get("accepted"),
+                    "verified": entry.get("verified", False)}
+
+        query = (portal_query(record) if record else None) or address
+        verified = False
+        checked = False
+        try:
+            point, provider = self.router.geocode(query)
+            # No provider answered: the lookup is retried on the next run
+            checked = provider is not None
+            if point and record and record.get("latitude") is not None:
+                distance = self.calculate_distance_km((record["latitude"], record["longitude"]), point)
+                verified = distance <= CANONICAL_MAX_DISTANCE_KM
+                if not verified:
+                    logger.warning(f"Canonical address resolves {distance:.1f} km away, keeping the original")
+            else:
+                verified = point is not None
+        except Exception as e:
+            logger.warning(f"Unexpected forward geocoding error: {e}")
+
+        if not verified:
+            query = address
+        # Do not cache a failed lookup: it will be retried on the next run
+        if cache and checked:
+            cache.remember_query(address, query, verified)
+            cache.save()
+        return {"query": query, "accepted": entry.get("accepted") if entry else None, "verified": verified}
+
     def calculate_distance_km(self, coord1, coord2):
         """
         Calculates distance in km between two (lat, lon) tuples.
@@ -47,3 +174,5 @@ if __name__ == "__main__":
     # Test with Eiffel Tower coordinates
     addr = service.get_address_from_coords(48.8584, 2.2945)
     print(f"Address: {addr}")
+    record = service.get_address_record(48.8584, 2.2945, zoom="street")
+    print(f"Record: {record}")
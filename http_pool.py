@@ -0,0 +1,95 @@
+"""
+Session HTTP partagée par tout le processus (géocodage et API du portail).
+Les connexions keep-alive sont conservées dans un pool par hôte: les requêtes successives vers
+un même fournisseur évitent l'établissement TCP et la négociation TLS.
+Les délais sont séparés par phase: connexion (court) et lecture.
+"""
+import os
+import logging
+import threading
+from typing import Optional, Tuple
+
+# requests est optionnel: sans lui, geopy utilise son adaptateur urllib par défaut
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    REQUESTS_AVAILABLE = False
+    requests = None
+
+try:
+    from geopy.adapters import RequestsAdapter
+    GEOPY_REQUESTS_AVAILABLE = REQUESTS_AVAILABLE
+except ImportError:
+    RequestsAdapter = object
+    GEOPY_REQUESTS_AVAILABLE = False
+
+logger = logging.getLogger("GeoAgile.HttpPool")
+
+POOL_SIZE = int(os.getenv("GEOAGILE_HTTP_POOL_SIZE", "20"))        # connexions conservées par hôte
+CONNECT_TIMEOUT_S = float(os.getenv("GEOAGILE_HTTP_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT_S = float(os.getenv("GEOAGILE_HTTP_READ_TIMEOUT", "10"))
+MAX_RETRIES = 1                                                    # nouvelle tentative sur connexion perdue
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Retourne la session HTTP partagée (créée au premier appel)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=MAX_RETRIES)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            logger.debug(f"Session HTTP partagée créée (pool de {POOL_SIZE} connexions par hôte)")
+        return _session
+
+
+def timeouts(read: Optional[float] = None, connect: Optional[float] = None) -> Tuple[float, float]:
+    """Délais (connexion, lecture) au format de requests."""
+    return (connect or CONNECT_TIMEOUT_S, read or READ_TIMEOUT_S)
+
+
+def close_session():
+    """Ferme les connexions du pool (fin de processus ou tests)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+class SharedSessionAdapter(RequestsAdapter):
+    """
+    Adaptateur geopy (adapter_factory) qui utilise la session partagée au lieu d'une session par
+    géocodeur. Le délai du géocodeur devient le délai de lecture; la connexion a son propre délai.
+    Les paramètres proxies/ssl_context de geopy sont ignorés: la session suit la configuration
+    de requests (variables d'environnement, certificats certifi).
+    """
+
+    def __init__(self, *, proxies=None, ssl_context=None):
+        self.proxies = proxies
+        self.ssl_context = ssl_context
+        self.session = get_session()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def __del__(self):
+        # La session est partagée: elle n'est pas fermée avec le géocodeur
+        pass
+
+    def get_text(self, url, *, timeout, headers):
+        return super().get_text(url, timeout=timeouts(read=timeout), headers=headers)
+
+    def get_json(self, url, *, timeout, headers):
+        return super().get_json(url, timeout=timeouts(read=timeout), headers=headers)
+
+
+def geopy_adapter_options() -> dict:
+    """Options à passer aux géocodeurs geopy pour utiliser la session partagée (vide si indisponible)."""
+    return {"adapter_factory": SharedSessionAdapter} if GEOPY_REQUESTS_AVAILABLE else {}
@@ -8,6 +8,8 @@ import time
 import json
 import logging
 import io
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from typing import Dict, List, Optional
 from pathlib import Path
@@ -18,18 +20,35 @@ if sys.platform == 'win32':
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
 from monitor import StarlinkMonitor
-from geocoder import LocationService
+from geocoder import LocationService, DEFAULT_ZOOM
+from geo_providers import default_router_stats
 from updater import StarlinkPortalClient
 from account_manager import AccountManager
+from address_cache import AcceptedAddressCache
+from address_dictionary import default_dictionary
+from memory_guard import MemoryGuard
+from position_table import PositionTable, FLAG_TRIGGERED, FLAG_UPDATED, NO_ADDRESS
+from run_journal import RunJournal, node_runs_dir, idempotency_key, STAGE_GPS, STAGE_ADDRESS, STAGE_PORTAL, STAGE_DONE
+import events
+import artifacts
+from events import bus as event_bus
 
 # Configuration globale
 STATE_DIR = "states"
 LOGS_DIR = "logs"
+HISTORY_DIR = "history"
+
+# Qualité minimale (0-1) d'une adresse résolue en dessous de laquelle un avertissement est journalisé
+MIN_ADDRESS_QUALITY = 0.5
+
+# Niveau des logs console (relevé pendant l'affichage du tableau de bord)
+CONSOLE_LOG_LEVEL = logging.INFO
 ACCOUNTS_FILE = "accounts.json"
 
 # Créer les répertoires nécessaires
 Path(STATE_DIR).mkdir(exist_ok=True)
 Path(LOGS_DIR).mkdir(exist_ok=True)
+Path(HISTORY_DIR).mkdir(exist_ok=True)
 
 def setup_logger(account_email: str, log_level: int = logging.INFO) -> logging.Logger:
     """
@@ -66,12 +85,49 @@ def setup_logger(account_email: str, log_level: int = logging.INFO) -> logging.L
     
     # Handler console (seulement pour INFO et plus)
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(CONSOLE_LOG_LEVEL)
     console_handler.setFormatter(formatter)
     logger.addHandler(console_handler)
     
     return logger
 
+def release_logger(logger: logging.Logger):
+    """
+    Ferme les handlers d'un logger de compte et le retire du registre du module logging.
+    Sans cela, chaque compte traité laisse un logger et un fichier ouvert jusqu'à la fin du processus.
+    """
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    # Verrou du module logging: les autres workers appellent getLogger() en parallèle,
+    # et getLogger() lit et modifie ce même registre sous ce verrou
+    with logging._lock:
+        registry = logging.Logger.manager.loggerDict
+        registry.pop(logger.name, None)
+        # Les ancêtres non instanciés ("GeoAgile") référencent aussi leurs loggers enfants
+        name = logger.name
+        while "." in name:
+            name = name.rpartition(".")[0]
+            parent = registry.get(name)
+            if isinstance(parent, logging.PlaceHolder):
+                parent.loggerMap.pop(logger, None)
+
+class RunResults:
+    """Résultats d'une exécution: compteurs et liste des comptes en échec uniquement."""
+    
+    def __init__(self):
+        self.successful = 0
+        self.failed: List[str] = []
+    
+    def add(self, email: str, success: bool):
+        if success:
+            self.successful += 1
+        else:
+            self.failed.append(email)
+    
+    def __len__(self):
+        return self.successful + len(self.failed)
+
 def load_account_state(account_email: str) -> Dict:
     """Charge l'état d'un compte spécifique."""
     safe_email = account_email.replace('@', '_at_').replace('.', '_')
@@ -97,6 +153,20 @@ def save_account_state(account_email: str, state: Dict):
     except Exception as e:
         print(f"Erreur lors de la sauvegarde de l'état pour {account_email}: {e}")
 
+def append_execution_history(account_email: str, execution_log: Dict):
+    """
+    Ajoute une exécution au journal d'historique complet du compte (JSON Lines).
+    Contrairement à state["execution_history"], ce journal n'est pas tronqué.
+    """
+    safe_email = account_email.replace('@', '_at_').replace('.', '_')
+    history_file = os.path.join(HISTORY_DIR, f"{safe_email}.jsonl")
+    
+    try:
+        with open(history_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(execution_log, ensure_ascii=False) + "\n")
+    except Exception as e:
+        print(f"Erreur lors de l'écriture de l'historique pour {account_email}: {e}")
+
 def exponential_backoff(attempt: int, initial_delay: float, max_delay: float) -> float:
     """Calcule le délai d'attente pour un retry avec backoff exponentiel."""
     return min(initial_delay * (2 ** attempt), max_delay)
@@ -121,10 +191,20 @@ def retry_with_backoff(func, max_retries: int, operation_name: str,
     
     return None
 
-def process_account(account_email: str, account_config: Dict, manager: AccountManager) -> bool:
+def process_account(account_email: str, account_config: Dict, manager: AccountManager,
+                    polling_index=None, journal: Optional[RunJournal] = None,
+                    memory_guard: Optional[MemoryGuard] = None, browser_pool=None,
+                    position_table: Optional[PositionTable] = None) -> bool:
     """
     Traite un compte individuel.
     
+    Args:
+        polling_index: Index de sondage adaptatif (scheduler.PollingIndex) à mettre à jour, optionnel
+        journal: Journal d'exécution; les étapes déjà terminées qu'il contient ne sont pas refaites
+        memory_guard: Relevés RSS à la fin de chaque étape, optionnel
+        browser_pool: Pool de workers navigateur isolés (browser_pool.BrowserPool), optionnel
+        position_table: Table binaire des positions de la flotte où ajouter le relevé GPS, optionnelle
+    
     Returns:
         True si succès, False sinon
     """
@@ -134,6 +214,8 @@ def process_account(account_email: str, account_config: Dict, manager: AccountMa
     logger.info(f"Démarrage du traitement pour le compte: {account_email}")
     logger.info("=" * 60)
     
+    monitor = None
+    updater = None
     try:
         # Configuration du compte
         password = account_config.get('password')
@@ -147,7 +229,16 @@ def process_account(account_email: str, account_config: Dict, manager: AccountMa
         logger.info("Initialisation des composants...")
         monitor = StarlinkMonitor()
         geocoder = LocationService()
-        updater = StarlinkPortalClient(account_email, password, headless=headless)
+        address_cache = AcceptedAddressCache()
+        updater = StarlinkPortalClient(
+            account_email, password,
+            headless=headless,
+            use_api=account_config.get('use_portal_api', False),
+            block_resources=account_config.get('block_resources', True),
+            lean_profile=account_config.get('lean_browser_profile', True),
+            record=account_config.get('record_portal_session', False),
+            address_cache=address_cache
+        )
         
         # 1. Récupération de la position GPS
         logger.info("Étape 1: Acquisition de la position GPS du Dish...")
@@ -156,7 +247,25 @@ def process_account(account_email: str, account_config: Dict, manager: AccountMa
         test_mode = account_config.get('test_mode', False)
         test_coords = account_config.get('test_coordinates', None)
         
-        if test_mode and test_coords:
+        stage_durations = {}
+        
+        def _start_stage(stage: str) -> float:
+            event_bus.publish(events.STAGE_START, account_email, stage=stage)
+            return time.perf_counter()
+        
+        def _end_stage(stage: str, started: float):
+            stage_durations[stage] = time.perf_counter() - started
+            event_bus.publish(events.STAGE_END, account_email, stage=stage, duration=stage_durations[stage])
+            if memory_guard:
+                memory_guard.sample(stage, account_email)
+        
+        stage_start = _start_stage("gps")
+        journaled_fix = journal.stage(account_email, STAGE_GPS) if journal else None
+        
+        if journaled_fix:
+            current_pos = tuple(journaled_fix["position"])
+            logger.info("Reprise: position GPS déjà acquise lors de l'exécution interrompue")
+        elif test_mode and test_coords:
             logger.info(f"🧪 MODE TEST ACTIVÉ - Utilisation de coordonnées de test")
             logger.info(f"   Coordonnées test: {test_coords}")
             current_pos = (float(test_coords[0]), float(test_coords[1]))
@@ -180,12 +289,23 @@ def process_account(account_email: str, account_config: Dict, manager: AccountMa
                 manager.update_account_stats(account_email, False)
                 return False
         
+        _end_stage("gps", stage_start)
+        if journal and not journaled_fix:
+            journal.record(account_email, STAGE_GPS, position=list(current_pos))
         logger.info(f"Position GPS: Latitude={current_pos[0]:.6f}, Longitude={current_pos[1]:.6f}")
         
         # 2. Vérification de la distance
         state = load_account_state(account_email)
         last_pos = state.get("last_pos")
         
+        # Déplacement depuis le sondage précédent (pour l'intervalle de sondage adaptatif)
+        moved_km = None
+        previous_fix = (state.get("execution_history") or [{}])[-1].get("gps_coordinates")
+        if previous_fix:
+            moved_km = geocoder.calculate_distance_km(
+                current_pos, (previous_fix["latitude"], previous_fix["longitude"])
+            )
+        
         should_update = False
         distance = None
         
@@ -205,44 +325,104 @@ def process_account(account_email: str, account_config: Dict, manager: AccountMa
         
         # 3. Mise à jour de l'adresse si nécessaire
         new_address = None
+        address_id = None
+        address_record = None
         update_success = False
+        address_unchanged = False
         
         if should_update:
             logger.info("Étape 2: Résolution de l'adresse depuis les coordonnées GPS...")
+            stage_start = _start_stage("geocoding")
+            journaled_address = journal.stage(account_email, STAGE_ADDRESS) if journal else None
             
             def _resolve():
-                addr = geocoder.get_address_from_coords(current_pos[0], current_pos[1])
-                if not addr:
+                record = geocoder.get_address_record(
+                    current_pos[0], current_pos[1],
+                    zoom=account_config.get('geocoding_zoom', DEFAULT_ZOOM)
+                )
+                if not record:
                     raise ValueError("Impossible de résoudre l'adresse")
-                return addr
+                return record
             
-            new_address = retry_with_backoff(
-                _resolve,
-                max_retries,
-                "Résolution d'adresse",
-                initial_retry_delay,
-                max_retry_delay
-            )
+            if journaled_address:
+                new_address = journaled_address["address"]
+                address_record = journaled_address.get("record")
+                logger.info("Reprise: adresse déjà résolue lors de l'exécution interrompue")
+            else:
+                address_record = retry_with_backoff(
+                    _resolve,
+                    max_retries,
+                    "Résolution d'adresse",
+                    initial_retry_delay,
+                    max_retry_delay
+                )
+                new_address = address_record["address"] if address_record else None
             
             if not new_address:
                 logger.error("Impossible de résoudre l'adresse. Arrêt de la mise à jour.")
                 manager.update_account_stats(account_email, False)
                 return False
             
+            _end_stage("geocoding", stage_start)
             logger.info(f"Adresse résolue: {new_address}")
+            # Identifiant entier de l'adresse normalisée (état et historique ne stockent plus la chaîne)
+            addresses = default_dictionary()
+            address_id = addresses.intern(new_address)
+            if address_record and address_record["quality"] < MIN_ADDRESS_QUALITY:
+                logger.warning(f"Adresse peu précise (qualité {address_record['quality']}, "
+                               f"rang OSM {address_record['place_rank']}, "
+                               f"à {address_record['distance_m']} m de la position)")
+            if journal and not journaled_address:
+                journal.record(account_email, STAGE_ADDRESS, address=new_address, record=address_record)
             
+            submission_key = idempotency_key(account_email, new_address)
+            committed = journal.stage(account_email, STAGE_PORTAL) if journal else None
+
+            # Adresse identique à celle déjà enregistrée: inutile de lancer le navigateur
+            # Les anciens états contiennent la chaîne (last_address) au lieu de l'identifiant
+            if addresses.same_address(address_id, state.get("last_address_id", state.get("last_address"))):
+                logger.info("Adresse identique à celle déjà enregistrée sur le portail. "
+                            "Mise à jour du portail ignorée.")
+                address_unchanged = True
+                update_success = True
+            # Adresse déjà soumise avec succès avant l'interruption: ne pas la soumettre à nouveau
+            elif committed and committed.get("key") == submission_key:
+                stage_start = _start_stage("portal")
+                logger.info("Reprise: adresse déjà soumise au portail lors de l'exécution interrompue")
+                update_success = True
             # En mode test, simuler la mise à jour au lieu de se connecter réellement
-            if test_mode:
+            elif test_mode:
+                stage_start = _start_stage("portal")
                 logger.info("🧪 MODE TEST - Simulation de la mise à jour sur le portail...")
                 logger.info("   (En mode test, la connexion au portail réel est simulée)")
                 time.sleep(1)  # Simuler un délai
                 update_success = True
                 logger.info("✅ Mise à jour simulée avec succès (mode test)")
             else:
+                stage_start = _start_stage("portal")
                 logger.info("Étape 3: Mise à jour de l'adresse de service sur le portail...")
                 
+                # Forme de l'adresse compatible avec les suggestions du portail (mise en cache)
+                canonical = geocoder.canonical_address(new_address, address_record, address_cache)
+                if canonical["accepted"]:
+                    logger.info(f"Suggestion déjà acceptée par le portail: {canonical['accepted']}")
+                elif canonical["query"] != new_address:
+                    logger.info(f"Adresse canonique pour le portail: {canonical['query']}")
+                
                 def _update():
-                    success = updater.update_service_address(new_address)
+                    if browser_pool:
+                        success = browser_pool.update_service_address(
+                            account_email, password, new_address, canonical,
+                            {
+                                "headless": headless,
+                                "lean_profile": account_config.get('lean_browser_profile', True),
+                                "use_api": account_config.get('use_portal_api', False),
+                                "block_resources": account_config.get('block_resources', True),
+                                "record": account_config.get('record_portal_session', False),
+                            }
+                        )
+                    else:
+                        success = updater.update_service_address(new_address, canonical)
                     if not success:
                         raise ValueError("Échec de la mise à jour de l'adresse")
                     return success
@@ -255,13 +435,25 @@ def process_account(account_email: str, account_config: Dict, manager: AccountMa
                     max_retry_delay
                 )
             
+            if not address_unchanged:
+                _end_stage("portal", stage_start)
+                if journal and update_success and not committed:
+                    journal.record(account_email, STAGE_PORTAL, key=submission_key)
+            
             if update_success:
                 logger.info("Mise à jour d'adresse réussie.")
                 # Mise à jour de l'état
                 state["last_pos"] = current_pos
-                state["last_address"] = new_address
-                state["last_updated"] = time.time()
-                state["last_updated_iso"] = datetime.now().isoformat()
+                state["last_address_id"] = address_id
+                state.pop("last_address", None)
+                if address_record:
+                    # Le texte de l'adresse est dans le dictionnaire (last_address_id)
+                    state["last_address_record"] = {
+                        key: value for key, value in address_record.items() if key != "address"
+                    }
+                if not address_unchanged:
+                    state["last_updated"] = time.time()
+                    state["last_updated_iso"] = datetime.now().isoformat()
                 save_account_state(account_email, state)
                 manager.update_account_stats(account_email, True)
             else:
@@ -280,11 +472,14 @@ def process_account(account_email: str, account_config: Dict, manager: AccountMa
                 "latitude": current_pos[0],
                 "longitude": current_pos[1]
             },
-            "resolved_address": new_address,
+            "resolved_address_id": address_id,
+            "address_quality": address_record["quality"] if address_record else None,
             "distance_km": distance,
             "update_threshold_km": update_threshold,
             "update_triggered": should_update,
-            "update_successful": update_success
+            "update_successful": update_success,
+            "address_unchanged": address_unchanged,
+            "stage_durations_s": stage_durations
         }
         
         logger.info("=== Détails de l'exécution ===")
@@ -295,6 +490,8 @@ def process_account(account_email: str, account_config: Dict, manager: AccountMa
         if distance is not None:
             logger.info(f"Distance: {distance:.2f} km (seuil: {update_threshold} km)")
         logger.info(f"Mise à jour déclenchée: {should_update}")
+        if address_unchanged:
+            logger.info("Adresse inchangée: session portail évitée")
         logger.info(f"Mise à jour réussie: {update_success}")
         logger.info("==============================")
         
@@ -307,6 +504,18 @@ def process_account(account_email: str, account_config: Dict, manager: AccountMa
             state["execution_history"] = state["execution_history"][-100:]
         
         save_account_state(account_email, state)
+        append_execution_history(account_email, execution_log)
+        if position_table is not None:
+            flags = (FLAG_TRIGGERED | (FLAG_UPDATED if update_success else 0)) if should_update else 0
+            position_table.append(account_email, current_pos[0], current_pos[1], flags=flags,
+                                  address_id=address_id if address_id is not None else NO_ADDRESS)
+        
+        if journal and update_success:
+            journal.record(account_email, STAGE_DONE, success=True)
+        
+        if polling_index is not None and update_success:
+            interval = polling_index.record(account_email, moved_km)
+            logger.info(f"Prochain sondage GPS dans {interval / 60:.0f} min")
         
         logger.info("=" * 60)
         logger.info(f"Traitement terminé pour {account_email}")
@@ -318,9 +527,103 @@ def process_account(account_email: str, account_config: Dict, manager: AccountMa
         logger.error(f"Erreur lors du traitement du compte {account_email}: {e}", exc_info=True)
         manager.update_account_stats(account_email, False)
         return False
+    finally:
+        if updater:
+            updater.close()
+        if monitor:
+            monitor.close()
+        release_logger(logger)
+
+def run_account(email: str, account_config: Dict, manager: AccountManager, announce: bool = True,
+                polling_index=None, journal: Optional[RunJournal] = None,
+                memory_guard: Optional[MemoryGuard] = None, browser_pool=None,
+                position_table: Optional[PositionTable] = None) -> bool:
+    """Traite un compte en publiant son début et sa fin sur le bus d'événements."""
+    if announce:
+        print(f"\n🔄 Traitement du compte: {email}")
+        print("-" * 60)
+    event_bus.publish(events.ACCOUNT_START, email)
+    success = False
+    try:
+        success = process_account(
+            email, account_config, manager, polling_index, journal, memory_guard, browser_pool,
+            position_table
+        )
+        return success
+    finally:
+        event_bus.publish(events.ACCOUNT_END, email, success=success)
+
+def _run_accounts(accounts: Dict, manager: AccountManager, workers: int, dashboard, results: RunResults,
+                  polling_index=None, journal: Optional[RunJournal] = None,
+                  memory_guard: Optional[MemoryGuard] = None, browser_pool=None,
+                  position_table: Optional[PositionTable] = None):
+    """Traite les comptes avec un pool de workers et collecte les résultats."""
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="worker") as executor:
+        futures = {}
+        for email, account_config in accounts.items():
+            future = executor.submit(
+                run_account, email, account_config, manager, dashboard is None,
+                polling_index, journal, memory_guard, browser_pool, position_table
+            )
+            futures[future] = email
+        
+        if dashboard:
+            dashboard.run(until=lambda: all(future.done() for future in futures))
+        
+        for future in as_completed(futures):
+            # Ne pas garder les futures terminées pendant toute l'exécution
+            email = futures.pop(future)
+            try:
+                success = future.result()
+                results.add(email, success)
+                
+                if success:
+                    print(f"✅ {email}: Succès")
+                else:
+                    print(f"❌ {email}: Échec")
+            except Exception as e:
+                print(f"❌ {email}: Erreur - {e}")
+                results.add(email, False)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Geo-Agile Starlink Automation - Version Multi-Comptes")
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Nombre de comptes traités en parallèle (défaut: 1)')
+    parser.add_argument('--dashboard', action='store_true',
+                        help='Afficher un tableau de bord en direct pendant l\'exécution')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='Nombre de nœuds se partageant la flotte (défaut: 1, pas de partage)')
+    parser.add_argument('--shard-index', type=int, default=0,
+                        help='Index du shard de ce nœud (0 à shards-1)')
+    parser.add_argument('--node-id', default=None,
+                        help='Identifiant stable de ce nœud (défaut: <hostname>-<shard-index>)')
+    parser.add_argument('--lease-db', default=None,
+                        help='Base SQLite des baux de shards, sur un disque local (défaut: leases.db)')
+    parser.add_argument('--lease-ttl', type=float, default=None,
+                        help='Durée de validité d\'un bail en secondes (défaut: 7200)')
+    parser.add_argument('--priority', action='store_true',
+                        help='Traiter d\'abord les comptes en mouvement, anciens ou en échec')
+    parser.add_argument('--skip-idle', action='store_true',
+                        help='Ne pas interroger les comptes immobiles avant l\'expiration de leur back-off')
+    parser.add_argument('--adaptive-polling', action='store_true',
+                        help='N\'interroger que les comptes dont l\'intervalle de sondage adaptatif est écoulé')
+    parser.add_argument('--all', action='store_true', dest='poll_all',
+                        help='Avec --adaptive-polling: interroger tous les comptes, même non dus')
+    parser.add_argument('--resume', action='store_true',
+                        help='Reprendre la dernière exécution interrompue sans refaire les étapes terminées')
+    parser.add_argument('--browser-workers', type=int, default=0,
+                        help='Exécuter les sessions navigateur dans N processus isolés (défaut: 0, dans le processus)')
+    parser.add_argument('--browser-timeout', type=float, default=None,
+                        help='Durée maximale d\'une session navigateur isolée avant arrêt forcé (défaut: 300s)')
+    parser.add_argument('--memory-budget-mb', type=float, default=None,
+                        help='Budget mémoire (RSS) du processus: alerte en cas de dépassement')
+    return parser.parse_args(argv)
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Point d'entrée principal - traite tous les comptes actifs."""
+    global CONSOLE_LOG_LEVEL
+    args = parse_args(argv)
+    
     print("=" * 60)
     print("Geo-Agile Starlink Automation - Version Multi-Comptes")
     print("=" * 60)
@@ -333,43 +636,152 @@ def main():
         print("   Utilisez 'python cli.py add' pour ajouter un compte.")
         return
     
+    coordinator = None
+    if args.shards > 1:
+        from sharding import ShardCoordinator, LEASES_DB, DEFAULT_LEASE_TTL
+        coordinator = ShardCoordinator(
+            args.shard_index, args.shards,
+            node_id=args.node_id,
+            db_path=args.lease_db or LEASES_DB,
+            lease_ttl=args.lease_ttl or DEFAULT_LEASE_TTL
+        )
+        owned = coordinator.claim()
+        accounts = coordinator.filter_accounts(accounts)
+        print(f"\n🧩 Nœud {coordinator.node_id}: shard(s) {', '.join(owned) or 'aucun'}")
+        if not accounts:
+            print("   Aucun compte à traiter pour ce nœud.")
+            coordinator.stop_heartbeat()
+            return
+        coordinator.start_heartbeat()
+    
+    polling_index = None
+    if args.adaptive_polling:
+        from scheduler import PollingIndex
+        polling_index = PollingIndex()
+        if not args.poll_all:
+            due, waiting = polling_index.due(accounts)
+            accounts = {email: accounts[email] for email in due}
+            if waiting:
+                print(f"\n⏱️  {len(waiting)} compte(s) non dû(s) (intervalle de sondage non écoulé)")
+            if not accounts:
+                print("   Aucun compte à traiter pour le moment.")
+                if coordinator:
+                    coordinator.stop_heartbeat()
+                return
+    
+    # Un répertoire de journaux par nœud: --resume ne reprend que les exécutions de ce nœud
+    runs_dir = node_runs_dir(coordinator.node_id if coordinator else None)
+    journal = RunJournal.resume(runs_dir) if args.resume else None
+    if journal:
+        done = [email for email in accounts if journal.is_done(email)]
+        accounts = {email: config for email, config in accounts.items() if not journal.is_done(email)}
+        print(f"\n⏯️  Reprise de l'exécution {journal.run_id}: {len(done)} compte(s) déjà traité(s)")
+        if not accounts:
+            print("   Tous les comptes ont déjà été traités.")
+            journal.finish()
+            if coordinator:
+                coordinator.stop_heartbeat()
+            return
+    else:
+        if args.resume:
+            print("\nAucune exécution interrompue à reprendre - nouvelle exécution.")
+        journal = RunJournal.start(runs_dir)
+    
+    # Artefacts de débogage rangés sous l'identifiant de l'exécution (workers navigateur compris)
+    os.environ[artifacts.RUN_ID_ENV] = journal.run_id
+    
+    # Relevés GPS de toute la flotte; la première fois, reprise de l'historique des fichiers d'état
+    position_table = PositionTable()
+    if len(position_table) == 0 and os.path.isdir(STATE_DIR):
+        position_table.import_states(STATE_DIR, list(accounts))
+    # La table ne garde que les derniers relevés de chaque compte: taille et coût du planificateur bornés
+    position_table.maybe_compact()
+    
+    if args.priority or args.skip_idle:
+        from scheduler import prioritize
+        accounts, skipped = prioritize(accounts, load_account_state, skip_idle=args.skip_idle,
+                                       positions=position_table)
+        if skipped:
+            print(f"\n💤 {len(skipped)} compte(s) immobile(s) en attente (back-off non expiré)")
+        if not accounts:
+            print("   Aucun compte à traiter pour le moment.")
+            journal.finish()
+            if coordinator:
+                coordinator.stop_heartbeat()
+            return
+    
     print(f"\n📋 {len(accounts)} compte(s) actif(s) à traiter\n")
     
-    results = {}
+    dashboard = None
+    if args.dashboard:
+        from cli_modern import RunDashboard
+        dashboard = RunDashboard(event_bus)
+        # Les logs console masqueraient le tableau de bord
+        CONSOLE_LOG_LEVEL = logging.WARNING
     
-    for email, account_config in accounts.items():
-        print(f"\n🔄 Traitement du compte: {email}")
-        print("-" * 60)
-        
-        try:
-            success = process_account(email, account_config, manager)
-            results[email] = success
-            
-            if success:
-                print(f"✅ {email}: Succès")
-            else:
-                print(f"❌ {email}: Échec")
-        except Exception as e:
-            print(f"❌ {email}: Erreur - {e}")
-            results[email] = False
+    results = RunResults()
+    memory_guard = MemoryGuard(args.memory_budget_mb)
+    workers = max(1, args.workers)
+    event_bus.publish(events.RUN_START, total=len(accounts), workers=workers)
+    
+    browser_pool = None
+    if args.browser_workers > 0:
+        from browser_pool import BrowserPool, JOB_TIMEOUT_S
+        browser_pool = BrowserPool(
+            min(args.browser_workers, workers),
+            job_timeout_s=args.browser_timeout or JOB_TIMEOUT_S
+        )
+    
+    try:
+        _run_accounts(accounts, manager, workers, dashboard, results, polling_index, journal,
+                      memory_guard, browser_pool, position_table)
+        journal.finish()
+    finally:
+        if browser_pool:
+            browser_pool.close()
+        artifacts.writer.flush()
+        if polling_index:
+            polling_index.save()
+        if coordinator:
+            coordinator.stop_heartbeat()
+    
+    event_bus.publish(events.RUN_END)
     
     # Résumé final
     print("\n" + "=" * 60)
     print("Résumé de l'exécution")
     print("=" * 60)
     
-    successful = sum(1 for success in results.values() if success)
-    failed = len(results) - successful
-    
-    print(f"✅ Succès: {successful}")
-    print(f"❌ Échecs: {failed}")
+    print(f"✅ Succès: {results.successful}")
+    print(f"❌ Échecs: {len(results.failed)}")
     print(f"📊 Total: {len(results)}")
     
-    if failed > 0:
+    memory = memory_guard.report()
+    if memory["current_mb"] is not None:
+        peaks = ", ".join(f"{stage}: {peak} Mo" for stage, peak in memory["peak_mb_by_stage"].items())
+        print(f"🧠 Mémoire: {memory['current_mb']} Mo (départ: {memory['baseline_mb']} Mo)"
+              + (f" - pics par étape: {peaks}" if peaks else ""))
+        if memory["over_budget"]:
+            print(f"   ⚠️  Budget mémoire dépassé {memory['over_budget']} fois")
+    
+    geo_stats = default_router_stats()
+    if geo_stats:
+        hedges = geo_stats.pop("hedges")
+        providers = ", ".join(
+            f"{name}: {stats['latency_ms']} ms ({stats['requests']} req., {stats['errors']} erreur(s))"
+            for name, stats in geo_stats.items() if stats["requests"]
+        )
+        print(f"🗺️  Géocodage: {providers or 'aucune requête'} - {hedges} requête(s) doublée(s)")
+    
+    if browser_pool:
+        pool_stats = browser_pool.stats
+        print(f"🌐 Workers navigateur: {pool_stats['jobs']} session(s), {pool_stats['timeouts']} arrêt(s) forcé(s), "
+              f"{pool_stats['crashes']} plantage(s), {pool_stats['recycled']} recyclage(s)")
+    
+    if results.failed:
         print("\nComptes en échec:")
-        for email, success in results.items():
-            if not success:
-                print(f"  - {email}")
+        for email in results.failed:
+            print(f"  - {email}")
 
 if __name__ == "__main__":
     main()
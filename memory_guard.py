@@ -0,0 +1,200 @@
+"""
+Surveillance de la mémoire des exécutions longues.
+Mesure le RSS du processus après chaque étape, conserve le pic par étape et signale
+le dépassement d'un budget mémoire (avec un garbage collect pour libérer ce qui peut l'être).
+"""
+import os
+import gc
+import sys
+import logging
+import threading
+from typing import Dict, Optional
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    # Windows
+    RESOURCE_AVAILABLE = False
+    resource = None
+
+logger = logging.getLogger("GeoAgile.Memory")
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> Optional[int]:
+    """RSS courant du processus en octets (pic du processus si le courant n'est pas disponible)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    if RESOURCE_AVAILABLE:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss est en Ko sous Linux, en octets sous macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    return None
+
+
+def process_tree_rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """
+    RSS d'un processus et de tous ses descendants (ex: worker + processus Chromium).
+    Linux uniquement (/proc); ailleurs, RSS du processus courant.
+    """
+    pid = pid or os.getpid()
+    total = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/statm", "r") as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children", "r") as f:
+                    pending.extend(int(child) for child in f.read().split())
+    except FileNotFoundError:
+        # Processus terminé pendant le parcours
+        pass
+    except (OSError, ValueError, IndexError):
+        return rss_bytes() if pid == os.getpid() else None
+    return total
+
+
+class MemoryGuard:
+    """Relevés RSS par étape et alerte au-delà d'un budget (en Mo)."""
+
+    def __init__(self, budget_mb: Optional[float] = None):
+        self.budget_bytes = budget_mb * 1024 * 1024 if budget_mb else None
+        self.baseline = rss_bytes()
+        self.peaks: Dict[str, int] = {}
+        self.over_budget = 0
+        self._lock = threading.Lock()
+
+    def sample(self, stage: str, account: Optional[str] = None) -> Optional[int]:
+        """Relève le RSS à la fin d'une étape. Retourne le RSS en octets."""
+        rss = rss_bytes()
+        if rss is None:
+            return None
+        with self._lock:
+            if rss > self.peaks.get(stage, 0):
+                self.peaks[stage] = rss
+        logger.debug(f"RSS après l'étape {stage} ({account or '-'}): {rss / 1048576:.1f} Mo")
+
+        if self.budget_bytes and rss > self.budget_bytes:
+            gc.collect()
+            rss = rss_bytes() or rss
+            if rss > self.budget_bytes:
+                with self._lock:
+                    self.over_budget += 1
+                logger.warning(
+                    f"Budget mémoire dépassé après l'étape {stage} ({account or '-'}): "
+                    f"{rss / 1048576:.1f} Mo > {self.budget_bytes / 1048576:.0f} Mo"
+                )
+        return rss
+
+    def report(self) -> Dict:
+        """Résumé: RSS de départ, courant et pic par étape (en Mo)."""
+        current = rss_bytes()
+        to_mb = lambda value: round(value / 1048576, 1) if value else None
+        return {
+            "baseline_mb": to_mb(self.baseline),
+            "current_mb": to_mb(current),
+            "peak_mb_by_stage": {stage: to_mb(peak) for stage, peak in self.peaks.items()},
+            "over_budget": self.over_budget,
+        }
+
+
+# Vérification: la mémoire doit rester stable sur des milliers de comptes synthétiques traités par
+# process_account (Dish, fournisseur de géocodage et portail remplacés par des bouchons locaux)
+if __name__ == "__main__":
+    import json
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    logging.basicConfig(level=logging.WARNING)
+    # Les loggers de compte se propagent à la racine: seuls les avertissements sont affichés
+    logging.getLogger().handlers[0].setLevel(logging.WARNING)
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    warmup = min(200, accounts // 5)
+    os.chdir(tempfile.mkdtemp(prefix="geoagile-mem-"))
+
+    class GeocoderStub(BaseHTTPRequestHandler):
+        """Nominatim local: même réponse pour toutes les positions."""
+        protocol_version = "HTTP/1.1"
+        PLACE = {
+            "display_name": "12 Rue de la Paix, 75002 Paris, France", "lat": "48.8686", "lon": "2.3316",
+            "place_rank": 30, "address": {"house_number": "12", "road": "Rue de la Paix", "postcode": "75002",
+                                          "city": "Paris", "country": "France"},
+        }
+
+        def do_GET(self):
+            payload = [self.PLACE] if self.path.startswith("/search") else self.PLACE
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GeocoderStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["GEOAGILE_GEOCODERS"] = f"offline,nominatim=http://127.0.0.1:{server.server_address[1]}"
+
+    import main_multi
+    from account_manager import AccountManager
+
+    class MonitorStub:
+        """Dish simulé: position fixe."""
+        ip = "stub"
+
+        def get_gps_position(self):
+            return (48.8686, 2.3316)
+
+        def close(self):
+            pass
+
+    class PortalStub:
+        """Pool navigateur simulé: chaque mise à jour réussit sans lancer Chromium."""
+
+        def __init__(self):
+            self.updates = 0
+
+        def update_service_address(self, email, password, address, canonical, options):
+            self.updates += 1
+            return True
+
+    main_multi.StarlinkMonitor = MonitorStub
+    main_multi.CONSOLE_LOG_LEVEL = logging.CRITICAL
+    manager = AccountManager()
+    emails = [f"synthetic{index}@example.com" for index in range(accounts)]
+    manager.import_accounts({"email": email, "password": "x", "initial_retry_delay": 0.0} for email in emails)
+    configs = manager.get_all_accounts()
+    portal = PortalStub()
+    guard = MemoryGuard()
+    results = main_multi.RunResults()
+    after_warmup = None
+
+    for index, email in enumerate(emails):
+        success = main_multi.process_account(email, configs[email], manager, memory_guard=guard,
+                                             browser_pool=portal)
+        results.add(email, success)
+        guard.sample("account", email)
+        if index + 1 == warmup:
+            gc.collect()
+            after_warmup = rss_bytes()
+
+    gc.collect()
+    final = rss_bytes()
+    growth_mb = (final - after_warmup) / 1048576
+    print(f"{accounts} comptes traités par process_account: RSS après {warmup} comptes "
+          f"{after_warmup / 1048576:.1f} Mo, final {final / 1048576:.1f} Mo (croissance {growth_mb:.2f} Mo)")
+    print(f"Loggers restants: {sum(1 for name in logging.Logger.manager.loggerDict if name.startswith('GeoAgile.synthetic'))}")
+    print(f"Résultats: {results.successful} succès, {len(results.failed)} échec(s), "
+          f"{portal.updates} mise(s) à jour du portail simulée(s)")
+    assert results.successful == accounts and portal.updates == accounts, "Des comptes n'ont pas été traités"
+    assert growth_mb < 5, "La mémoire augmente avec le nombre de comptes"
+    print("OK: mémoire stable")
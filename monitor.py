@@ -25,6 +25,39 @@ class StarlinkMonitor:
         self.ip = ip
         self.port = port
         self.timeout = timeout
+        self._channel = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_channel(self):
+        """
+        Canal gRPC réutilisé par les appels successifs (retries compris).
+        Retourne None si le canal ne peut pas être établi.
+        """
+        if self._channel is None and GRPC_AVAILABLE and hasattr(grpc, 'insecure_channel'):
+            channel = grpc.insecure_channel(f"{self.ip}:{self.port}")
+            try:
+                # Configurer le timeout
+                grpc.channel_ready_future(channel).result(timeout=self.timeout)
+            except Exception as e:
+                channel.close()
+                logger.debug(f"Impossible de créer un contexte gRPC direct: {e}")
+                return None
+            self._channel = channel
+        return self._channel
+
+    def close(self):
+        """Ferme le canal gRPC s'il a été ouvert."""
+        if self._channel is not None:
+            try:
+                self._channel.close()
+            except Exception as e:
+                logger.debug(f"Erreur lors de la fermeture du canal gRPC: {e}")
+            self._channel = None
 
     def _check_connectivity(self):
         """
@@ -167,15 +200,7 @@ class StarlinkMonitor:
             logger.info(f"Interrogation du Dishy à {self.ip}:{self.port}...")
             
             # Créer un contexte avec timeout si l'API le supporte
-            context = None
-            if GRPC_AVAILABLE and hasattr(grpc, 'insecure_channel'):
-                try:
-                    channel = grpc.insecure_channel(f"{self.ip}:{self.port}")
-                    # Configurer le timeout
-                    grpc.channel_ready_future(channel).result(timeout=self.timeout)
-                    context = channel
-                except Exception as e:
-                    logger.debug(f"Impossible de créer un contexte gRPC direct: {e}")
+            context = self._get_channel()
             
             # Essayer différentes méthodes pour récupérer la position
             position = None
@@ -210,6 +235,6 @@ class StarlinkMonitor:
 # Simple manual test block
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    monitor = StarlinkMonitor()
-    pos = monitor.get_gps_position()
+    with StarlinkMonitor() as monitor:
+        pos = monitor.get_gps_position()
     print(f"Position: {pos}")
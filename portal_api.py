@@ -0,0 +1,286 @@
+"""
+Client HTTP léger pour le portail Starlink.
+Réutilise les cookies d'une connexion navigateur pour mettre à jour l'adresse de service
+par requêtes HTTP directes, sans lancer Chromium.
+Une mise à jour n'est considérée comme faite que si la réponse ou une relecture de l'adresse
+la confirme; sinon le flux navigateur prend le relais.
+
+Vérification contre un serveur local simulant le portail:
+    python portal_api.py --self-check
+"""
+import os
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from address_utils import addresses_match
+from http_pool import get_session, timeouts, REQUESTS_AVAILABLE
+
+logger = logging.getLogger("GeoAgile.PortalApi")
+
+SESSIONS_DIR = "sessions"
+API_BASE_URL = os.getenv("STARLINK_API_BASE_URL", "https://api.starlink.com")
+ADDRESS_UPDATE_PATH = os.getenv("STARLINK_API_ADDRESS_PATH", "/webagg/v2/accounts/service-address")
+# Champs d'une réponse JSON qui portent l'adresse de service (recherchés en profondeur)
+ADDRESS_FIELDS = ("address", "serviceAddress", "formattedAddress", "formatted_address")
+
+
+def _cookies_file(email: str) -> str:
+    safe_email = email.replace('@', '_at_').replace('.', '_')
+    return os.path.join(SESSIONS_DIR, f"{safe_email}.json")
+
+
+def load_session_cookies(email: str) -> List[Dict]:
+    """Charge les cookies sauvegardés après la dernière connexion navigateur."""
+    cookies_file = _cookies_file(email)
+    if not os.path.exists(cookies_file):
+        return []
+    try:
+        with open(cookies_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Impossible de charger les cookies de session pour {email}: {e}")
+        return []
+
+
+def save_session_cookies(email: str, cookies: List[Dict]):
+    """Sauvegarde les cookies d'une connexion navigateur (format Playwright)."""
+    try:
+        os.makedirs(SESSIONS_DIR, exist_ok=True)
+        cookies_file = _cookies_file(email)
+        with open(cookies_file, 'w', encoding='utf-8') as f:
+            json.dump(cookies, f)
+        os.chmod(cookies_file, 0o600)  # Les cookies valent un mot de passe
+    except Exception as e:
+        logger.warning(f"Impossible de sauvegarder les cookies de session pour {email}: {e}")
+
+
+def clear_session_cookies(email: str):
+    """Supprime les cookies d'une session expirée."""
+    cookies_file = _cookies_file(email)
+    if os.path.exists(cookies_file):
+        os.remove(cookies_file)
+
+
+class StarlinkApiClient:
+    """Met à jour l'adresse de service via l'API HTTP du portail."""
+
+    def __init__(self, email, cookies, base_url=None, timeout=15):
+        self.email = email
+        self.base_url = (base_url or API_BASE_URL).rstrip('/')
+        self.timeout = timeout
+        # Seuls les cookies déposés pour l'hôte de l'API lui sont envoyés
+        self.cookies = self._cookies_for_url(cookies or [], self.base_url)
+
+    @staticmethod
+    def _cookies_for_url(cookies: List[Dict], url: str) -> List[Dict]:
+        """Cookies (format Playwright) dont le domaine correspond à l'hôte de l'URL."""
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        matching = []
+        for cookie in cookies:
+            domain = cookie.get("domain", "").lower()
+            if not domain or 'name' not in cookie:
+                continue
+            if cookie.get("secure") and parts.scheme != "https":
+                continue
+            if domain.startswith("."):
+                # Cookie de domaine: valable pour le domaine et ses sous-domaines
+                if host == domain[1:] or host.endswith(domain):
+                    matching.append(cookie)
+            elif host == domain:
+                matching.append(cookie)
+        return matching
+
+    def _headers(self) -> Dict:
+        headers = {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "Origin": "https://www.starlink.com",
+            "Referer": "https://www.starlink.com/account/home",
+        }
+        # Jeton anti-CSRF éventuellement déposé par le portail
+        for cookie in self.cookies:
+            if cookie.get("name", "").upper() in ("XSRF-TOKEN", "CSRF-TOKEN"):
+                headers["X-XSRF-TOKEN"] = cookie.get("value", "")
+        return headers
+
+    def _cookie_header(self) -> str:
+        return "; ".join(f"{c['name']}={c['value']}" for c in self.cookies)
+
+    @staticmethod
+    def _find_address(payload: Any) -> Optional[str]:
+        """Adresse contenue dans une réponse JSON (premier champ de ADDRESS_FIELDS trouvé)."""
+        if isinstance(payload, dict):
+            for field in ADDRESS_FIELDS:
+                value = payload.get(field)
+                if isinstance(value, str) and value.strip():
+                    return value
+            values = payload.values()
+        elif isinstance(payload, list):
+            values = payload
+        else:
+            return None
+        for value in values:
+            address = StarlinkApiClient._find_address(value)
+            if address:
+                return address
+        return None
+
+    @staticmethod
+    def _json_or_none(response) -> Any:
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _reports_error(payload: Any) -> bool:
+        """Réponse 2xx qui signale néanmoins un échec (success: false, errors non vide)."""
+        return isinstance(payload, dict) and (payload.get("success") is False or bool(payload.get("errors")))
+
+    def read_service_address(self) -> Optional[str]:
+        """Relit l'adresse de service enregistrée (None si elle n'a pas pu être lue)."""
+        url = f"{self.base_url}{ADDRESS_UPDATE_PATH}"
+        headers = self._headers()
+        headers["Cookie"] = self._cookie_header()
+        try:
+            response = get_session().get(url, headers=headers, timeout=timeouts(read=self.timeout))
+        except Exception as e:
+            logger.warning(f"Erreur lors de la relecture de l'adresse: {e}")
+            return None
+        if not 200 <= response.status_code < 300:
+            logger.warning(f"Relecture de l'adresse impossible ({response.status_code})")
+            return None
+        return self._find_address(self._json_or_none(response))
+
+    def update_service_address(self, new_address: str) -> Optional[bool]:
+        """
+        Envoie la nouvelle adresse de service puis vérifie qu'elle a été enregistrée:
+        adresse renvoyée dans la réponse, sinon relecture par GET.
+        Retourne True si l'adresse enregistrée correspond, False sinon (requête échouée,
+        erreur signalée dans la réponse, adresse ignorée), None si la session n'est plus
+        valide (une connexion navigateur est nécessaire).
+        """
+        if not REQUESTS_AVAILABLE:
+            logger.debug("requests non installé - client HTTP indisponible")
+            return False
+        if not self.cookies:
+            return None
+
+        url = f"{self.base_url}{ADDRESS_UPDATE_PATH}"
+        headers = self._headers()
+        headers["Cookie"] = self._cookie_header()
+
+        try:
+            logger.info(f"Mise à jour de l'adresse via l'API HTTP ({url})...")
+            response = get_session().put(
+                url,
+                json={"address": new_address},
+                headers=headers,
+                timeout=timeouts(read=self.timeout)
+            )
+        except Exception as e:
+            logger.warning(f"Erreur lors de la requête HTTP de mise à jour: {e}")
+            return False
+
+        if response.status_code in (401, 403):
+            logger.info("Session HTTP expirée - reconnexion navigateur nécessaire")
+            return None
+        if 200 <= response.status_code < 300:
+            payload = self._json_or_none(response)
+            if self._reports_error(payload):
+                logger.warning(f"L'API signale un échec de la mise à jour: {response.text[:200]}")
+                return False
+            saved = self._find_address(payload)
+            if not saved or not addresses_match(saved, new_address):
+                saved = self.read_service_address()
+            if saved and addresses_match(saved, new_address):
+                logger.info("Adresse mise à jour via l'API HTTP (confirmée)")
+                return True
+            logger.warning(f"Mise à jour via l'API non confirmée (adresse relue: {saved!r})")
+            return False
+
+        logger.warning(f"Réponse inattendue de l'API ({response.status_code}): {response.text[:200]}")
+        return False
+
+
+def self_check() -> bool:
+    """
+    Rejoue des mises à jour contre un serveur local simulant le portail:
+    mise à jour confirmée (réponse ou relecture), requête ignorée, échec signalé avec un 200,
+    session expirée, et cookies d'un autre domaine non envoyés.
+    """
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {"address": "1 Rue Ancienne, 69001 Lyon, France", "mode": "echo", "cookies": []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, payload: Any = None):
+            body = json.dumps(payload).encode('utf-8') if payload is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._reply(200, {"serviceAddress": {"formattedAddress": state["address"]}})
+
+        def do_PUT(self):
+            state["cookies"].append(self.headers.get("Cookie", ""))
+            address = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))["address"]
+            mode = state["mode"]
+            if mode == "expired":
+                return self._reply(401, {"error": "unauthorized"})
+            if mode == "reject":
+                return self._reply(200, {"success": False, "errors": ["invalid address"]})
+            if mode == "ignore":
+                return self._reply(200)
+            state["address"] = address
+            self._reply(200, {"address": address} if mode == "echo" else None)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    cookies = [
+        {"name": "session", "value": "abc", "domain": "127.0.0.1", "secure": False},
+        {"name": "other", "value": "leak", "domain": ".example.com", "secure": False},
+    ]
+    address = "12 Rue de la Paix, 75002 Paris, France"
+    expected = [("echo", True), ("silent", True), ("ignore", False), ("reject", False), ("expired", None)]
+    ok = True
+    try:
+        for mode, want in expected:
+            state["mode"] = mode
+            if mode == "ignore":
+                state["address"] = "1 Rue Ancienne, 69001 Lyon, France"
+            result = StarlinkApiClient("check@example.com", cookies, base_url=base_url).update_service_address(address)
+            passed = result is want
+            ok &= passed
+            print(f"{'OK ' if passed else 'ÉCHEC'} {mode}: {result!r} (attendu {want!r})")
+        leaked = any("leak" in header for header in state["cookies"])
+        ok &= not leaked
+        print(f"{'OK ' if not leaked else 'ÉCHEC'} cookies d'un autre domaine non envoyés")
+    finally:
+        server.shutdown()
+    return ok
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Client HTTP du portail Starlink")
+    parser.add_argument('--self-check', action='store_true',
+                        help='Rejouer des mises à jour contre un serveur local simulant le portail')
+    args = parser.parse_args()
+    if args.self_check:
+        logging.basicConfig(level=logging.WARNING)
+        sys.exit(0 if self_check() else 1)
+    parser.print_help()
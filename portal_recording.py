@@ -0,0 +1,364 @@
+"""
+Enregistrement et rejeu des sessions du portail Starlink.
+En enregistrement, chaque session navigateur produit un HAR (trafic réseau complet) et une trace
+Playwright (ouvrable avec `playwright show-trace`). En rejeu, les réponses du HAR sont servies par
+page.route() sans aucun accès réseau: le parcours du portail peut être testé et chronométré
+de façon déterministe, hors ligne.
+"""
+import os
+import sys
+import json
+import glob
+import base64
+import logging
+import zipfile
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger("GeoAgile.PortalRecording")
+
+RECORDINGS_DIR = "recordings"
+HAR_FILE = "session.har"
+TRACE_FILE = "trace.zip"
+LOGIN_TRACE_FILE = "trace-login.zip"   # trace jusqu'à la saisie des identifiants (exclue)
+
+# Une session enregistrée contient des données de session: droits réservés au propriétaire,
+# comme .key, accounts.json et sessions/
+RECORDING_DIR_MODE = 0o700
+RECORDING_FILE_MODE = 0o600
+REDACTED = "[REDACTED]"
+# En-têtes et champs de formulaire retirés du HAR avant écriture définitive
+SENSITIVE_HEADERS = {"cookie", "set-cookie", "authorization", "x-xsrf-token", "x-csrf-token"}
+SENSITIVE_FIELD_MARKERS = ("password", "passwd", "pwd", "secret", "token")
+
+# En-têtes à ne pas rejouer (recalculés par le navigateur ou incohérents avec un corps décodé)
+SKIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+def _safe_email(email: str) -> str:
+    return email.replace('@', '_at_').replace('.', '_')
+
+
+def new_recording_dir(email: str, base_dir: str = RECORDINGS_DIR) -> str:
+    """Crée le répertoire d'une nouvelle session enregistrée: recordings/<compte>/<horodatage>/."""
+    account_dir = os.path.join(base_dir, _safe_email(email))
+    path = os.path.join(account_dir, datetime.now().strftime("%Y%m%d-%H%M%S-%f"))
+    os.makedirs(path, mode=RECORDING_DIR_MODE, exist_ok=True)
+    # makedirs applique l'umask et ne modifie pas les répertoires existants
+    for directory in (base_dir, account_dir, path):
+        os.chmod(directory, RECORDING_DIR_MODE)
+    return path
+
+
+def _is_sensitive_field(name: str) -> bool:
+    lowered = name.lower()
+    return any(marker in lowered for marker in SENSITIVE_FIELD_MARKERS)
+
+
+def _redact_json(value):
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if _is_sensitive_field(key) and not isinstance(value[key], (dict, list)) else _redact_json(value[key])
+            for key in value
+        }
+    if isinstance(value, list):
+        return [_redact_json(item) for item in value]
+    return value
+
+
+def _redact_post_data(post_data: Dict):
+    """Masque les champs sensibles d'un corps de requête (formulaire ou JSON)."""
+    for param in post_data.get("params", []):
+        if _is_sensitive_field(param.get("name", "")):
+            param["value"] = REDACTED
+    text = post_data.get("text")
+    if not text:
+        return
+    mime_type = post_data.get("mimeType", "").lower()
+    if "json" in mime_type:
+        try:
+            post_data["text"] = json.dumps(_redact_json(json.loads(text)))
+        except ValueError:
+            pass
+    elif "x-www-form-urlencoded" in mime_type:
+        fields = parse_qsl(text, keep_blank_values=True)
+        post_data["text"] = urlencode([
+            (name, REDACTED if _is_sensitive_field(name) else value) for name, value in fields
+        ])
+
+
+def _secret_variants(secrets: Iterable[str]) -> List[str]:
+    """Formes d'un secret telles qu'il peut apparaître dans un fichier (brut, JSON, URL)."""
+    variants = set()
+    for secret in secrets:
+        if secret:
+            variants.update({secret, json.dumps(secret)[1:-1], urlencode({"": secret})[1:]})
+    return sorted(variants, key=len, reverse=True)
+
+
+def sanitize_har(har_path: str, secrets: Iterable[str] = ()):
+    """
+    Retire d'un HAR les cookies, les en-têtes d'authentification et les champs de mot de passe,
+    puis remplace toute occurrence restante des secrets fournis (le mot de passe du compte).
+    """
+    with open(har_path, 'r', encoding='utf-8') as f:
+        har = json.load(f)
+    for entry in har.get("log", {}).get("entries", []):
+        for message in (entry.get("request", {}), entry.get("response", {})):
+            message["headers"] = [
+                header for header in message.get("headers", [])
+                if header.get("name", "").lower() not in SENSITIVE_HEADERS
+            ]
+            message["cookies"] = []
+        if "postData" in entry.get("request", {}):
+            _redact_post_data(entry["request"]["postData"])
+    text = json.dumps(har, ensure_ascii=False)
+    for variant in _secret_variants(secrets):
+        text = text.replace(variant, REDACTED)
+    tmp_file = f"{har_path}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.chmod(tmp_file, RECORDING_FILE_MODE)
+    os.replace(tmp_file, har_path)
+
+
+def find_secrets(recording_dir: str, secrets: Iterable[str]) -> List[str]:
+    """Fichiers (ou membres d'archive de trace) d'une session qui contiennent encore un secret."""
+    variants = [variant.encode('utf-8') for variant in _secret_variants(secrets)]
+    if not variants:
+        return []
+    leaks = []
+    for name in sorted(os.listdir(recording_dir)):
+        path = os.path.join(recording_dir, name)
+        if not os.path.isfile(path):
+            continue
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for member in archive.namelist():
+                    data = archive.read(member)
+                    if any(variant in data for variant in variants):
+                        leaks.append(f"{name}:{member}")
+        else:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if any(variant in data for variant in variants):
+                leaks.append(name)
+    return leaks
+
+
+def secure_recording(recording_dir: str, secrets: Iterable[str] = ()) -> bool:
+    """
+    Finalise une session enregistrée: HAR nettoyé, droits restreints, puis vérification qu'aucun
+    secret ne subsiste. Un fichier qui contient encore un secret est supprimé.
+    Retourne False si un fichier a dû être supprimé.
+    """
+    secrets = list(secrets)
+    har_path = os.path.join(recording_dir, HAR_FILE)
+    try:
+        if os.path.exists(har_path):
+            sanitize_har(har_path, secrets)
+    except Exception as e:
+        logger.error(f"Nettoyage du HAR impossible ({e}): enregistrement supprimé")
+        os.remove(har_path)
+    for name in os.listdir(recording_dir):
+        path = os.path.join(recording_dir, name)
+        if os.path.isfile(path):
+            os.chmod(path, RECORDING_FILE_MODE)
+    leaks = find_secrets(recording_dir, secrets)
+    for leak in {leak.split(":", 1)[0] for leak in leaks}:
+        logger.error(f"Secret présent dans {leak}: fichier supprimé de l'enregistrement")
+        os.remove(os.path.join(recording_dir, leak))
+    return not leaks
+
+
+def latest_recording(email: str, base_dir: str = RECORDINGS_DIR) -> Optional[str]:
+    """Dernière session enregistrée d'un compte (contenant un HAR), None sinon."""
+    sessions = sorted(glob.glob(os.path.join(base_dir, _safe_email(email), "*", HAR_FILE)))
+    return os.path.dirname(sessions[-1]) if sessions else None
+
+
+def _without_query(url: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+
+
+class HarReplayer:
+    """
+    Sert les réponses d'un HAR enregistré via page.route().
+    Les requêtes sont appariées par méthode et URL (puis sans la query string); les réponses
+    d'une même requête sont rejouées dans l'ordre d'enregistrement. Toute requête inconnue est
+    abandonnée: le rejeu n'accède jamais au réseau.
+    """
+
+    def __init__(self, har_path: str):
+        with open(har_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)["log"]["entries"]
+        self.exact: Dict[Tuple[str, str], List[Dict]] = {}
+        self.loose: Dict[Tuple[str, str], List[Dict]] = {}
+        for entry in entries:
+            request = entry["request"]
+            method = request["method"].upper()
+            self.exact.setdefault((method, request["url"]), []).append(entry["response"])
+            self.loose.setdefault((method, _without_query(request["url"])), []).append(entry["response"])
+        self.served = 0
+        self.missed: List[str] = []
+
+    @classmethod
+    def from_recording(cls, recording_dir: str) -> "HarReplayer":
+        return cls(os.path.join(recording_dir, HAR_FILE))
+
+    @staticmethod
+    def _next(responses: List[Dict]) -> Dict:
+        # La dernière réponse reste servie pour les appels supplémentaires (polling)
+        return responses.pop(0) if len(responses) > 1 else responses[0]
+
+    def _lookup(self, method: str, url: str) -> Optional[Dict]:
+        responses = self.exact.get((method, url)) or self.loose.get((method, _without_query(url)))
+        return self._next(responses) if responses else None
+
+    def handle(self, route):
+        """Handler page.route(): répond depuis le HAR ou abandonne la requête."""
+        request = route.request
+        response = self._lookup(request.method.upper(), request.url)
+        if response is None or response.get("status", 0) <= 0:
+            self.missed.append(f"{request.method} {request.url}")
+            route.abort()
+            return
+
+        content = response.get("content", {})
+        text = content.get("text", "")
+        body = base64.b64decode(text) if content.get("encoding") == "base64" else text.encode('utf-8')
+        headers = {
+            header["name"]: header["value"] for header in response.get("headers", [])
+            if header["name"].lower() not in SKIPPED_HEADERS
+        }
+        self.served += 1
+        route.fulfill(status=response["status"], headers=headers, body=body)
+
+
+def self_check() -> bool:
+    """
+    Vérification automatique sans navigateur: une session enregistrée synthétique (connexion par
+    formulaire et JSON, cookies, trace contenant la saisie du mot de passe) est finalisée par
+    secure_recording, puis rejouée par HarReplayer. Aucun mot de passe ne doit subsister et le
+    rejeu doit servir toutes les réponses.
+    """
+    import stat
+    import tempfile
+
+    class _Request:
+        def __init__(self, method, url):
+            self.method, self.url = method, url
+
+    class _Route:
+        def __init__(self, method, url):
+            self.request = _Request(method, url)
+            self.fulfilled = None
+
+        def fulfill(self, status, headers, body):
+            self.fulfilled = (status, headers, body)
+
+        def abort(self):
+            self.fulfilled = None
+
+    password = "S3cr&t p@ss\\\""
+    login_form = urlencode({"email": "user@example.com", "password": password})
+    har = {"log": {"entries": [
+        {
+            "request": {
+                "method": "POST", "url": "https://www.starlink.com/api/auth/login",
+                "headers": [{"name": "Cookie", "value": "session=abc"}, {"name": "Accept", "value": "*/*"}],
+                "cookies": [{"name": "session", "value": "abc"}],
+                "postData": {"mimeType": "application/x-www-form-urlencoded", "text": login_form,
+                             "params": [{"name": "password", "value": password}]},
+            },
+            "response": {
+                "status": 200, "headers": [{"name": "Set-Cookie", "value": "session=def"}],
+                "cookies": [{"name": "session", "value": "def"}],
+                "content": {"text": '{"ok": true}', "mimeType": "application/json"},
+            },
+        },
+        {
+            "request": {
+                "method": "POST", "url": "https://api.starlink.com/auth/token", "headers": [],
+                "postData": {"mimeType": "application/json",
+                             "text": json.dumps({"credentials": {"username": "u", "password": password}})},
+            },
+            "response": {"status": 200, "headers": [], "content": {"text": "{}"}},
+        },
+    ]}}
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        recording_dir = new_recording_dir("user@example.com", base_dir)
+        with open(os.path.join(recording_dir, HAR_FILE), 'w', encoding='utf-8') as f:
+            json.dump(har, f)
+        with zipfile.ZipFile(os.path.join(recording_dir, TRACE_FILE), 'w') as archive:
+            archive.writestr("trace.trace", json.dumps({"method": "fill", "params": {"value": password}}))
+
+        checks = {}
+        # La trace synthétique contient la saisie du mot de passe: elle doit être détectée et supprimée
+        checks["trace divulguant le mot de passe détectée"] = not secure_recording(recording_dir, [password])
+        checks["trace divulguant le mot de passe supprimée"] = not os.path.exists(os.path.join(recording_dir, TRACE_FILE))
+        checks["aucun mot de passe dans les fichiers"] = not find_secrets(recording_dir, [password])
+        with open(os.path.join(recording_dir, HAR_FILE), 'r', encoding='utf-8') as f:
+            sanitized = f.read()
+        checks["mot de passe absent du HAR"] = password not in sanitized and "S3cr" not in sanitized
+        checks["cookies absents du HAR"] = "session=" not in sanitized
+        checks["droits 0700/0600"] = (
+            stat.S_IMODE(os.stat(recording_dir).st_mode) == RECORDING_DIR_MODE
+            and stat.S_IMODE(os.stat(os.path.join(recording_dir, HAR_FILE)).st_mode) == RECORDING_FILE_MODE
+        )
+
+        replayer = HarReplayer.from_recording(recording_dir)
+        routes = [_Route("POST", "https://www.starlink.com/api/auth/login"),
+                  _Route("POST", "https://api.starlink.com/auth/token?x=1")]
+        for route in routes:
+            replayer.handle(route)
+        checks["rejeu complet"] = all(route.fulfilled for route in routes) and not replayer.missed
+        checks["rejeu sans cookie"] = all(
+            "set-cookie" not in {name.lower() for name in route.fulfilled[1]} for route in routes if route.fulfilled
+        )
+
+    for name, passed in checks.items():
+        print(f"{'OK ' if passed else 'ÉCHEC'} {name}")
+    return all(checks.values())
+
+
+# Rejeu manuel d'une session enregistrée (test de régression du parcours portail, sans réseau)
+# python portal_recording.py --self-check: vérification automatique du nettoyage et du rejeu
+if __name__ == "__main__":
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rejeu hors ligne d'une session du portail")
+    parser.add_argument("email", nargs="?", help="Compte dont la session a été enregistrée")
+    parser.add_argument("address", nargs="?", help="Adresse à soumettre (celle de l'enregistrement)")
+    parser.add_argument("--recording", default=None, help="Répertoire de la session (défaut: la plus récente)")
+    parser.add_argument("--password", default="replay", help="Mot de passe saisi pendant le rejeu")
+    parser.add_argument("--self-check", action="store_true",
+                        help="Vérifie le nettoyage des secrets et le rejeu sur une session synthétique")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.self_check:
+        sys.exit(0 if self_check() else 1)
+    if not args.email or not args.address:
+        parser.error("email et address sont requis pour un rejeu")
+    recording = args.recording or latest_recording(args.email)
+    if not recording:
+        print(f"Aucune session enregistrée pour {args.email}")
+        sys.exit(1)
+
+    from updater import StarlinkPortalClient
+
+    started = time.perf_counter()
+    with StarlinkPortalClient(args.email, args.password, replay_from=recording) as client:
+        success = client.update_service_address(args.address)
+    elapsed = time.perf_counter() - started
+    replayer = client.replayer
+    print(f"Rejeu de {recording}: {'succès' if success else 'échec'} en {elapsed:.1f}s, "
+          f"{replayer.served} réponse(s) servie(s), {len(replayer.missed)} requête(s) inconnue(s)")
+    for missed in replayer.missed[:20]:
+        print(f"  - {missed}")
+    sys.exit(0 if success else 1)
@@ -0,0 +1,364 @@
+"""
+Table binaire des positions GPS de la flotte.
+Chaque relevé GPS est un enregistrement de largeur fixe (compte, drapeaux, horodatage, latitude,
+longitude, identifiant d'adresse) ajouté en fin de fichier. Le fichier est lu par np.memmap sans copie:
+le planificateur et les analyses obtiennent les positions de toute la flotte en quelques millisecondes,
+sans ouvrir un fichier JSON par compte.
+"""
+import os
+import json
+import time
+import struct
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("GeoAgile.PositionTable")
+
+POSITIONS_FILE = "positions.bin"
+ACCOUNTS_SUFFIX = ".accounts.db"          # emails de la table (SQLite), identifiants 0, 1, 2...
+LEGACY_ACCOUNTS_SUFFIX = ".accounts.json"  # ancienne liste JSON, l'identifiant était l'indice
+MAGIC = b"GEOPOS\x00\x01"
+HEADER = struct.Struct("<8sII")            # magic, taille d'un enregistrement, réservé
+EARTH_RADIUS_KM = 6371.0
+
+# Enregistrement de 40 octets, champs alignés sur 8 octets
+RECORD_DTYPE = np.dtype([
+    ("account_id", "<u4"),
+    ("flags", "<u4"),
+    ("timestamp", "<f8"),
+    ("latitude", "<f8"),
+    ("longitude", "<f8"),
+    ("address_id", "<i4"),
+    ("reserved", "<u4"),
+])
+FLAG_TRIGGERED = 1      # le déplacement a déclenché une mise à jour
+FLAG_UPDATED = 2        # l'adresse a été appliquée (équivalent de state["last_pos"])
+NO_ADDRESS = -1
+
+# Compaction: relevés gardés par compte, et taille de table (en multiple de keep x comptes)
+# au-delà de laquelle main_multi compacte la table
+COMPACT_KEEP = 100
+COMPACT_SLACK = 2.0
+
+
+def haversine_km_np(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Distance orthodromique (km), vectorisée sur des tableaux NumPy (diffusion acceptée)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class PositionTable:
+    """
+    Journal des relevés GPS de la flotte, en ajout seul.
+    Les lectures (records, latest, planner_features) sont vectorisées sur la projection mémoire.
+    """
+
+    def __init__(self, path: str = POSITIONS_FILE):
+        self.path = path
+        self.accounts_file = path + ACCOUNTS_SUFFIX
+        self.accounts: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._init_accounts()
+        self._check_header()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.accounts_file, timeout=30, isolation_level=None)
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[sqlite3.Connection]:
+        """
+        Verrou inter-processus (transaction d'écriture SQLite sur la table des comptes):
+        attribution des identifiants, ajouts et compaction ne se chevauchent jamais,
+        même entre shards qui partagent le répertoire de travail.
+        """
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            finally:
+                conn.close()
+
+    def _init_accounts(self):
+        """Crée la table des comptes; reprend l'ancienne liste JSON (mêmes identifiants)."""
+        with self._exclusive() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS accounts (id INTEGER PRIMARY KEY, email TEXT UNIQUE NOT NULL)")
+            legacy_file = self.path + LEGACY_ACCOUNTS_SUFFIX
+            if os.path.exists(legacy_file) and conn.execute("SELECT COUNT(*) FROM accounts").fetchone()[0] == 0:
+                try:
+                    with open(legacy_file, 'r', encoding='utf-8') as f:
+                        legacy = json.load(f)
+                    conn.executemany("INSERT OR IGNORE INTO accounts (id, email) VALUES (?, ?)", enumerate(legacy))
+                    logger.info(f"{len(legacy)} compte(s) repris de {legacy_file}")
+                except Exception as e:
+                    logger.warning(f"Ancienne liste des comptes de la table de positions illisible: {e}")
+        self._load_accounts()
+
+    def _load_accounts(self, conn: Optional[sqlite3.Connection] = None):
+        rows = (conn or self._connect()).execute("SELECT id, email FROM accounts ORDER BY id").fetchall()
+        accounts: List[Optional[str]] = [None] * (rows[-1][0] + 1 if rows else 0)
+        for account_id, email in rows:
+            accounts[account_id] = email
+        self.accounts = accounts
+        self._ids = {email: account_id for account_id, email in rows}
+
+    def _refresh_accounts(self, account_ids: np.ndarray):
+        """Recharge les emails si un autre processus a ajouté des comptes présents dans les relevés."""
+        if account_ids.size and int(account_ids.max()) >= len(self.accounts):
+            self._load_accounts()
+
+    def register_accounts(self, emails: List[str]) -> List[int]:
+        """Identifiants de plusieurs comptes, attribués si besoin en une seule transaction."""
+        with self._exclusive() as conn:
+            for email in emails:
+                if email not in self._ids:
+                    self._insert_account(conn, email)
+            self._load_accounts(conn)
+        return [self._ids[email] for email in emails]
+
+    @staticmethod
+    def _insert_account(conn: sqlite3.Connection, email: str):
+        # Identifiants denses (indices des tableaux NumPy), attribués atomiquement sous le verrou d'écriture
+        conn.execute(
+            "INSERT OR IGNORE INTO accounts (id, email) SELECT COALESCE(MAX(id) + 1, 0), ? FROM accounts",
+            (email,)
+        )
+
+    def _check_header(self):
+        """Crée l'en-tête si besoin; met de côté un fichier d'un autre format."""
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= HEADER.size:
+            with open(self.path, 'rb') as f:
+                magic, record_size, _ = HEADER.unpack(f.read(HEADER.size))
+            if magic == MAGIC and record_size == RECORD_DTYPE.itemsize:
+                return
+            logger.warning(f"Table de positions {self.path} d'un format inconnu - renommée en .bad")
+            os.replace(self.path, self.path + ".bad")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, RECORD_DTYPE.itemsize, 0))
+
+    def __len__(self) -> int:
+        try:
+            return max(os.path.getsize(self.path) - HEADER.size, 0) // RECORD_DTYPE.itemsize
+        except OSError:
+            return 0
+
+    def account_id(self, email: str, create: bool = True) -> Optional[int]:
+        """Identifiant numérique d'un compte (attribué au premier relevé)."""
+        account_id = self._ids.get(email)
+        if account_id is not None or not create:
+            return account_id
+        return self.register_accounts([email])[0]
+
+    def append(self, email: str, latitude: float, longitude: float, timestamp: Optional[float] = None,
+               flags: int = 0, address_id: int = NO_ADDRESS):
+        """Ajoute un relevé (une seule écriture en mode ajout: sûre entre threads et processus)."""
+        record = np.zeros(1, dtype=RECORD_DTYPE)
+        record["account_id"] = self.account_id(email)
+        record["flags"] = flags
+        record["timestamp"] = timestamp if timestamp is not None else time.time()
+        record["latitude"] = latitude
+        record["longitude"] = longitude
+        record["address_id"] = address_id
+        # Sous le verrou: une compaction d'un autre processus ne peut pas perdre ce relevé
+        with self._exclusive():
+            with open(self.path, 'ab') as f:
+                f.write(record.tobytes())
+
+    def records(self) -> np.ndarray:
+        """Tous les relevés, projetés en mémoire en lecture seule (sans copie)."""
+        count = len(self)
+        if count == 0:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        # Un enregistrement partiel (écriture interrompue) en fin de fichier est ignoré
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+
+    def latest(self, updated_only: bool = False) -> np.ndarray:
+        """Dernier relevé de chaque compte (ou dernière position appliquée), trié par compte."""
+        records = self.records()
+        if updated_only:
+            records = records[(records["flags"] & FLAG_UPDATED) != 0]
+        if records.size == 0:
+            return records
+        # np.unique garde la première occurrence: on parcourt les relevés à l'envers
+        _, first_from_end = np.unique(records["account_id"][::-1], return_index=True)
+        return records[records.size - 1 - first_from_end]
+
+    def last_position(self, email: str, updated_only: bool = False) -> Optional[Tuple[float, float]]:
+        account_id = self.account_id(email, create=False)
+        if account_id is None:
+            return None
+        latest = self.latest(updated_only)
+        match = latest[latest["account_id"] == account_id]
+        return (float(match["latitude"][0]), float(match["longitude"][0])) if match.size else None
+
+    def distances_km(self, latitude: float, longitude: float) -> Dict[str, float]:
+        """Distance de la dernière position de chaque compte à un point."""
+        latest = self.latest()
+        self._refresh_accounts(latest["account_id"])
+        distances = haversine_km_np(latest["latitude"], latest["longitude"], latitude, longitude)
+        return {self.accounts[i]: float(d) for i, d in zip(latest["account_id"], distances)}
+
+    def planner_features(self, samples: int = 5) -> Dict[str, Dict[str, float]]:
+        """
+        Données du planificateur par compte, calculées en une passe vectorisée:
+        velocity_kmh (sur les `samples` derniers relevés), idle_runs (relevés consécutifs
+        sans mise à jour déclenchée) et last_ts.
+        """
+        records = self.records()
+        if records.size == 0:
+            return {}
+        account = records["account_id"]
+        self._refresh_accounts(account)
+        order = np.argsort(account, kind="stable")       # groupes par compte, ordre d'ajout conservé
+        account = account[order]
+        ts = records["timestamp"][order]
+        lat = records["latitude"][order]
+        lon = records["longitude"][order]
+        triggered = (records["flags"][order] & FLAG_TRIGGERED) != 0
+
+        ids, starts, counts = np.unique(account, return_index=True, return_counts=True)
+        group_end = np.repeat(starts + counts, counts)
+        rank_from_end = group_end - 1 - np.arange(account.size)
+        recent = rank_from_end < samples
+
+        # Vitesse: distance cumulée entre relevés récents consécutifs d'un même compte
+        pair = recent[1:] & recent[:-1] & (account[1:] == account[:-1])
+        steps = haversine_km_np(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        slot = np.searchsorted(ids, account[1:])
+        distance = np.bincount(slot[pair], weights=steps[pair], minlength=ids.size).astype(np.float64)
+        first_recent = np.maximum(starts, starts + counts - samples)
+        hours = (ts[starts + counts - 1] - ts[first_recent]) / 3600.0
+        velocity = np.divide(distance, hours, out=np.zeros_like(distance), where=hours > 0)
+
+        # Relevés depuis la dernière mise à jour déclenchée
+        last_trigger = np.full(ids.size, -1, dtype=np.int64)
+        positions = np.arange(account.size)
+        np.maximum.at(last_trigger, np.searchsorted(ids, account[triggered]), positions[triggered])
+        idle_runs = np.where(last_trigger >= 0, starts + counts - 1 - last_trigger, counts)
+
+        return {
+            self.accounts[account_id]: {
+                "velocity_kmh": float(velocity[i]),
+                "idle_runs": int(idle_runs[i]),
+                "last_ts": float(ts[starts[i] + counts[i] - 1]),
+            }
+            for i, account_id in enumerate(ids)
+            if account_id < len(self.accounts) and self.accounts[account_id] is not None
+        }
+
+    def compact(self, keep: int = COMPACT_KEEP):
+        """Réécrit la table en ne gardant que les `keep` derniers relevés de chaque compte."""
+        with self._exclusive():
+            records = np.array(self.records())
+            if records.size == 0:
+                return
+            account = records["account_id"]
+            order = np.argsort(account, kind="stable")
+            ids, starts, counts = np.unique(account[order], return_index=True, return_counts=True)
+            rank_from_end = np.repeat(starts + counts, counts) - 1 - np.arange(account.size)
+            keep_mask = np.zeros(account.size, dtype=bool)
+            keep_mask[order[rank_from_end < keep]] = True
+            tmp_file = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, RECORD_DTYPE.itemsize, 0))
+                f.write(records[keep_mask].tobytes())
+            os.replace(tmp_file, self.path)
+            logger.info(f"Table de positions compactée: {records.size} -> {int(keep_mask.sum())} relevés")
+
+    def maybe_compact(self, keep: int = COMPACT_KEEP, slack: float = COMPACT_SLACK) -> bool:
+        """
+        Compacte la table si elle dépasse slack x keep relevés par compte connu: sa taille reste
+        proportionnelle à la flotte, et planner_features ne relit pas tout l'historique.
+        """
+        limit = slack * keep * max(len(self._ids), 1)
+        if len(self) <= limit:
+            return False
+        self.compact(keep)
+        return True
+
+    def import_states(self, state_dir: str, emails: List[str]):
+        """
+        Remplit une table vide depuis l'historique des fichiers d'état JSON (migration).
+        """
+        for email in emails:
+            safe_email = email.replace('@', '_at_').replace('.', '_')
+            state_file = os.path.join(state_dir, f"{safe_email}.json")
+            if not os.path.exists(state_file):
+                continue
+            try:
+                with open(state_file, 'r', encoding='utf-8') as f:
+                    history = json.load(f).get("execution_history", [])
+            except Exception as e:
+                logger.warning(f"État illisible pour {email}: {e}")
+                continue
+            for entry in history:
+                coords = entry.get("gps_coordinates") or {}
+                if "latitude" not in coords or "longitude" not in coords:
+                    continue
+                try:
+                    ts = time.mktime(time.strptime(entry["timestamp"][:19], "%Y-%m-%dT%H:%M:%S"))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                triggered = bool(entry.get("update_triggered"))
+                flags = (FLAG_TRIGGERED if triggered else 0)
+                if triggered and entry.get("update_successful"):
+                    flags |= FLAG_UPDATED
+                self.append(email, coords["latitude"], coords["longitude"], ts, flags)
+
+
+# Vérification manuelle: python position_table.py [nb_comptes] [relevés_par_compte]
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    logging.basicConfig(level=logging.INFO)
+    n_accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    per_account = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    with tempfile.TemporaryDirectory() as tmp:
+        table = PositionTable(os.path.join(tmp, POSITIONS_FILE))
+        rng = np.random.default_rng(0)
+        table.register_accounts([f"user{i}@example.com" for i in range(n_accounts)])
+        records = np.zeros(n_accounts * per_account, dtype=RECORD_DTYPE)
+        records["account_id"] = np.tile(np.arange(n_accounts), per_account)
+        records["timestamp"] = 1.7e9 + np.repeat(np.arange(per_account), n_accounts) * 3600.0
+        records["latitude"] = 48.0 + rng.normal(0, 0.05, records.size)
+        records["longitude"] = 2.0 + rng.normal(0, 0.05, records.size)
+        records["flags"] = rng.integers(0, 4, records.size)
+        records["address_id"] = NO_ADDRESS
+        with open(table.path, 'ab') as f:
+            f.write(records.tobytes())
+
+        started = time.perf_counter()
+        reopened = PositionTable(table.path)
+        latest = reopened.latest()
+        elapsed_latest = time.perf_counter() - started
+        started = time.perf_counter()
+        features = reopened.planner_features()
+        elapsed_features = time.perf_counter() - started
+        print(f"{len(reopened)} relevés, {latest.size} comptes: dernières positions en {elapsed_latest * 1000:.1f} ms, "
+              f"données du planificateur en {elapsed_features * 1000:.1f} ms")
+        assert latest.size == n_accounts
+        assert np.all(latest["timestamp"] == records["timestamp"].max())
+        sample = features["user0@example.com"]
+        print(f"Exemple: {sample}")
+
+        # Compaction: la table garde au plus `keep` relevés par compte
+        keep = max(per_account // 2, 1)
+        compacted = reopened.maybe_compact(keep=keep, slack=1.0)
+        assert compacted and len(reopened) == n_accounts * keep
+        assert np.array_equal(reopened.latest()["timestamp"], latest["timestamp"])
+        print(f"Compaction: {n_accounts * per_account} -> {len(reopened)} relevés")
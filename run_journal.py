@@ -0,0 +1,131 @@
+"""
+Journal d'exécution de main_multi pour la reprise après interruption.
+Chaque étape terminée d'un compte (position GPS, adresse résolue, mise à jour du portail)
+est ajoutée à un fichier JSON Lines; une exécution interrompue peut être reprise avec --resume
+sans refaire le travail déjà effectué ni soumettre deux fois la même adresse.
+"""
+import os
+import re
+import glob
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+from address_utils import address_key
+
+logger = logging.getLogger("GeoAgile.RunJournal")
+
+RUNS_DIR = "runs"
+KEEP_RUNS = 20
+
+# Étapes journalisées pour chaque compte
+STAGE_GPS = "gps"
+STAGE_ADDRESS = "address"
+STAGE_PORTAL = "portal"
+STAGE_DONE = "done"
+
+
+def node_runs_dir(node_id: Optional[str], runs_dir: str = RUNS_DIR) -> str:
+    """
+    Répertoire des journaux d'un nœud (runs/<node_id>/): plusieurs nœuds lancés dans le même
+    répertoire ne reprennent ni ne suppriment les journaux des autres. Sans nœud: runs/.
+    """
+    if not node_id:
+        return runs_dir
+    return os.path.join(runs_dir, re.sub(r"[^\w.-]", "_", node_id))
+
+
+def idempotency_key(email: str, address: str) -> str:
+    """Clé d'une soumission: même compte et même adresse normalisée -> même clé."""
+    key = address_key(address)
+    normalized = f"{key.postcode}|{' '.join(key.tokens)}"
+    return hashlib.sha1(f"{email.casefold()}|{normalized}".encode('utf-8')).hexdigest()
+
+
+class RunJournal:
+    """Journal append-only d'une exécution: une ligne par étape terminée."""
+
+    def __init__(self, path: str, progress: Optional[Dict[str, Dict]] = None):
+        self.path = path
+        self.run_id = os.path.splitext(os.path.basename(path))[0]
+        self.progress: Dict[str, Dict] = progress or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def start(cls, runs_dir: str = RUNS_DIR) -> "RunJournal":
+        """Démarre le journal d'une nouvelle exécution."""
+        os.makedirs(runs_dir, exist_ok=True)
+        run_id = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        journal = cls(os.path.join(runs_dir, f"{run_id}.jsonl"))
+        journal._append({"type": "run_start"})
+        cls._prune(runs_dir)
+        return journal
+
+    @classmethod
+    def resume(cls, runs_dir: str = RUNS_DIR) -> Optional["RunJournal"]:
+        """
+        Rouvre la dernière exécution interrompue (journal sans fin d'exécution).
+        Retourne None s'il n'y a rien à reprendre.
+        """
+        for path in sorted(glob.glob(os.path.join(runs_dir, "*.jsonl")), reverse=True):
+            progress = {}
+            finished = False
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # Dernière ligne tronquée par l'interruption
+                            continue
+                        if record.get("type") == "run_end":
+                            finished = True
+                        elif record.get("type") == "stage":
+                            progress.setdefault(record["account"], {})[record["stage"]] = record.get("data", {})
+            except Exception as e:
+                logger.warning(f"Journal d'exécution illisible {path}: {e}")
+                continue
+            # Seule la dernière exécution peut être reprise
+            if finished:
+                return None
+            return cls(path, progress)
+        return None
+
+    @staticmethod
+    def _prune(runs_dir: str, keep: int = KEEP_RUNS):
+        """Supprime les journaux les plus anciens (ce répertoire seulement, pas ceux des autres nœuds)."""
+        for path in sorted(glob.glob(os.path.join(runs_dir, "*.jsonl")))[:-keep]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Impossible de supprimer l'ancien journal {path}: {e}")
+
+    def _append(self, record: Dict):
+        record["time"] = time.time()
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def record(self, email: str, stage: str, **data):
+        """Enregistre la fin d'une étape pour un compte."""
+        self._append({"type": "stage", "account": email, "stage": stage, "data": data})
+        with self._lock:
+            self.progress.setdefault(email, {})[stage] = data
+
+    def stage(self, email: str, stage: str) -> Optional[Dict]:
+        """Données d'une étape déjà terminée pour ce compte, None sinon."""
+        return self.progress.get(email, {}).get(stage)
+
+    def is_done(self, email: str) -> bool:
+        return self.stage(email, STAGE_DONE) is not None
+
+    def finish(self):
+        """Marque l'exécution comme terminée (elle ne sera plus reprise)."""
+        self._append({"type": "run_end"})
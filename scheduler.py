@@ -0,0 +1,258 @@
+"""
+Ordonnancement des comptes par priorité.
+Les comptes dont le Dish se déplace, qui n'ont pas été traités depuis longtemps ou dont
+la dernière exécution a échoué passent en premier; les comptes immobiles peuvent être
+mis en attente jusqu'à l'expiration d'un délai de back-off.
+"""
+import os
+import json
+import math
+import time
+import bisect
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from file_lock import file_lock, write_json_atomic
+
+logger = logging.getLogger("GeoAgile.Scheduler")
+
+# Pondérations du score de priorité
+VELOCITY_WEIGHT = 1.0          # par km/h de déplacement récent
+VELOCITY_CAP_KMH = 200.0
+STALENESS_WEIGHT = 0.5         # par heure depuis la dernière exécution
+STALENESS_CAP_H = 168.0
+FAILURE_WEIGHT = 50.0          # dernière exécution en échec: à réessayer rapidement
+NEVER_RUN_SCORE = 1000.0       # jamais traité: position inconnue
+
+# Back-off des comptes immobiles
+STATIONARY_KMH = 1.0
+IDLE_BACKOFF_BASE_S = 3600.0
+IDLE_BACKOFF_MAX_S = 24 * 3600.0
+VELOCITY_SAMPLES = 5
+
+# Intervalles de sondage GPS adaptatifs
+POLLING_INDEX_FILE = "polling_index.json"
+POLL_INTERVAL_MIN_S = 15 * 60.0
+POLL_INTERVAL_MAX_S = 24 * 3600.0
+POLL_INTERVAL_STRETCH = 2.0
+MOVEMENT_KM = 1.0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distance orthodromique approchée (km) entre deux points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+def _timestamp(value) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def recent_velocity_kmh(history: List[Dict], samples: int = VELOCITY_SAMPLES) -> float:
+    """Vitesse moyenne (km/h) sur les dernières positions connues de l'historique."""
+    fixes = []
+    for entry in history[-samples:]:
+        coords = entry.get("gps_coordinates") or {}
+        ts = _timestamp(entry.get("timestamp"))
+        if ts is not None and "latitude" in coords and "longitude" in coords:
+            fixes.append((ts, coords["latitude"], coords["longitude"]))
+    if len(fixes) < 2:
+        return 0.0
+    distance = sum(
+        haversine_km(a[1], a[2], b[1], b[2]) for a, b in zip(fixes, fixes[1:])
+    )
+    hours = (fixes[-1][0] - fixes[0][0]) / 3600.0
+    return distance / hours if hours > 0 else 0.0
+
+
+def idle_backoff_s(history: List[Dict], idle_runs: Optional[int] = None) -> float:
+    """
+    Délai d'attente d'un compte immobile: double à chaque exécution sans mise à jour.
+    idle_runs: nombre d'exécutions sans mise à jour, s'il est déjà connu (table de positions).
+    """
+    if idle_runs is None:
+        idle_runs = 0
+        for entry in reversed(history):
+            if entry.get("update_triggered"):
+                break
+            idle_runs += 1
+    if idle_runs == 0:
+        return 0.0
+    return min(IDLE_BACKOFF_BASE_S * 2 ** (idle_runs - 1), IDLE_BACKOFF_MAX_S)
+
+
+def score_account(account_config: Dict, state: Dict, now: Optional[float] = None,
+                  features: Optional[Dict] = None) -> Dict:
+    """
+    Calcule la priorité d'un compte.
+    features: données déjà calculées par PositionTable.planner_features (l'état n'est alors pas lu).
+    Retourne un dict: score, velocity_kmh, staleness_h, failed, next_due.
+    """
+    now = now if now is not None else time.time()
+    history = state.get("execution_history", [])
+    stats = account_config.get("stats", {})
+
+    last_run = _timestamp(account_config.get("last_run"))
+    if last_run is None and history:
+        last_run = _timestamp(history[-1].get("timestamp"))
+    if last_run is None and features:
+        last_run = features["last_ts"]
+
+    failed = bool(stats.get("last_failure")) and (stats.get("last_failure") or "") > (stats.get("last_success") or "")
+    velocity = features["velocity_kmh"] if features else recent_velocity_kmh(history)
+
+    if last_run is None:
+        return {"score": NEVER_RUN_SCORE, "velocity_kmh": velocity, "staleness_h": None,
+                "failed": failed, "next_due": now}
+
+    staleness_h = max(now - last_run, 0.0) / 3600.0
+    score = (
+        VELOCITY_WEIGHT * min(velocity, VELOCITY_CAP_KMH)
+        + STALENESS_WEIGHT * min(staleness_h, STALENESS_CAP_H)
+        + (FAILURE_WEIGHT if failed else 0.0)
+    )
+
+    next_due = now
+    if velocity < STATIONARY_KMH and not failed:
+        next_due = last_run + idle_backoff_s(history, features["idle_runs"] if features else None)
+
+    return {"score": score, "velocity_kmh": velocity, "staleness_h": staleness_h,
+            "failed": failed, "next_due": next_due}
+
+
+def prioritize(accounts: Dict, load_state: Callable[[str], Dict], skip_idle: bool = False,
+               now: Optional[float] = None, positions=None) -> Tuple[Dict, List[str]]:
+    """
+    Trie les comptes par priorité décroissante.
+    Avec skip_idle, les comptes immobiles dont le back-off n'a pas expiré sont écartés.
+    positions: PositionTable optionnelle; les comptes qui y figurent ne lisent pas leur fichier d'état.
+    Retourne (comptes ordonnés, emails écartés).
+    """
+    now = now if now is not None else time.time()
+    features = positions.planner_features(VELOCITY_SAMPLES) if positions is not None else {}
+    scored = []
+    skipped = []
+    for email, account_config in accounts.items():
+        account_features = features.get(email)
+        state = {} if account_features else load_state(email)
+        priority = score_account(account_config, state, now, account_features)
+        if skip_idle and priority["next_due"] > now:
+            skipped.append(email)
+            continue
+        scored.append((priority["score"], email))
+        logger.debug(f"Priorité {email}: {priority}")
+
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return {email: accounts[email] for _, email in scored}, skipped
+
+
+class PollingIndex:
+    """
+    Index d'ordonnancement du sondage GPS: un intervalle adaptatif et une échéance par compte.
+    L'intervalle s'allonge tant que le Dish est immobile et revient au minimum dès qu'il bouge.
+    Les échéances sont triées pour sélectionner les comptes dus sans parcourir toute la flotte;
+    le tri est refait une seule fois après une série de record(), à la sélection suivante.
+    Le fichier est partagé par les nœuds d'un même hôte: save() n'y reporte que les comptes
+    sondés par ce processus.
+    """
+
+    def __init__(self, index_file: str = POLLING_INDEX_FILE):
+        self.index_file = index_file
+        self.entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._order_stale = True
+        # Comptes sondés depuis la dernière sauvegarde
+        self._changed = set()
+        self._load()
+
+    def _read(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.index_file):
+            return {}
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Index de sondage illisible, tous les comptes seront sondés: {e}")
+            return {}
+
+    def _load(self):
+        self.entries = self._read()
+
+    def _rebuild_order(self):
+        order = sorted((entry["next_due"], email) for email, entry in self.entries.items())
+        self._due_times = [due for due, _ in order]
+        self._due_emails = [email for _, email in order]
+        self._order_stale = False
+
+    def save(self):
+        """
+        Fusionne les comptes sondés par ce processus avec le fichier (sous verrou inter-processus),
+        le sondage le plus récent l'emportant, puis remplace le fichier atomiquement.
+        """
+        with self._lock:
+            if not self._changed:
+                return
+            try:
+                with file_lock(self.index_file):
+                    merged = self._read()
+                    for email in self._changed:
+                        entry = self.entries[email]
+                        current = merged.get(email)
+                        if current is None or entry["last_polled"] >= current.get("last_polled", 0):
+                            merged[email] = entry
+                    write_json_atomic(self.index_file, merged, indent=4)
+                self.entries = merged
+                self._changed.clear()
+                self._order_stale = True
+            except Exception as e:
+                logger.error(f"Erreur lors de la sauvegarde de l'index de sondage: {e}")
+
+    def due(self, emails: Iterable[str], now: Optional[float] = None) -> Tuple[List[str], List[str]]:
+        """
+        Sépare les comptes dus (jamais sondés ou échéance passée) des autres.
+        Retourne (emails dus, emails non dus).
+        """
+        now = now if now is not None else time.time()
+        emails = list(emails)
+        with self._lock:
+            if self._order_stale:
+                self._rebuild_order()
+        cutoff = bisect.bisect_right(self._due_times, now)
+        not_yet_due = set(self._due_emails[cutoff:])
+        due = [email for email in emails if email not in not_yet_due]
+        waiting = [email for email in emails if email in not_yet_due]
+        return due, waiting
+
+    def next_due(self, email: str) -> Optional[float]:
+        entry = self.entries.get(email)
+        return entry["next_due"] if entry else None
+
+    def record(self, email: str, moved_km: Optional[float], now: Optional[float] = None) -> float:
+        """
+        Enregistre un sondage réussi et calcule la prochaine échéance du compte.
+        moved_km: déplacement depuis le sondage précédent (None si inconnu).
+        Retourne le nouvel intervalle en secondes.
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            entry = self.entries.get(email, {})
+            interval = entry.get("interval_s", POLL_INTERVAL_MIN_S)
+            if moved_km is None or moved_km >= MOVEMENT_KM:
+                interval = POLL_INTERVAL_MIN_S
+            else:
+                interval = min(interval * POLL_INTERVAL_STRETCH, POLL_INTERVAL_MAX_S)
+            self.entries[email] = {
+                "interval_s": interval,
+                "last_polled": now,
+                "next_due": now + interval,
+            }
+            self._changed.add(email)
+            # Tri différé: un run enregistre toute la flotte, l'ordre n'est relu qu'au prochain due()
+            self._order_stale = True
+        return interval
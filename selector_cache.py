@@ -0,0 +1,118 @@
+"""
+Cache des sélecteurs du portail Starlink.
+Mémorise quel candidat a fonctionné pour chaque élément recherché afin de l'essayer en premier
+lors des exécutions suivantes. Le cache est invalidé automatiquement quand le portail change.
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger("GeoAgile.SelectorCache")
+
+
+class SelectorCache:
+    """Cache persistant groupe d'éléments -> sélecteur qui a fonctionné."""
+
+    CACHE_FILE = "selector_cache.json"
+
+    def __init__(self, cache_file: Optional[str] = None):
+        self.cache_file = cache_file or self.CACHE_FILE
+        self.fingerprint = None
+        self.selectors: Dict[str, str] = {}
+        # Modifications locales depuis la dernière sauvegarde (None: groupe oublié)
+        self._changes: Dict[str, Optional[str]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _read(self) -> Dict:
+        if not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Cache de sélecteurs illisible, il sera reconstruit: {e}")
+            return {}
+
+    def _load(self):
+        """Charge le cache depuis le disque (cache vide si absent ou illisible)."""
+        data = self._read()
+        self.fingerprint = data.get("fingerprint")
+        self.selectors = data.get("selectors", {})
+
+    def save(self):
+        """
+        Fusionne avec le fichier (écrit aussi par les autres workers) puis le remplace atomiquement.
+        Les modifications locales s'appliquent au fichier s'il décrit la même version du portail,
+        sinon la version vue par ce processus le remplace. Ne fait rien si le cache n'a pas été modifié.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            data = self._read()
+            if data.get("fingerprint") == self.fingerprint:
+                merged = dict(data.get("selectors", {}))
+                for group, candidate in self._changes.items():
+                    if candidate is None:
+                        merged.pop(group, None)
+                    else:
+                        merged[group] = candidate
+            else:
+                merged = dict(self.selectors)
+            tmp_file = f"{self.cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump({"fingerprint": self.fingerprint, "selectors": merged}, f, indent=4)
+                os.replace(tmp_file, self.cache_file)
+                self.selectors = merged
+                self._changes = {}
+                self._dirty = False
+            except Exception as e:
+                logger.warning(f"Impossible de sauvegarder le cache de sélecteurs: {e}")
+
+    @staticmethod
+    def compute_fingerprint(markers: Iterable[str]) -> str:
+        """Empreinte d'une version du portail (ex: URLs des bundles JavaScript)."""
+        digest = hashlib.sha1()
+        for marker in sorted(markers):
+            digest.update(marker.encode('utf-8'))
+        return digest.hexdigest()
+
+    def check_fingerprint(self, fingerprint: str):
+        """Vide le cache si le portail a changé depuis la dernière exécution."""
+        if fingerprint == self.fingerprint:
+            return
+        if self.fingerprint is not None and self.selectors:
+            logger.info("Version du portail modifiée - cache de sélecteurs invalidé")
+        with self._lock:
+            self.fingerprint = fingerprint
+            self.selectors = {}
+            self._changes = {}
+            self._dirty = True
+
+    def order(self, group: str, candidates: List[str]) -> List[str]:
+        """Retourne les candidats avec celui qui a fonctionné la dernière fois en premier."""
+        cached = self.selectors.get(group)
+        if cached in candidates:
+            return [cached] + [c for c in candidates if c != cached]
+        return list(candidates)
+
+    def remember(self, group: str, candidate: str):
+        """Enregistre le candidat qui a fonctionné pour ce groupe."""
+        with self._lock:
+            if self.selectors.get(group) != candidate:
+                self.selectors[group] = candidate
+                self._changes[group] = candidate
+                self._dirty = True
+
+    def forget(self, group: str):
+        """Oublie le candidat d'un groupe (aucun candidat n'a fonctionné)."""
+        with self._lock:
+            if group in self.selectors:
+                del self.selectors[group]
+                self._changes[group] = None
+                self._dirty = True
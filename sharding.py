@@ -0,0 +1,239 @@
+"""
+Répartition de la flotte de comptes entre plusieurs nœuds d'exécution.
+Les comptes sont affectés à des shards par hachage cohérent de l'email; chaque nœud
+prend un bail (lease) sur son shard dans une table SQLite partagée et reprend
+les shards des nœuds dont le bail a expiré.
+L'exclusivité des baux repose sur le verrouillage de fichiers de SQLite, fiable sur un disque
+local uniquement: la base ne doit pas être placée sur un partage réseau (NFS, SMB...).
+"""
+import os
+import time
+import socket
+import bisect
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("GeoAgile.Sharding")
+
+LEASES_DB = "leases.db"
+DEFAULT_LEASE_TTL = 2 * 3600.0
+VIRTUAL_NODES = 64
+# Systèmes de fichiers sur lesquels le verrouillage SQLite n'est pas fiable
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "9p", "afs", "glusterfs", "ceph"}
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+def shard_name(index: int) -> str:
+    return f"shard-{index}"
+
+
+def default_node_id(shard_index: int) -> str:
+    """Identifiant stable d'un nœud d'une exécution à l'autre (nécessaire pour renouveler son bail)."""
+    return f"{socket.gethostname()}-{shard_index}"
+
+
+class HashRing:
+    """Anneau de hachage cohérent: email -> shard, stable quand le nombre de shards change peu."""
+
+    def __init__(self, shards: List[str], virtual_nodes: int = VIRTUAL_NODES):
+        points = []
+        for shard in shards:
+            for replica in range(virtual_nodes):
+                points.append((_hash(f"{shard}#{replica}"), shard))
+        points.sort()
+        self._keys = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, key: str) -> str:
+        index = bisect.bisect(self._keys, _hash(key.casefold())) % len(self._keys)
+        return self._shards[index]
+
+
+def filesystem_type(path: str) -> Optional[str]:
+    """Type du système de fichiers contenant path (Linux, /proc/mounts), None si inconnu."""
+    try:
+        with open("/proc/mounts", "r") as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return None
+    directory = os.path.dirname(os.path.realpath(path)) or "."
+    best = None
+    for mount_point, fs_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        if directory == mount_point or directory.startswith(mount_point.rstrip("/") + "/"):
+            if best is None or len(mount_point) > len(best[0]):
+                best = (mount_point, fs_type)
+    return best[1] if best else None
+
+
+class LeaseTable:
+    """Table de baux SQLite: un propriétaire par shard jusqu'à expiration du bail."""
+
+    def __init__(self, db_path: str = LEASES_DB):
+        self.db_path = db_path
+        fs_type = filesystem_type(db_path)
+        if fs_type in NETWORK_FILESYSTEMS:
+            logger.warning(
+                f"Base des baux {db_path} sur un système de fichiers réseau ({fs_type}): le verrouillage "
+                f"SQLite n'y est pas fiable et deux nœuds peuvent détenir le même shard. "
+                f"Utilisez un disque local."
+            )
+        conn = self._connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "shard TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def acquire(self, shard: str, owner: str, ttl: float, takeover_only: bool = False) -> bool:
+        """
+        Prend (ou renouvelle) le bail d'un shard s'il est libre, expiré ou déjà détenu.
+        Avec takeover_only, seul un bail existant et expiré est repris.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT owner, expires_at FROM leases WHERE shard = ?", (shard,)).fetchone()
+            if row is None:
+                available = not takeover_only
+            else:
+                current_owner, expires_at = row
+                available = current_owner == owner or expires_at < now
+            if available:
+                conn.execute(
+                    "INSERT INTO leases (shard, owner, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(shard) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at",
+                    (shard, owner, now + ttl)
+                )
+                if row is not None and row[0] != owner:
+                    logger.warning(f"Reprise du shard {shard} (bail de {row[0]} expiré)")
+            conn.execute("COMMIT")
+            return available
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def renew(self, owner: str, ttl: float) -> int:
+        """Prolonge tous les baux détenus par ce propriétaire. Retourne le nombre de baux."""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE owner = ?", (time.time() + ttl, owner)
+            )
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def release(self, shard: str, owner: str):
+        """Rend un shard: son bail expire immédiatement et peut être repris."""
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE leases SET expires_at = 0 WHERE shard = ? AND owner = ?", (shard, owner))
+        finally:
+            conn.close()
+
+    def expired_shards(self) -> List[str]:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT shard FROM leases WHERE expires_at < ?", (time.time(),)).fetchall()
+            return [row[0] for row in rows]
+        finally:
+            conn.close()
+
+    def owners(self) -> Dict[str, tuple]:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT shard, owner, expires_at FROM leases").fetchall()
+            return {shard: (owner, expires_at) for shard, owner, expires_at in rows}
+        finally:
+            conn.close()
+
+
+class ShardCoordinator:
+    """
+    Coordonne l'exécution d'un nœud: prend le bail de son shard, reprend les shards
+    expirés des autres nœuds et maintient ses baux par un heartbeat en arrière-plan.
+    """
+
+    def __init__(self, shard_index: int, num_shards: int, node_id: Optional[str] = None,
+                 db_path: str = LEASES_DB, lease_ttl: float = DEFAULT_LEASE_TTL):
+        if not 0 <= shard_index < num_shards:
+            raise ValueError(f"Index de shard invalide: {shard_index} (shards: {num_shards})")
+        self.shard_index = shard_index
+        self.num_shards = num_shards
+        self.node_id = node_id or default_node_id(shard_index)
+        self.lease_ttl = lease_ttl
+        self.shards = [shard_name(i) for i in range(num_shards)]
+        self.ring = HashRing(self.shards)
+        self.leases = LeaseTable(db_path)
+        self.owned: List[str] = []
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def claim(self) -> List[str]:
+        """Prend le bail du shard de ce nœud et des shards abandonnés. Retourne les shards détenus."""
+        own_shard = shard_name(self.shard_index)
+        owned = []
+        if self.leases.acquire(own_shard, self.node_id, self.lease_ttl):
+            owned.append(own_shard)
+        else:
+            owner, _ = self.leases.owners().get(own_shard, ("?", 0))
+            logger.warning(f"Shard {own_shard} détenu par un autre nœud actif ({owner})")
+
+        for shard in self.leases.expired_shards():
+            if shard != own_shard and shard in self.shards and \
+                    self.leases.acquire(shard, self.node_id, self.lease_ttl, takeover_only=True):
+                owned.append(shard)
+
+        self.owned = owned
+        return owned
+
+    def filter_accounts(self, accounts: Dict) -> Dict:
+        """Ne garde que les comptes appartenant aux shards détenus par ce nœud."""
+        owned = set(self.owned)
+        return {email: config for email, config in accounts.items() if self.ring.shard_for(email) in owned}
+
+    def _heartbeat_loop(self):
+        interval = max(self.lease_ttl / 3, 1.0)
+        while not self._stop.wait(interval):
+            try:
+                self.leases.renew(self.node_id, self.lease_ttl)
+            except Exception as e:
+                logger.warning(f"Échec du renouvellement des baux: {e}")
+
+    def start_heartbeat(self):
+        """Renouvelle les baux en arrière-plan pendant l'exécution."""
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="lease-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+        """
+        Arrête le heartbeat en fin d'exécution. Le bail du shard du nœud est prolongé
+        (le nœud reste vivant jusqu'à sa prochaine exécution); les shards repris sont rendus
+        pour que leur nœud puisse les récupérer à son retour.
+        """
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+            self._heartbeat = None
+        own_shard = shard_name(self.shard_index)
+        for shard in self.owned:
+            if shard == own_shard:
+                self.leases.acquire(shard, self.node_id, self.lease_ttl)
+            else:
+                self.leases.release(shard, self.node_id)
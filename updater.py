@@ -1,79 +1,340 @@
 import logging
 import os
+import re
 import time
+from urllib.parse import urlparse
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+import artifacts
+from selector_cache import SelectorCache
+from address_cache import AcceptedAddressCache, ACCEPTED_ADDRESSES_FILE
+from address_utils import address_key, addresses_match
+from portal_recording import (HarReplayer, new_recording_dir, secure_recording,
+                               HAR_FILE, TRACE_FILE, LOGIN_TRACE_FILE)
+from portal_api import StarlinkApiClient, load_session_cookies, save_session_cookies, clear_session_cookies
 
 logger = logging.getLogger("GeoAgile.Updater")
 
+# Types de ressources inutiles pour remplir un formulaire d'adresse
+BLOCKED_RESOURCE_TYPES = ("image", "font", "media")
+
+# Domaines tiers (analytics, publicité, suivi) bloqués pendant l'automatisation.
+# Ne pas y ajouter les domaines Google utilisés par le captcha ou l'autocomplétion.
+BLOCKED_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "facebook.com",
+    "hotjar.com",
+    "segment.io",
+    "segment.com",
+    "mixpanel.com",
+    "sentry.io",
+    "newrelic.com",
+    "nr-data.net",
+    "optimizely.com",
+    "intercom.io",
+)
+
+# Profil de lancement minimal de Chromium
+LEAN_LAUNCH_ARGS = [
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-component-extensions-with-background-pages",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-dev-shm-usage",
+    "--disk-cache-size=1",
+    "--media-cache-size=1",
+    "--mute-audio",
+    "--no-first-run",
+]
+
+# Taille moyenne estimée (octets) d'une ressource bloquée, par type
+ESTIMATED_RESOURCE_BYTES = {
+    "image": 40_000,
+    "font": 35_000,
+    "media": 250_000,
+    "script": 60_000,
+}
+DEFAULT_ESTIMATED_BYTES = 10_000
+
+# Suggestions d'autocomplétion du champ d'adresse
+SUGGESTION_SELECTORS = "[role='option'], .pac-item, li[id*='option' i]"
+SUGGESTION_TIMEOUT_MS = 3000
+MAX_SUGGESTIONS = 10
+MIN_SUGGESTION_OVERLAP = 0.6
+
+# Indicateurs de problèmes de connexion vérifiés par _detect_login_issues
+LOGIN_PROBE_INDICATORS = {
+    "captcha_selectors": [
+        "iframe[src*='recaptcha']",
+        "iframe[src*='captcha']",
+        ".g-recaptcha",
+        "[data-callback*='captcha']"
+    ],
+    "two_factor_texts": ["two-factor", "2FA", "verification code", "authenticator"],
+    "two_factor_selectors": [
+        "input[type='tel']",
+        "input[name*='code']",
+        "input[name*='token']"
+    ],
+    "error_texts": [
+        "incorrect password",
+        "invalid credentials",
+        "wrong password",
+        "login failed",
+        "authentication failed"
+    ]
+}
+
+# Sonde exécutée dans la page: un seul parcours du DOM pour tous les indicateurs
+LOGIN_PROBE_SCRIPT = """
+(indicators) => {
+    const isVisible = (el) => {
+        if (!el) return false;
+        const style = window.getComputedStyle(el);
+        if (style.visibility === 'hidden' || style.display === 'none') return false;
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0;
+    };
+    const verdict = { captcha: false, two_factor: false, auth_error: null };
+
+    verdict.captcha = indicators.captcha_selectors.some((sel) => document.querySelector(sel) !== null);
+    if (verdict.captcha) return verdict;
+
+    verdict.two_factor = indicators.two_factor_selectors.some(
+        (sel) => Array.from(document.querySelectorAll(sel)).some(isVisible)
+    );
+
+    const twoFactorTexts = indicators.two_factor_texts.map((t) => t.toLowerCase());
+    const errorTexts = indicators.error_texts.map((t) => t.toLowerCase());
+    const walker = document.createTreeWalker(document.body || document, NodeFilter.SHOW_TEXT);
+    let node;
+    while ((node = walker.nextNode()) && !verdict.two_factor) {
+        const text = node.textContent.toLowerCase();
+        if (!text.trim() || !isVisible(node.parentElement)) continue;
+        if (twoFactorTexts.some((t) => text.includes(t))) {
+            verdict.two_factor = true;
+        } else if (!verdict.auth_error && errorTexts.some((t) => text.includes(t))) {
+            verdict.auth_error = node.parentElement.textContent.trim();
+        }
+    }
+    return verdict;
+}
+"""
+
+def _numeric_tokens(tokens):
+    """Mots contenant un chiffre (numéro de voie, code postal): doivent correspondre exactement."""
+    return {token for token in tokens if any(char.isdigit() for char in token)}
+
+
 class StarlinkPortalClient:
-    def __init__(self, email, password, headless=True, timeout=30000):
+    def __init__(self, email, password, headless=True, timeout=30000, use_api=False,
+                 block_resources=True, lean_profile=True,
+                 blocked_resource_types=BLOCKED_RESOURCE_TYPES, blocked_domains=BLOCKED_DOMAINS,
+                 selector_cache=None, browser=None, record=False, replay_from=None, address_cache=None):
         self.email = email
         self.password = password
         self.headless = headless
         self.timeout = timeout
+        self.use_api = use_api
+        self.block_resources = block_resources
+        self.lean_profile = lean_profile
+        self.blocked_resource_types = set(blocked_resource_types)
+        self.blocked_domains = tuple(blocked_domains)
+        # Navigateur fourni par un worker (browser_pool): une session = un contexte isolé
+        self.shared_browser = browser
         self.playwright = None
         self.browser = None
+        self.context = None
         self.page = None
+        self.resource_stats = self._new_resource_stats()
+        # Enregistrement (HAR + trace) ou rejeu hors ligne d'une session enregistrée
+        self.record = record
+        self.recording_dir = None
+        self.replayer = HarReplayer.from_recording(replay_from) if replay_from else None
+        if self.replayer:
+            # Le rejeu ne doit ni appeler l'API réelle ni modifier le cache de sélecteurs de production
+            self.use_api = False
+            selector_cache = selector_cache or SelectorCache(os.path.join(replay_from, SelectorCache.CACHE_FILE))
+            address_cache = address_cache or AcceptedAddressCache(os.path.join(replay_from, ACCEPTED_ADDRESSES_FILE))
+        self.selector_cache = selector_cache or SelectorCache()
+        self.address_cache = address_cache or AcceptedAddressCache()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Libère le navigateur s'il est encore ouvert."""
+        if self.browser or self.playwright or self.context:
+            self._stop_browser()
+
+    @staticmethod
+    def _new_resource_stats():
+        return {
+            "requests_allowed": 0,
+            "requests_blocked": 0,
+            "blocked_by_type": {},
+            "bytes_loaded": 0,
+            "bytes_saved_estimate": 0,
+        }
+
+    def _is_blocked_domain(self, url):
+        host = urlparse(url).hostname or ""
+        return any(host == domain or host.endswith("." + domain) for domain in self.blocked_domains)
+
+    def _handle_route(self, route):
+        """Bloque les ressources inutiles et les domaines tiers, laisse passer le reste."""
+        request = route.request
+        resource_type = request.resource_type
+        if resource_type in self.blocked_resource_types or self._is_blocked_domain(request.url):
+            stats = self.resource_stats
+            stats["requests_blocked"] += 1
+            stats["blocked_by_type"][resource_type] = stats["blocked_by_type"].get(resource_type, 0) + 1
+            stats["bytes_saved_estimate"] += ESTIMATED_RESOURCE_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+            route.abort()
+        else:
+            self.resource_stats["requests_allowed"] += 1
+            route.continue_()
+
+    def _record_response(self, response):
+        try:
+            self.resource_stats["bytes_loaded"] += int(response.headers.get("content-length", 0))
+        except (TypeError, ValueError):
+            pass
 
     def _start_browser(self):
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=self.headless)
-        self.page = self.browser.new_page()
+        self.resource_stats = self._new_resource_stats()
+        context_options = {}
+        if self.record:
+            self.recording_dir = new_recording_dir(self.email)
+            context_options["record_har_path"] = os.path.join(self.recording_dir, HAR_FILE)
+            context_options["record_har_content"] = "embed"
+        if self.shared_browser:
+            self.context = self.shared_browser.new_context(**context_options)
+        else:
+            self.playwright = sync_playwright().start()
+            launch_args = LEAN_LAUNCH_ARGS if self.lean_profile else []
+            self.browser = self.playwright.chromium.launch(headless=self.headless, args=launch_args)
+            self.context = self.browser.new_context(**context_options)
+        if self.record:
+            self.context.tracing.start(screenshots=True, snapshots=True)
+            logger.info(f"Enregistrement de la session dans {self.recording_dir}")
+        self.page = self.context.new_page()
         # Set default timeout for all operations
         self.page.set_default_timeout(self.timeout)
+        if self.replayer:
+            self.page.route("**/*", self.replayer.handle)
+        elif self.block_resources:
+            self.page.route("**/*", self._handle_route)
+        self.page.on("response", self._record_response)
+
+    def _report_resource_stats(self):
+        stats = self.resource_stats
+        total_requests = stats["requests_blocked"] + stats["requests_allowed"]
+        if not total_requests:
+            return
+        logger.info(
+            f"Ressources de la session: {stats['requests_allowed']} requête(s) chargée(s) "
+            f"({stats['bytes_loaded'] / 1024:.0f} Ko), {stats['requests_blocked']} bloquée(s) "
+            f"(~{stats['bytes_saved_estimate'] / 1024:.0f} Ko économisés estimés) "
+            f"{stats['blocked_by_type']}"
+        )
 
     def _stop_browser(self):
-        if self.browser:
-            self.browser.close()
-        if self.playwright:
-            self.playwright.stop()
+        self._report_resource_stats()
+        self.selector_cache.save()
+        try:
+            if self.record and self.context:
+                # La trace est écrite ici, le HAR à la fermeture du contexte
+                self.context.tracing.stop(path=os.path.join(self.recording_dir, TRACE_FILE))
+            if self.page:
+                self.page.close()
+            if self.context:
+                self.context.close()
+            if self.browser:
+                self.browser.close()
+        except Exception as e:
+            logger.warning(f"Erreur lors de la fermeture du navigateur: {e}")
+        finally:
+            if self.record and self.recording_dir:
+                # Cookies et mot de passe retirés du HAR, fichiers réservés au propriétaire
+                secure_recording(self.recording_dir, [self.password])
+            try:
+                if self.playwright:
+                    self.playwright.stop()
+            finally:
+                # Ne garder aucune référence vers les objets Playwright entre deux sessions
+                self.page = None
+                self.context = None
+                self.browser = None
+                self.playwright = None
+
+    def _capture_artifacts(self, label):
+        """Capture de débogage de la page courante, écrite en arrière-plan dans artifacts/<run>/<compte>/."""
+        artifacts.capture_page(self.page, self.email, label)
+
+    def _check_portal_version(self):
+        """Invalide le cache de sélecteurs si les bundles JavaScript du portail ont changé."""
+        try:
+            scripts = self.page.evaluate(
+                "() => Array.from(document.scripts).map(s => s.src).filter(Boolean)"
+            )
+            if scripts:
+                self.selector_cache.check_fingerprint(SelectorCache.compute_fingerprint(scripts))
+        except Exception as e:
+            logger.debug(f"Impossible de calculer l'empreinte du portail: {e}")
+
+    def _find_element(self, group, candidates, make_locator, require_visible=True, ordered=False):
+        """
+        Retourne le premier élément correspondant parmi les candidats, ou None.
+        Le candidat qui a fonctionné la dernière fois est essayé en premier (cache de sélecteurs).
+        ordered: candidats non interchangeables, par ordre de priorité (ex: un bouton "Update…"
+        ne doit pas passer avant "Save"); ils sont toujours essayés dans l'ordre, sans cache.
+        """
+        if ordered:
+            # Un candidat appris lors d'un run précédent ne doit pas court-circuiter la priorité
+            self.selector_cache.forget(group)
+            for candidate in candidates:
+                locator = make_locator(candidate)
+                if locator.count() > 0 and (not require_visible or locator.first.is_visible()):
+                    return locator.first
+            return None
+        for candidate in self.selector_cache.order(group, candidates):
+            locator = make_locator(candidate)
+            if locator.count() > 0 and (not require_visible or locator.first.is_visible()):
+                self.selector_cache.remember(group, candidate)
+                return locator.first
+        self.selector_cache.forget(group)
+        return None
 
     def _detect_login_issues(self):
         """
         Détecte les problèmes de connexion (captcha, 2FA, erreurs).
+        Tous les indicateurs sont vérifiés dans la page en un seul aller-retour (evaluate).
         Retourne un tuple (has_issue, issue_type, message)
         """
         try:
-            # Détection de captcha
-            captcha_selectors = [
-                "iframe[src*='recaptcha']",
-                "iframe[src*='captcha']",
-                ".g-recaptcha",
-                "[data-callback*='captcha']"
-            ]
-            for selector in captcha_selectors:
-                if self.page.locator(selector).count() > 0:
-                    logger.warning("Captcha détecté - intervention manuelle requise")
-                    return (True, "captcha", "Captcha détecté sur la page de connexion")
+            verdict = self.page.evaluate(LOGIN_PROBE_SCRIPT, LOGIN_PROBE_INDICATORS)
             
-            # Détection de 2FA
-            two_factor_indicators = [
-                self.page.get_by_text("two-factor", exact=False),
-                self.page.get_by_text("2FA", exact=False),
-                self.page.get_by_text("verification code", exact=False),
-                self.page.get_by_text("authenticator", exact=False),
-                self.page.locator("input[type='tel']"),
-                self.page.locator("input[name*='code']"),
-                self.page.locator("input[name*='token']")
-            ]
-            for indicator in two_factor_indicators:
-                if indicator.count() > 0 and indicator.first.is_visible():
-                    logger.warning("2FA détecté - intervention manuelle requise")
-                    return (True, "2fa", "Authentification à deux facteurs requise")
+            if verdict.get("captcha"):
+                logger.warning("Captcha détecté - intervention manuelle requise")
+                return (True, "captcha", "Captcha détecté sur la page de connexion")
             
-            # Détection d'erreurs de connexion
-            error_messages = [
-                self.page.get_by_text("incorrect password", exact=False),
-                self.page.get_by_text("invalid credentials", exact=False),
-                self.page.get_by_text("wrong password", exact=False),
-                self.page.get_by_text("login failed", exact=False),
-                self.page.get_by_text("authentication failed", exact=False)
-            ]
-            for error_msg in error_messages:
-                if error_msg.count() > 0 and error_msg.first.is_visible():
-                    error_text = error_msg.first.text_content()
-                    logger.error(f"Erreur de connexion détectée: {error_text}")
-                    return (True, "auth_error", f"Erreur d'authentification: {error_text}")
+            if verdict.get("two_factor"):
+                logger.warning("2FA détecté - intervention manuelle requise")
+                return (True, "2fa", "Authentification à deux facteurs requise")
+            
+            error_text = verdict.get("auth_error")
+            if error_text:
+                logger.error(f"Erreur de connexion détectée: {error_text}")
+                return (True, "auth_error", f"Erreur d'authentification: {error_text}")
             
             return (False, None, None)
         except Exception as e:
@@ -92,6 +353,7 @@ class StarlinkPortalClient:
             # Attendre que les champs de connexion soient disponibles
             logger.info("Attente des champs de connexion...")
             self.page.wait_for_selector("input[type='email']", timeout=self.timeout)
+            self._check_portal_version()
             
             # Vérifier s'il y a déjà des problèmes visibles
             has_issue, issue_type, issue_msg = self._detect_login_issues()
@@ -100,58 +362,93 @@ class StarlinkPortalClient:
                 return False
             
             logger.info("Saisie des identifiants...")
-            self.page.fill("input[type='email']", self.email)
-            self.page.fill("input[type='password']", self.password)
-            
-            # Utiliser des sélecteurs résilients basés sur le texte visible
-            login_btn = None
-            login_texts = ["Sign In", "Log In", "Login", "Se connecter"]
-            for text in login_texts:
-                btn = self.page.get_by_role("button", name=text, exact=False)
-                if btn.count() > 0 and btn.first.is_visible():
-                    login_btn = btn.first
-                    break
-            
-            # Fallback sur sélecteur par type submit
-            if not login_btn:
-                login_btn = self.page.locator("button[type='submit']").first
-                if login_btn.count() == 0:
-                    login_btn = self.page.get_by_text("Sign In", exact=False).first
-            
-            if login_btn and login_btn.is_visible():
-                login_btn.click()
-                logger.info("Bouton de connexion cliqué")
-            else:
-                logger.error("Impossible de trouver le bouton de connexion")
-                return False
-            
-            # Attendre la redirection ou détecter les problèmes
+            self._pause_tracing()
             try:
-                # Attendre soit la redirection vers le dashboard, soit l'apparition d'un problème
-                self.page.wait_for_url("**/account/**", timeout=45000)
-                logger.info("Connexion réussie - redirection vers le dashboard")
-                return True
-            except PlaywrightTimeoutError:
-                # Vérifier s'il y a des problèmes après la tentative de connexion
-                has_issue, issue_type, issue_msg = self._detect_login_issues()
-                if has_issue:
-                    logger.error(f"Problème après tentative de connexion: {issue_msg}")
-                    self.page.screenshot(path="login_error_debug.png")
-                    return False
-                else:
-                    logger.warning("Timeout lors de l'attente de redirection - vérification manuelle requise")
-                    self.page.screenshot(path="login_timeout_debug.png")
-                    return False
-                    
+                return self._submit_credentials()
+            finally:
+                self._resume_tracing()
         except PlaywrightTimeoutError as e:
             logger.error(f"Timeout lors de la connexion: {e}")
-            self.page.screenshot(path="login_timeout_debug.png")
+            self._capture_artifacts("login_timeout")
             return False
         except Exception as e:
             logger.error(f"Erreur lors de la connexion: {e}")
-            self.page.screenshot(path="login_error_debug.png")
+            self._capture_artifacts("login_error")
             return False
 
+    def _submit_credentials(self):
+        """Saisit les identifiants, soumet le formulaire et attend le tableau de bord."""
+        self.page.fill("input[type='email']", self.email)
+        self.page.fill("input[type='password']", self.password)
+        
+        # Utiliser des sélecteurs résilients basés sur le texte visible
+        login_texts = ["Sign In", "Log In", "Login", "Se connecter"]
+        login_btn = self._find_element(
+            "login_button", login_texts,
+            lambda text: self.page.get_by_role("button", name=text, exact=False)
+        )
+        
+        # Fallback sur sélecteur par type submit
+        if not login_btn:
+            login_btn = self.page.locator("button[type='submit']").first
+            if login_btn.count() == 0:
+                login_btn = self.page.get_by_text("Sign In", exact=False).first
+        
+        if login_btn and login_btn.is_visible():
+            login_btn.click()
+            logger.info("Bouton de connexion cliqué")
+        else:
+            logger.error("Impossible de trouver le bouton de connexion")
+            return False
+        
+        # Attendre la redirection ou détecter les problèmes
+        try:
+            # Attendre soit la redirection vers le dashboard, soit l'apparition d'un problème
+            self.page.wait_for_url("**/account/**", timeout=45000)
+            logger.info("Connexion réussie - redirection vers le dashboard")
+            if self.use_api:
+                # Conserver la session pour les prochaines mises à jour via HTTP
+                save_session_cookies(self.email, self.page.context.cookies())
+            return True
+        except PlaywrightTimeoutError:
+            # Vérifier s'il y a des problèmes après la tentative de connexion
+            has_issue, issue_type, issue_msg = self._detect_login_issues()
+            if has_issue:
+                logger.error(f"Problème après tentative de connexion: {issue_msg}")
+                self._capture_artifacts("login_error")
+                return False
+            else:
+                logger.warning("Timeout lors de l'attente de redirection - vérification manuelle requise")
+                self._capture_artifacts("login_timeout")
+                return False
+
+    def _pause_tracing(self):
+        """
+        Interrompt la trace avant la saisie des identifiants: la partie déjà tracée est écrite
+        dans trace-login.zip et l'action fill du mot de passe n'est jamais enregistrée.
+        """
+        if self.record and self.context:
+            try:
+                self.context.tracing.stop_chunk(path=os.path.join(self.recording_dir, LOGIN_TRACE_FILE))
+            except Exception as e:
+                logger.debug(f"Impossible d'interrompre la trace: {e}")
+
+    def _resume_tracing(self):
+        """Reprend la trace après la connexion, une fois le champ mot de passe vidé."""
+        if not (self.record and self.context):
+            return
+        try:
+            # En cas d'échec, la page de connexion est encore affichée: ne pas la capturer remplie
+            self.page.evaluate(
+                "() => document.querySelectorAll(\"input[type='password']\").forEach((i) => { i.value = ''; })"
+            )
+        except Exception:
+            pass
+        try:
+            self.context.tracing.start_chunk()
+        except Exception as e:
+            logger.debug(f"Impossible de reprendre la trace: {e}")
+
     def _verify_address_update(self, expected_address):
         """
         Vérifie que l'adresse a bien été mise à jour en naviguant vers la page d'adresse.
@@ -165,21 +462,21 @@ class StarlinkPortalClient:
             
             # Essayer de trouver l'adresse actuelle sur la page
             # Utiliser des sélecteurs basés sur le texte plutôt que sur les classes CSS
-            address_indicators = [
-                self.page.get_by_text("Service Address", exact=False),
-                self.page.get_by_text("Service address", exact=False),
-                self.page.get_by_text("Address", exact=False)
-            ]
+            address_indicators = ["Service Address", "Service address", "Address"]
+            indicator = self._find_element(
+                "address_indicator", address_indicators,
+                lambda text: self.page.get_by_text(text, exact=False),
+                require_visible=False
+            )
             
-            for indicator in address_indicators:
-                if indicator.count() > 0:
-                    # Essayer de trouver l'adresse à proximité
-                    # Note: Cette logique peut nécessiter des ajustements selon la structure réelle de la page
-                    logger.info("Indicateur d'adresse trouvé sur la page")
-                    # Pour une vérification complète, on pourrait extraire le texte de l'adresse
-                    # et le comparer avec expected_address, mais cela nécessite de connaître
-                    # la structure exacte de la page Starlink
-                    return True
+            if indicator:
+                # Essayer de trouver l'adresse à proximité
+                # Note: Cette logique peut nécessiter des ajustements selon la structure réelle de la page
+                logger.info("Indicateur d'adresse trouvé sur la page")
+                # Pour une vérification complète, on pourrait extraire le texte de l'adresse
+                # et le comparer avec expected_address, mais cela nécessite de connaître
+                # la structure exacte de la page Starlink
+                return True
             
             # Si on ne trouve pas d'indicateur, on considère que la vérification est partielle
             logger.warning("Impossible de vérifier complètement la mise à jour - structure de page inconnue")
@@ -189,10 +486,75 @@ class StarlinkPortalClient:
             logger.warning(f"Erreur lors de la vérification de l'adresse: {e}")
             return True  # On retourne True pour ne pas bloquer en cas d'erreur de vérification
 
-    def update_service_address(self, new_address):
+    def _pick_suggestion(self, query, accepted=None):
+        """
+        Choisit la suggestion d'autocomplétion à cliquer.
+        Une suggestion déjà acceptée pour cette adresse est sélectionnée directement (texte exact);
+        sinon la suggestion la plus proche de la saisie est retenue, à condition que ses numéros
+        (numéro de voie, code postal) soient exactement ceux de la saisie.
+        Retourne (locator, texte) ou (None, None).
         """
-        Se connecte et met à jour l'adresse de service avec vérification post-update.
+        options = self.page.locator(SUGGESTION_SELECTORS)
+        query_tokens = set(address_key(query).tokens)
+        query_numbers = _numeric_tokens(query_tokens)
+        if accepted and _numeric_tokens(address_key(accepted).tokens) != query_numbers:
+            logger.info("Suggestion précédemment acceptée incohérente avec l'adresse - ignorée")
+            accepted = None
+        if accepted:
+            # Texte complet de la suggestion (espaces normalisés), pas une simple sous-chaîne
+            exact_text = re.compile(r"^\s*" + r"\s+".join(map(re.escape, accepted.split())) + r"\s*$")
+            option = options.filter(has_text=exact_text).first
+            try:
+                option.wait_for(state="visible", timeout=SUGGESTION_TIMEOUT_MS)
+                logger.info("Suggestion déjà acceptée par le portail trouvée - sélection directe")
+                return option, accepted
+            except PlaywrightTimeoutError:
+                logger.info("Suggestion précédemment acceptée absente - recherche d'une autre suggestion")
+
+        try:
+            options.first.wait_for(state="visible", timeout=SUGGESTION_TIMEOUT_MS)
+        except PlaywrightTimeoutError:
+            return None, None
+
+        best_index, best_overlap, best_text = None, 0.0, None
+        for index, text in enumerate(options.all_inner_texts()[:MAX_SUGGESTIONS]):
+            text = " ".join(text.split())
+            if addresses_match(text, query):
+                return options.nth(index), text
+            tokens = set(address_key(text).tokens) if text else set()
+            if _numeric_tokens(tokens) != query_numbers:
+                # "14 Rue de la Paix" n'est pas "12 Rue de la Paix", même si les mots coïncident
+                continue
+            overlap = len(tokens & query_tokens) / len(tokens | query_tokens) if tokens else 0.0
+            if overlap > best_overlap:
+                best_index, best_overlap, best_text = index, overlap, text
+        if best_index is not None and best_overlap >= MIN_SUGGESTION_OVERLAP:
+            return options.nth(best_index), best_text
+        return None, None
+
+    def _update_via_api(self, new_address):
         """
+        Tente la mise à jour par requête HTTP directe avec les cookies de la dernière connexion.
+        Retourne True si succès, False sinon (le flux navigateur prend alors le relais).
+        """
+        cookies = load_session_cookies(self.email)
+        if not cookies:
+            return False
+
+        result = StarlinkApiClient(self.email, cookies).update_service_address(new_address)
+        if result is None:
+            clear_session_cookies(self.email)
+        return bool(result)
+
+    def update_service_address(self, new_address, canonical=None):
+        """
+        Met à jour l'adresse de service: via l'API HTTP si une session est disponible,
+        sinon (ou en cas d'échec) via le navigateur avec vérification post-update.
+        canonical: forme canonique de l'adresse (LocationService.canonical_address), optionnelle.
+        """
+        if self.use_api and self._update_via_api(new_address):
+            return True
+
         success = False
         try:
             self._start_browser()
@@ -208,12 +570,10 @@ class StarlinkPortalClient:
             # Naviguer vers la section de gestion si nécessaire
             # Utiliser des sélecteurs basés sur le texte visible
             manage_texts = ["Manage", "Gérer", "Manage Service", "Gérer le service"]
-            manage_btn = None
-            for text in manage_texts:
-                btn = self.page.get_by_text(text, exact=False)
-                if btn.count() > 0 and btn.first.is_visible():
-                    manage_btn = btn.first
-                    break
+            manage_btn = self._find_element(
+                "manage_button", manage_texts,
+                lambda text: self.page.get_by_text(text, exact=False)
+            )
             
             if manage_btn:
                 logger.info("Clic sur le bouton Manage...")
@@ -228,12 +588,10 @@ class StarlinkPortalClient:
                 "Change Address",
                 "Update Address"
             ]
-            edit_btn = None
-            for text in edit_texts:
-                btn = self.page.get_by_text(text, exact=False)
-                if btn.count() > 0 and btn.first.is_visible():
-                    edit_btn = btn.first
-                    break
+            edit_btn = self._find_element(
+                "edit_button", edit_texts,
+                lambda text: self.page.get_by_text(text, exact=False)
+            )
             
             if edit_btn:
                 logger.info("Clic sur le bouton d'édition d'adresse...")
@@ -244,7 +602,6 @@ class StarlinkPortalClient:
             
             # Recherche du champ d'adresse
             # Essayer plusieurs sélecteurs résilients
-            address_input = None
             input_selectors = [
                 "input[type='text'][placeholder*='address' i]",
                 "input[type='text'][placeholder*='Address' i]",
@@ -253,11 +610,10 @@ class StarlinkPortalClient:
                 "textarea[placeholder*='address' i]"
             ]
             
-            for selector in input_selectors:
-                if self.page.locator(selector).count() > 0:
-                    address_input = self.page.locator(selector).first
-                    if address_input.is_visible():
-                        break
+            address_input = self._find_element(
+                "address_input", input_selectors,
+                lambda selector: self.page.locator(selector)
+            )
             
             # Si aucun sélecteur CSS ne fonctionne, essayer de trouver par label
             if not address_input or not address_input.is_visible():
@@ -266,26 +622,35 @@ class StarlinkPortalClient:
                     # Essayer de trouver l'input associé
                     address_input = address_label.locator("..").locator("input, textarea").first
             
+            query = (canonical or {}).get("query") or new_address
+            accepted = (canonical or {}).get("accepted")
+            suggestion_text = None
             if address_input and address_input.is_visible():
                 logger.info("Champ d'adresse trouvé - saisie de la nouvelle adresse...")
                 address_input.clear()
-                address_input.fill(new_address)
-                time.sleep(0.5)  # Attendre l'autocomplétion
+                address_input.fill(query)
                 
-                # Appuyer sur Enter pour déclencher l'autocomplétion si disponible
-                address_input.press("Enter")
-                time.sleep(1)
+                suggestion, suggestion_text = self._pick_suggestion(query, accepted)
+                if accepted and suggestion_text != accepted:
+                    # Suggestion enregistrée plus proposée ou incohérente: elle est oubliée
+                    self.address_cache.forget_accepted(new_address)
+                if suggestion:
+                    logger.info(f"Sélection de la suggestion: {suggestion_text}")
+                    suggestion.click()
+                else:
+                    # Appuyer sur Enter pour déclencher l'autocomplétion si disponible
+                    address_input.press("Enter")
+                    time.sleep(1)
             else:
                 logger.warning("Champ d'adresse non trouvé - mise à jour peut échouer")
             
             # Recherche du bouton "Save" ou équivalent
             save_texts = ["Save", "Sauvegarder", "Update", "Confirm", "Apply"]
-            save_btn = None
-            for text in save_texts:
-                btn = self.page.get_by_role("button", name=text, exact=False)
-                if btn.count() > 0 and btn.first.is_visible():
-                    save_btn = btn.first
-                    break
+            save_btn = self._find_element(
+                "save_button", save_texts,
+                lambda text: self.page.get_by_role("button", name=text, exact=False),
+                ordered=True
+            )
             
             # Fallback sur sélecteur par type submit
             if not save_btn:
@@ -301,25 +666,28 @@ class StarlinkPortalClient:
                 # Vérification post-mise à jour
                 if self._verify_address_update(new_address):
                     logger.info("Vérification post-mise à jour réussie")
+                    # La suggestion n'est retenue qu'une fois la mise à jour vérifiée
+                    if suggestion_text:
+                        self.address_cache.remember_accepted(new_address, suggestion_text)
                     success = True
                 else:
                     logger.warning("Vérification post-mise à jour échouée - mais la mise à jour peut avoir réussi")
                     success = True  # On considère comme succès car la vérification peut être incomplète
             else:
                 logger.error("Bouton Save non trouvé - impossible de sauvegarder")
-                self.page.screenshot(path="save_button_not_found.png")
+                self._capture_artifacts("save_button_not_found")
                 success = False
 
         except PlaywrightTimeoutError as e:
             logger.error(f"Timeout lors de la mise à jour: {e}")
-            self.page.screenshot(path="update_timeout_debug.png")
+            self._capture_artifacts("update_timeout")
             success = False
         except Exception as e:
             logger.error(f"Erreur lors du processus de mise à jour: {e}")
-            if self.page:
-                self.page.screenshot(path="update_error_debug.png")
+            self._capture_artifacts("update_error")
             success = False
         finally:
+            self.address_cache.save()
             self._stop_browser()
         
         return success